@@ -1,3 +1,4 @@
+import threading
 import time
 from dotenv import load_dotenv
 load_dotenv()
@@ -13,10 +14,13 @@ from src.memory.memory_store import memory
 from src.evaluation.rag_eval import RAGEvaluator
 
 # Text RAG
-from src.retriever.hybrid_retriever import HybridRetriever
-from src.retriever.reranker import Reranker
+from src.retriever.hybrid_retriever import HybridRetriever, HybridRetrieverConfig
+from src.retriever.reranker import Reranker, RerankerConfig
+from src.retriever.query_context import QueryContext
 from src.pipelines.context_builder import deduplicate, build_context, ContextConfig
-from src.pipelines.ingest import run_ingestion
+from src.pipelines.ingest_jobs import IngestJobQueue
+from src.retriever.snapshots import VECTORSTORE_DIR, load_snapshot
+from src.retriever.snapshots import current_name as current_snapshot_name
 
 # Image RAG
 from src.retriever.image_search import (
@@ -28,7 +32,8 @@ from src.retriever.image_search import (
     _search as _img_search,
     _safe_open_image as _img_open_image,
 )
-from src.embeddings.clip_embedder import CLIPConfig, CLIPEembedder
+from src.embeddings.clip_embedder import CLIPConfig
+from src.embeddings.model_registry import RegistryConfig, lazy_clip, memory_report, registry
 
 # SQL
 from src.pipelines.sql_pipeline import (
@@ -45,14 +50,37 @@ app = FastAPI(title="Production RAG System")
 evaluator = RAGEvaluator()
 
 # ================= INIT =================
-# HybridRetriever loads chunks.jsonl ONCE at startup to build BM25.
-# After a new PDF is ingested, we must reload it so BM25 sees new chunks.
-# We store it in a mutable dict so the /ingest endpoint can replace it.
+# HybridRetriever maps the chunk store ONCE at startup to build BM25.
+# It serves one published index snapshot (src/vectorstore/CURRENT).
+# New uploads are added in place via add_chunks (no reload); snapshots
+# published by anything else (bulk ingest, ANN rebuild) are loaded in
+# the background and swapped in, double-buffered: /ask keeps answering
+# from the old retriever until the new one is ready.
+# We store it in a mutable dict so it can be replaced atomically.
 _state: Dict[str, Any] = {}
 
+# one copy of each model per process (retriever, reranker fallback, CLIP);
+# MODEL_IDLE_UNLOAD_S releases models nobody has used for that long
+_idle = os.getenv("MODEL_IDLE_UNLOAD_S")
+registry().configure(RegistryConfig(idle_unload_s=float(_idle) if _idle else None))
+
+# MODEL_BACKEND=onnx serves the embedder + cross-encoder from int8
+# onnxruntime exports (CPU nodes); ONNX_THREADS caps intra-op threads
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+
+_swap_lock = threading.Lock()   # one reload / in-place update at a time
+
+SNAPSHOT_POLL_S = float(os.getenv("SNAPSHOT_POLL_S", "5"))
+
 def _init_retriever():
     """Load (or reload) the HybridRetriever and store in _state."""
-    _state["retriever"] = HybridRetriever()
+    old = _state.get("retriever")
+    # the embedding model is shared, so a reload only holds one copy
+    _state["retriever"] = HybridRetriever(
+        HybridRetrieverConfig(embedding_backend=MODEL_BACKEND, onnx_threads=ONNX_THREADS),
+        embedder=old.embedder if old is not None else None,
+    )
 
 def get_retriever() -> HybridRetriever:
     if "retriever" not in _state:
@@ -62,11 +90,90 @@ def get_retriever() -> HybridRetriever:
 # Initial load at startup
 _init_retriever()
 
-reranker = Reranker()
+
+def _apply_ingest(job: Dict[str, Any], payload: Dict[str, Any]) -> None:
+    """
+    Runs on the ingest listener thread when a job finishes: the chunks are
+    already in the store, so only their cids + vectors cross the process
+    boundary and the live retriever is updated in place. If another writer
+    (a CLI run) published while the job ran, its chunks are not in the
+    payload, so the retriever is reloaded from the job's snapshot instead;
+    a full reload is also the fallback if the in-place update fails.
+    """
+    snapshot = (payload.get("result") or {}).get("snapshot")
+    with _swap_lock:
+        retriever = get_retriever()
+        if snapshot and retriever.snapshot and retriever.snapshot >= snapshot:
+            return   # already reloaded from this snapshot (or a newer one)
+        snap = load_snapshot(VECTORSTORE_DIR, snapshot) if snapshot else None
+        if snap is not None and not retriever.can_catch_up(snap, payload.get("cids") or []):
+            t0 = time.time()
+            _init_retriever()
+            print(f"[app] another writer published during job {job.get('id')}: "
+                  f"reloaded snapshot {get_retriever().snapshot} ({time.time() - t0:.1f}s)")
+            return
+        try:
+            retriever.store.refresh()
+            docs = retriever.store.documents(payload.get("cids") or [])
+            retriever.add_chunks(docs, payload.get("vectors"))
+            if payload.get("replaced"):
+                retriever.remove_chunks(payload["replaced"])
+            if snap is not None:
+                # rows in between are dead (see can_catch_up)
+                retriever.store_n = max(retriever.store_n, snap.store_n)
+                retriever.snapshot = snap.name
+            print(f"[app] HybridRetriever updated in place (+{len(docs)} chunks, job {job.get('id')})")
+        except Exception as e:
+            print("[app] in-place update failed, reloading:", e)
+            # build the new retriever first, then swap: /ask keeps serving the old one
+            _init_retriever()
+            print("[app] HybridRetriever reloaded from the chunk store")
+
+
+# /ingest work (parse, chunk, embed, index) runs in a separate low-priority
+# process
+ingest_jobs = IngestJobQueue(on_done=_apply_ingest)
+
+
+def _watch_snapshots() -> None:
+    """Swap in snapshots published outside the ingest worker."""
+    while True:
+        time.sleep(SNAPSHOT_POLL_S)
+        try:
+            name = current_snapshot_name()
+            # a running job's on_done covers its own snapshot
+            if name is None or name == get_retriever().snapshot or ingest_jobs.busy():
+                continue
+            with _swap_lock:
+                if name == get_retriever().snapshot:
+                    continue
+                t0 = time.time()
+                _init_retriever()
+            print(f"[app] HybridRetriever swapped to snapshot {name} ({time.time() - t0:.1f}s)")
+        except Exception as e:
+            print("[app] snapshot reload failed, still serving the old one:", e)
+
+
+threading.Thread(target=_watch_snapshots, name="snapshot-watcher", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def _stop_ingest_worker():
+    ingest_jobs.close()
+
+# concurrent /ask requests share cross-encoder passes: RERANK_BATCH_PAIRS pairs
+# max (0 = off), the first request waits up to RERANK_BATCH_WAIT_MS for company
+reranker = Reranker(RerankerConfig(
+    backend=MODEL_BACKEND,
+    onnx_threads=ONNX_THREADS,
+    batch_max_pairs=int(os.getenv("RERANK_BATCH_PAIRS", "64")),
+    batch_max_wait_ms=float(os.getenv("RERANK_BATCH_WAIT_MS", "5")),
+))
 
 img_meta = _img_load_meta(IMG_META_PATH)
 img_index = _img_load_faiss(IMG_INDEX_PATH)
-clip = CLIPEembedder(CLIPConfig())
+# loaded on the first image query; releasable while idle
+clip = lazy_clip(CLIPConfig())
 
 sql_schema = load_schema_sqlite(DEFAULT_DB_PATH)
 
@@ -162,9 +269,13 @@ def ask(req: AskRequest):
         # Always use the current retriever (reloaded after each ingest)
         retriever = get_retriever()
 
+        # One embedding of the query, shared by retrieval, MMR and rerank
+        # (filled lazily, so a cache hit never runs the model)
+        ctx = QueryContext(query=req.query)
+
         # -------- RETRIEVE --------
         candidates = retriever.retrieve_candidates(
-            req.query, top_k=req.top_k, filters=req.filters
+            req.query, top_k=req.top_k, filters=req.filters, ctx=ctx
         )
 
         # Check if user mentioned a specific PDF by name
@@ -187,7 +298,7 @@ def ask(req: AskRequest):
             }
 
         # -------- RERANK --------
-        reranked = reranker.rerank(req.query, candidates, top_k=req.top_k)
+        reranked = reranker.rerank(req.query, candidates, top_k=req.top_k, ctx=ctx)
 
         docs = []
         for item in reranked:
@@ -333,22 +444,57 @@ def ask_sql(req: AskSQLRequest):
         return {"error": str(e)}
 
 
+# =========================================================
+# CACHE
+# =========================================================
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "retrieval": get_retriever().cache.stats(),
+        "rerank": reranker.cache.stats(),
+        "embeddings": get_retriever().embedder.cache_stats(),
+    }
+
+
+@app.get("/rerank/stats")
+def rerank_stats():
+    """Cross-encoder micro-batching: queue depth, batch fill, wait / predict time."""
+    return reranker.batcher_stats()
+
+
+@app.get("/models")
+def models():
+    """Loaded models, their parameter memory and idle time, plus process RSS."""
+    return memory_report()
+
+
 # =========================================================
 # INGEST
 # =========================================================
 @app.post("/ingest")
 def ingest(data: dict):
+    """Queue a file for ingestion; poll GET /ingest/{job_id} for progress."""
     try:
         if "file_path" not in data:
             return {"error": "file_path missing"}
+        if not Path(data["file_path"]).exists():
+            return {"error": f"file not found: {data['file_path']}"}
 
-        # Run ingestion — saves to FAISS + chunks.jsonl
-        result = run_ingestion(data["file_path"])
+        job_id = ingest_jobs.submit(str(data["file_path"]))
+        return {"job_id": job_id, "status": "queued"}
 
-        _init_retriever()
-        print("[app] HybridRetriever reloaded with latest chunks.jsonl")
+    except Exception as e:
+        return {"error": str(e)}
 
-        return result
 
-    except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+@app.get("/ingest/stats")
+def ingest_stats():
+    return ingest_jobs.stats()
+
+
+@app.get("/ingest/{job_id}")
+def ingest_status(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return {"error": "unknown job", "job_id": job_id}
+    return job
@@ -1,35 +1,120 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from src.embeddings.embedding_cache import CACHE_PATH, EmbeddingCache, EmbeddingCacheConfig
 
 
 @dataclass
 class EmbedderConfig:
     model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
     normalize_embeddings: bool = True
+    # persistent (model, text hash) -> vector cache shared by all callers; None disables
+    cache_path: Optional[str] = str(CACHE_PATH)
+    cache_max_mb: float = 1024.0
+    # queries are mostly one-off and already hit the retriever's result
+    # cache when repeated; opt in to also keep their vectors on disk
+    cache_queries: bool = False
+    # "onnx": int8 onnxruntime on CPU (src.embeddings.onnx_backend); falls back to torch
+    backend: str = "torch"
+    onnx_threads: int = 0
 
 
 class LocalEmbedder:
     """
-    Local embeddings using LangChain's HuggingFaceEmbeddings.
+    Local embeddings using LangChain's HuggingFaceEmbeddings, or an int8
+    onnxruntime export of the same model with backend="onnx" (CPU nodes).
+    embed_documents goes through the on-disk embedding cache, so text
+    seen before (re-ingested files, MMR / rerank fallbacks) is not run
+    through the model again; queries use it only with cache_queries.
     """
 
     def __init__(self, cfg: Optional[EmbedderConfig] = None):
         self.cfg = cfg or EmbedderConfig()
-        self._emb = HuggingFaceEmbeddings(
-            model_name=self.cfg.model_name,
-            encode_kwargs={"normalize_embeddings": self.cfg.normalize_embeddings},
-        )
+        self.backend = "torch"
+        self._emb: Optional[Embeddings] = self._load_onnx() if self.cfg.backend == "onnx" else None
+        if self._emb is None:
+            self._emb = HuggingFaceEmbeddings(
+                model_name=self.cfg.model_name,
+                encode_kwargs={"normalize_embeddings": self.cfg.normalize_embeddings},
+            )
+
+        self._cache: Optional[EmbeddingCache] = None
+        if self.cfg.cache_path:
+            try:
+                self._cache = EmbeddingCache.open(
+                    EmbeddingCacheConfig(path=self.cfg.cache_path, max_mb=self.cfg.cache_max_mb)
+                )
+            except Exception as e:
+                print("Embedding cache disabled:", e)
+
+        # the same text embeds differently with / without normalization (and int8)
+        self._cache_model = f"{self.cfg.model_name}|norm={int(self.cfg.normalize_embeddings)}"
+        if self.backend != "torch":
+            self._cache_model += f"|{self.backend}"
+
+    def _load_onnx(self) -> Optional[Embeddings]:
+        try:
+            from src.embeddings.onnx_backend import OnnxConfig, OnnxEmbeddings
+
+            emb = OnnxEmbeddings(
+                self.cfg.model_name,
+                OnnxConfig(threads=self.cfg.onnx_threads),
+                normalize=self.cfg.normalize_embeddings,
+            )
+            self.backend = "onnx-int8"
+            return emb
+        except Exception as e:
+            print("ONNX embedder unavailable, using PyTorch:", e)
+            return None
+
+    def _embed_cached(
+        self, texts: List[str], encode: Optional[Callable[[List[str]], List[List[float]]]] = None
+    ) -> List[List[float]]:
+        encode = encode or self._emb.embed_documents
+        if self._cache is None or not texts:
+            return encode(texts)
 
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        return self._emb.embed_documents(texts)
+        try:
+            cached = self._cache.get_many(self._cache_model, texts)
+        except Exception as e:
+            print("Embedding cache read failed:", e)
+            return encode(texts)
+
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            # each distinct text once, even if repeated in the batch
+            uniq = list(dict.fromkeys(texts[i] for i in missing))
+            fresh = dict(zip(uniq, encode(uniq)))
+            for i in missing:
+                cached[i] = fresh[texts[i]]
+            try:
+                self._cache.put_many(self._cache_model, uniq, [fresh[t] for t in uniq])
+            except Exception as e:
+                print("Embedding cache write failed:", e)
+
+        return [v.tolist() if hasattr(v, "tolist") else list(v) for v in cached]
+
+    def embed_documents(self, texts: List[str], pool: Any = None) -> List[List[float]]:
+        """pool: an EmbeddingPool for this model; cache misses are encoded across its workers."""
+        return self._embed_cached(texts, pool.embed_documents if pool is not None else None)
 
     def embed_query(self, text: str) -> List[float]:
-        return self._emb.embed_query(text)
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # one forward pass for a batch of queries (no query prefix for MiniLM)
+        if self.cfg.cache_queries:
+            return self._embed_cached(texts)
+        return self._emb.embed_documents(texts) if texts else []
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self._cache.stats() if self._cache is not None else {"name": "embeddings", "enabled": False}
 
     @property
-    def langchain_embeddings(self) -> HuggingFaceEmbeddings:
-        return self._emb
\ No newline at end of file
+    def langchain_embeddings(self) -> Embeddings:
+        return self._emb
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+CACHE_PATH = Path("src/data/embedding_cache.sqlite")
+
+
+# ================= CONFIG =================
+@dataclass
+class EmbeddingCacheConfig:
+    path: str = str(CACHE_PATH)
+    max_mb: float = 1024.0      # vectors beyond this are evicted, least recently used first
+    evict_to: float = 0.9       # ... down to this fraction of max_mb
+    check_every: int = 2048     # inserts between size checks
+    # hits only touch last_used in memory; written back in one transaction
+    # every touch_flush_s seconds / touch_flush_every keys (and before eviction)
+    touch_flush_s: float = 30.0
+    touch_flush_every: int = 4096
+
+
+# ================= KEYS =================
+def normalize_text(text: str) -> str:
+    # whitespace never changes the tokens a sentence-transformer sees
+    return " ".join(text.split())
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).digest()
+
+
+# ================= CACHE =================
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model, hash of normalized text).
+
+    SQLite in WAL mode: one file shared by every process (API, ingest
+    workers, benchmark) and safe for concurrent readers plus a writer.
+    Vectors are stored as float32 blobs, so a hit is bit-identical to
+    the original embedding. last_used drives size-based LRU eviction;
+    hits record it in memory and are flushed in batches, so reads never
+    commit on the hot path.
+    """
+
+    _open_lock = threading.Lock()
+    _open: Dict[str, "EmbeddingCache"] = {}
+
+    def __init__(self, cfg: Optional[EmbeddingCacheConfig] = None):
+        self.cfg = cfg or EmbeddingCacheConfig()
+        path = Path(self.cfg.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), timeout=30.0, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model     TEXT NOT NULL,
+                h         BLOB NOT NULL,
+                vec       BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, h)
+            ) WITHOUT ROWID
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_used)")
+        self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._inserts = 0
+        self._touched: Dict[Tuple[str, bytes], float] = {}
+        self._flushed_at = time.monotonic()
+
+    @classmethod
+    def open(cls, cfg: Optional[EmbeddingCacheConfig] = None) -> "EmbeddingCache":
+        """One shared instance (connection) per cache file in this process."""
+        cfg = cfg or EmbeddingCacheConfig()
+        key = str(Path(cfg.path).resolve())
+        with cls._open_lock:
+            cache = cls._open.get(key)
+            if cache is None:
+                cache = cls._open[key] = cls(cfg)
+                # pending last_used updates survive a clean exit
+                atexit.register(cache._flush_at_exit)
+            return cache
+
+    # ================= LOOKUP =================
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        keys = [text_hash(t) for t in texts]
+        found: Dict[bytes, np.ndarray] = {}
+
+        with self._lock:
+            # SQLite caps bound parameters; 500 keys per query is well below it
+            for i in range(0, len(keys), 500):
+                part = list(set(keys[i:i + 500]))
+                rows = self._db.execute(
+                    f"SELECT h, vec FROM embeddings WHERE model = ? AND h IN ({','.join('?' * len(part))})",
+                    [model, *part],
+                ).fetchall()
+                for h, vec in rows:
+                    found[bytes(h)] = np.frombuffer(vec, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                for h in found:
+                    self._touched[(model, h)] = now
+                self._maybe_flush()
+
+            out = [found.get(k) for k in keys]
+            hit = sum(v is not None for v in out)
+            self.hits += hit
+            self.misses += len(out) - hit
+        return out
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Any]) -> None:
+        if not len(texts):
+            return
+        now = time.time()
+        rows = [
+            (model, text_hash(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, h, vec, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+
+            # a fresh insert already carries the newest last_used
+            for row in rows:
+                self._touched.pop((row[0], row[1]), None)
+
+            self._inserts += len(rows)
+            if self._inserts >= self.cfg.check_every:
+                self._inserts = 0
+                self._evict()
+            else:
+                self._maybe_flush()
+
+    # ================= LAST USED =================
+    def _maybe_flush(self) -> None:
+        if not self._touched:
+            return
+        if (
+            len(self._touched) >= self.cfg.touch_flush_every
+            or time.monotonic() - self._flushed_at >= self.cfg.touch_flush_s
+        ):
+            self._flush_touched()
+
+    def _flush_touched(self) -> None:
+        self._flushed_at = time.monotonic()
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        self._db.executemany(
+            "UPDATE embeddings SET last_used = MAX(last_used, ?) WHERE model = ? AND h = ?",
+            [(ts, model, h) for (model, h), ts in touched.items()],
+        )
+        self._db.commit()
+
+    def flush(self) -> None:
+        """Write pending last_used updates (e.g. at shutdown)."""
+        with self._lock:
+            self._flush_touched()
+
+    def _flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            print("[embedding_cache] last_used flush failed:", e)
+
+    # ================= EVICTION =================
+    def _size_bytes(self) -> int:
+        # vector payload; SQLite page overhead is not counted
+        return int(self._db.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings").fetchone()[0])
+
+    def _evict(self) -> None:
+        # eviction order must see the recent hits
+        self._flush_touched()
+
+        limit = self.cfg.max_mb * 1024 * 1024
+        size = self._size_bytes()
+        if size <= limit:
+            return
+
+        target = limit * self.cfg.evict_to
+        row = self._db.execute("SELECT COALESCE(AVG(LENGTH(vec)), 1) FROM embeddings").fetchone()
+        n = int((size - target) / max(1.0, float(row[0]))) + 1
+
+        cur = self._db.execute(
+            """
+            DELETE FROM embeddings WHERE (model, h) IN (
+                SELECT model, h FROM embeddings ORDER BY last_used LIMIT ?
+            )
+            """,
+            (n,),
+        )
+        self._db.commit()
+        self.evictions += cur.rowcount
+        print(f"[embedding_cache] evicted {cur.rowcount} vectors (cache was {size / 1e6:.1f}MB)")
+
+    def evict(self) -> None:
+        with self._lock:
+            self._evict()
+
+    # ================= STATS =================
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = int(self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0])
+            total = self.hits + self.misses
+            return {
+                "name": "embeddings",
+                "path": self.cfg.path,
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "approx_bytes": self._size_bytes(),
+            }
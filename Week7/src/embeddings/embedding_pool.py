@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+import numpy as np
+
+
+# ================= CONFIG =================
+@dataclass
+class EmbeddingPoolConfig:
+    workers: int = 0             # encoder processes; 0 = available cores // threads_per_worker
+    threads_per_worker: int = 2  # torch / onnxruntime intra-op threads in each
+    chunk_size: int = 32         # texts per task (and per forward pass)
+
+
+def _limit_threads(n: int) -> None:
+    # must happen before torch / numpy spin up their pools
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ[var] = str(n)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+# ================= WORKER =================
+_model: Any = None
+_normalize = True
+
+
+def _init_worker(model_name: str, backend: str, threads: int, batch_size: int, normalize: bool) -> None:
+    """Load one model copy per process, capped at `threads` threads."""
+    global _model, _normalize
+    _limit_threads(threads)
+    _normalize = normalize
+
+    if backend == "onnx":
+        try:
+            from src.embeddings.onnx_backend import OnnxConfig, OnnxSentenceEncoder
+
+            _model = OnnxSentenceEncoder(model_name, OnnxConfig(threads=threads, batch_size=batch_size))
+            return
+        except Exception as e:
+            print("[embed_pool] ONNX unavailable in worker, using PyTorch:", e)
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_chunk(texts: List[str]) -> np.ndarray:
+    if hasattr(_model, "max_seq_length"):
+        vecs = _model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=_normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+    else:
+        vecs = _model.encode(texts, normalize=_normalize)
+    return np.asarray(vecs, dtype=np.float32)
+
+
+# ================= POOL =================
+class EmbeddingPool:
+    """
+    Encodes large batches across several processes, one model copy each.
+
+    Texts are sorted by length and cut into chunk_size slices, so every
+    forward pass pads to a similar length; slices are spread over the
+    workers and the vectors come back in the caller's order. Workers are
+    spawned (no inherited model / thread pools) and live until close().
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        cfg: Optional[EmbeddingPoolConfig] = None,
+        backend: str = "torch",
+        normalize: bool = True,
+    ):
+        from src.embeddings.onnx_backend import default_threads
+
+        self.cfg = cfg or EmbeddingPoolConfig()
+        threads = max(1, self.cfg.threads_per_worker)
+        self.workers = self.cfg.workers or max(1, default_threads() // threads)
+
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, backend, threads, max(1, self.cfg.chunk_size), normalize),
+        )
+        print(f"[embed_pool] {self.workers} workers x {threads} threads ({model_name}, {backend})")
+
+    @classmethod
+    def for_embedder(cls, embedder: Any, cfg: Optional[EmbeddingPoolConfig] = None) -> "EmbeddingPool":
+        """A pool producing the same vectors as `embedder` (model, backend, normalization)."""
+        return cls(
+            embedder.cfg.model_name,
+            cfg,
+            backend="torch" if embedder.backend == "torch" else "onnx",
+            normalize=embedder.cfg.normalize_embeddings,
+        )
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        # small batches still use every worker
+        size = max(1, min(self.cfg.chunk_size, math.ceil(len(texts) / self.workers)))
+        slices = [order[i:i + size] for i in range(0, len(order), size)]
+
+        futures = [self._pool.submit(_encode_chunk, [texts[j] for j in idx]) for idx in slices]
+        out: Optional[np.ndarray] = None
+        for idx, fut in zip(slices, futures):
+            vecs = fut.result()
+            if out is None:
+                out = np.zeros((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[idx] = vecs
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(list(texts)).tolist()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "EmbeddingPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
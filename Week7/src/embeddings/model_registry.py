@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+import weakref
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from src.embeddings.clip_embedder import CLIPConfig, CLIPEembedder
+from src.embeddings.embedder import EmbedderConfig, LocalEmbedder
+
+
+# ================= CONFIG =================
+@dataclass
+class RegistryConfig:
+    # models not used for this long are released (None = keep until exit)
+    idle_unload_s: Optional[float] = None
+    sweep_every_s: float = 30.0
+
+
+# ================= ENTRY =================
+class _Entry:
+    def __init__(self, kind: str, name: str, loader: Callable[[], Any]):
+        self.kind = kind
+        self.name = name
+        self.loader = loader
+        self.lock = threading.Lock()       # one load per model, however many callers
+        self.instance: Any = None
+        self.ref: Optional[weakref.ref] = None
+        self.loads = 0
+        self.load_s = 0.0
+        self.last_used = 0.0
+        self.param_bytes = 0
+
+
+# ================= REGISTRY =================
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models, keyed by (kind, config).
+
+    get() loads a model on first use and hands the same instance to
+    every later caller, so the API, the reranker fallback and ingestion
+    share one copy of each model. Loading is serialized per model; the
+    instances themselves are inference-only and shared across threads.
+
+    With idle_unload_s set, models unused for that long are released:
+    the registry drops its reference and keeps a weak one, so a holder
+    that still uses the model keeps it (and get() returns that same
+    object instead of loading a second copy); it is freed once nobody
+    holds it. lazy() handles never hold the model between calls.
+    """
+
+    def __init__(self, cfg: Optional[RegistryConfig] = None):
+        self.cfg = cfg or RegistryConfig()
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._sweeper: Optional[threading.Thread] = None
+        self._start_sweeper()
+
+    def configure(self, cfg: RegistryConfig) -> None:
+        self.cfg = cfg
+        self._start_sweeper()
+
+    # ================= LOOKUP =================
+    def get(self, kind: str, name: str, loader: Callable[[], Any], key: Hashable = None) -> Any:
+        key = (kind, name, key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(kind, name, loader)
+
+        entry.last_used = time.time()
+        inst = entry.instance
+        if inst is not None:
+            return inst
+
+        with entry.lock:
+            if entry.instance is None:
+                # released while idle but still referenced somewhere: reuse it
+                inst = entry.ref() if entry.ref is not None else None
+                if inst is None:
+                    t0 = time.perf_counter()
+                    inst = entry.loader()
+                    entry.load_s = time.perf_counter() - t0
+                    entry.loads += 1
+                    entry.param_bytes = _param_bytes(inst)
+                    print(f"[models] loaded {kind} {name} in {entry.load_s:.1f}s")
+                entry.instance = inst
+                entry.ref = _weak(inst)
+            entry.last_used = time.time()
+            return entry.instance
+
+    def lazy(self, kind: str, name: str, loader: Callable[[], Any], key: Hashable = None) -> "LazyModel":
+        return LazyModel(self, kind, name, loader, key)
+
+    # ================= UNLOAD =================
+    def unload(self, kind: str, name: str, key: Hashable = None) -> bool:
+        entry = self._entries.get((kind, name, key))
+        if entry is None or entry.instance is None:
+            return False
+        with entry.lock:
+            entry.instance = None
+        print(f"[models] released {kind} {name}")
+        return True
+
+    def unload_idle(self, idle_s: Optional[float] = None) -> int:
+        idle_s = self.cfg.idle_unload_s if idle_s is None else idle_s
+        if idle_s is None:
+            return 0
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.items())
+        n = 0
+        for (kind, name, key), entry in entries:
+            if entry.instance is not None and now - entry.last_used >= idle_s:
+                n += self.unload(kind, name, key)
+        if n:
+            _release_memory()
+        return n
+
+    def _start_sweeper(self) -> None:
+        if self.cfg.idle_unload_s is None or (self._sweeper is not None and self._sweeper.is_alive()):
+            return
+        self._sweeper = threading.Thread(target=self._sweep, name="model-registry-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _sweep(self) -> None:
+        while self.cfg.idle_unload_s is not None:
+            time.sleep(self.cfg.sweep_every_s)
+            try:
+                self.unload_idle()
+            except Exception as e:
+                print("[models] idle unload failed:", e)
+
+    # ================= REPORT =================
+    def memory_report(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.values())
+
+        models = []
+        for e in entries:
+            alive = e.instance is not None or (e.ref is not None and e.ref() is not None)
+            models.append({
+                "kind": e.kind,
+                "name": e.name,
+                "loaded": e.instance is not None,
+                # released but still held by someone (not freed yet)
+                "referenced": alive and e.instance is None,
+                "loads": e.loads,
+                "load_s": round(e.load_s, 3),
+                "idle_s": round(now - e.last_used, 1) if e.last_used else None,
+                "param_mb": round(e.param_bytes / 1e6, 1) if alive else 0.0,
+            })
+        return {
+            "models": models,
+            "param_mb_total": round(sum(m["param_mb"] for m in models), 1),
+            "rss_mb": _rss_mb(),
+            "idle_unload_s": self.cfg.idle_unload_s,
+        }
+
+
+class LazyModel:
+    """
+    Stand-in for a registry model: attribute access resolves it through
+    the registry each time, so the model loads on first use and can be
+    released while idle without the holder noticing.
+    """
+
+    def __init__(self, registry: ModelRegistry, kind: str, name: str, loader: Callable[[], Any], key: Hashable):
+        self._spec: Tuple[ModelRegistry, str, str, Callable[[], Any], Hashable] = (registry, kind, name, loader, key)
+
+    def __getattr__(self, attr: str) -> Any:
+        registry, kind, name, loader, key = self.__dict__["_spec"]
+        return getattr(registry.get(kind, name, loader, key), attr)
+
+
+# ================= HELPERS =================
+def _weak(obj: Any) -> Optional[weakref.ref]:
+    try:
+        return weakref.ref(obj)
+    except TypeError:
+        return None
+
+
+def _param_bytes(obj: Any, depth: int = 3) -> int:
+    """Bytes of torch parameters / buffers (or the ONNX file) reachable from the model object."""
+    seen, total = set(), 0
+
+    def visit(o: Any, d: int) -> None:
+        nonlocal total
+        if o is None or id(o) in seen or d < 0:
+            return
+        seen.add(id(o))
+        if isinstance(getattr(o, "model_bytes", None), int):
+            total += o.model_bytes
+            return
+        if hasattr(o, "parameters") and hasattr(o, "buffers") and callable(o.parameters):
+            try:
+                for t in list(o.parameters()) + list(o.buffers()):
+                    total += t.numel() * t.element_size()
+                return
+            except Exception:
+                pass
+        for attr in ("model", "_emb", "_client", "client", "_ce", "encoder"):
+            visit(getattr(o, attr, None), d - 1)
+
+    visit(obj, depth)
+    return total
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1e6, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _release_memory() -> None:
+    import gc
+
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+
+
+# ================= SHARED MODELS =================
+_registry = ModelRegistry()
+
+
+def registry() -> ModelRegistry:
+    return _registry
+
+
+def _cfg_key(cfg: Any) -> Hashable:
+    return tuple(sorted(asdict(cfg).items()))
+
+
+def get_embedder(cfg: Optional[EmbedderConfig] = None) -> LocalEmbedder:
+    cfg = cfg or EmbedderConfig()
+    return _registry.get("embedder", cfg.model_name, lambda: LocalEmbedder(cfg), _cfg_key(cfg))
+
+
+def get_cross_encoder(model_name: str, backend: str = "torch", threads: int = 0) -> Any:
+    def load():
+        if backend == "onnx":
+            try:
+                from src.embeddings.onnx_backend import OnnxConfig, OnnxCrossEncoder
+                return OnnxCrossEncoder(model_name, OnnxConfig(threads=threads))
+            except Exception as e:
+                print("ONNX cross-encoder unavailable, using PyTorch:", e)
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(model_name)
+
+    return _registry.get("cross_encoder", model_name, load, (backend, threads))
+
+
+def get_clip(cfg: Optional[CLIPConfig] = None) -> CLIPEembedder:
+    cfg = cfg or CLIPConfig()
+    return _registry.get("clip", cfg.model_name, lambda: CLIPEembedder(cfg), _cfg_key(cfg))
+
+
+def lazy_clip(cfg: Optional[CLIPConfig] = None) -> CLIPEembedder:
+    """CLIP that loads on the first image query and can be released while idle."""
+    cfg = cfg or CLIPConfig()
+    return _registry.lazy("clip", cfg.model_name, lambda: CLIPEembedder(cfg), _cfg_key(cfg))
+
+
+def memory_report() -> Dict[str, Any]:
+    return _registry.memory_report()
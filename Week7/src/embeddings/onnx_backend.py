@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+ONNX_DIR = Path("src/models/onnx")
+META_FILE = "export.json"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+
+# ================= CONFIG =================
+@dataclass
+class OnnxConfig:
+    onnx_dir: str = str(ONNX_DIR)
+    quantize: bool = True      # dynamic int8 weights (MatMul / Gemm); False runs the fp32 export
+    threads: int = 0           # intra-op threads; 0 = cores available to this process
+    batch_size: int = 32
+
+
+def default_threads() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _model_dir(cfg: OnnxConfig, model_name: str) -> Path:
+    return Path(cfg.onnx_dir) / model_name.replace("/", "__")
+
+
+# ================= EXPORT =================
+def _export(hf_model, tokenizer, out_dir: Path, pair: bool, output: str) -> None:
+    import torch
+
+    sample = (["what is retrieval"], ["retrieval finds relevant chunks"]) if pair else (["what is retrieval"],)
+    enc = tokenizer(*sample, return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in enc]
+
+    class _Wrapper(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(input_names, args)), return_dict=False)[0]
+
+    axes = {n: {0: "batch", 1: "seq"} for n in input_names}
+    axes[output] = {0: "batch", 1: "seq"} if output == "last_hidden_state" else {0: "batch"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _Wrapper(hf_model.eval()),
+            tuple(enc[n] for n in input_names),
+            str(out_dir / FP32_FILE),
+            input_names=input_names,
+            output_names=[output],
+            dynamic_axes=axes,
+            opset_version=14,
+            do_constant_folding=True,
+        )
+    tokenizer.save_pretrained(str(out_dir))
+
+
+def _quantize(out_dir: Path) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(str(out_dir / FP32_FILE), str(out_dir / INT8_FILE), weight_type=QuantType.QInt8)
+
+
+def export_embedder(model_name: str, cfg: Optional[OnnxConfig] = None) -> Path:
+    """
+    Export a sentence-transformers bi-encoder (transformer only; pooling
+    and normalization run in numpy) and its int8 copy. Cached on disk.
+    """
+    cfg = cfg or OnnxConfig()
+    out_dir = _model_dir(cfg, model_name)
+    if (out_dir / META_FILE).exists():
+        return out_dir
+
+    from sentence_transformers import SentenceTransformer
+
+    t0 = time.perf_counter()
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = st[0], (st[1] if len(st) > 1 else None)
+
+    tmp = out_dir.with_name(out_dir.name + ".exporting")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    _export(transformer.auto_model, transformer.tokenizer, tmp, pair=False, output="last_hidden_state")
+    _quantize(tmp)
+
+    meta = {
+        "model_name": model_name,
+        "kind": "embedder",
+        "max_length": int(st.max_seq_length or 512),
+        "pooling": "cls" if getattr(pooling, "pooling_mode_cls_token", False) else "mean",
+    }
+    (tmp / META_FILE).write_text(json.dumps(meta, indent=1), encoding="utf-8")
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp, out_dir)
+    print(f"[onnx] exported {model_name} -> {out_dir} ({time.perf_counter() - t0:.1f}s)")
+    return out_dir
+
+
+def export_cross_encoder(model_name: str, cfg: Optional[OnnxConfig] = None) -> Path:
+    """Export a sentence-transformers CrossEncoder and its int8 copy. Cached on disk."""
+    cfg = cfg or OnnxConfig()
+    out_dir = _model_dir(cfg, model_name)
+    if (out_dir / META_FILE).exists():
+        return out_dir
+
+    from sentence_transformers import CrossEncoder
+
+    t0 = time.perf_counter()
+    ce = CrossEncoder(model_name, device="cpu")
+
+    tmp = out_dir.with_name(out_dir.name + ".exporting")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    _export(ce.model, ce.tokenizer, tmp, pair=True, output="logits")
+    _quantize(tmp)
+
+    # CrossEncoder.predict applies this to the logits (sigmoid for 1-label models
+    # unless the model config says otherwise)
+    act = getattr(ce, "activation_fn", None) or getattr(ce, "default_activation_function", None)
+    meta = {
+        "model_name": model_name,
+        "kind": "cross_encoder",
+        "max_length": int(getattr(ce, "max_length", None) or 512),
+        "activation": "sigmoid" if type(act).__name__ == "Sigmoid" else "identity",
+    }
+    (tmp / META_FILE).write_text(json.dumps(meta, indent=1), encoding="utf-8")
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp, out_dir)
+    print(f"[onnx] exported {model_name} -> {out_dir} ({time.perf_counter() - t0:.1f}s)")
+    return out_dir
+
+
+# ================= RUNTIME =================
+class _OnnxModel:
+    def __init__(self, model_dir: Path, cfg: OnnxConfig):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.cfg = cfg
+        self.meta: Dict[str, Any] = json.loads((model_dir / META_FILE).read_text(encoding="utf-8"))
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+
+        so = ort.SessionOptions()
+        # one request at a time per session, so all threads go to intra-op
+        so.intra_op_num_threads = cfg.threads or default_threads()
+        so.inter_op_num_threads = 1
+        so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        path = model_dir / (INT8_FILE if cfg.quantize else FP32_FILE)
+        self.model_bytes = path.stat().st_size
+        self.session = ort.InferenceSession(str(path), so, providers=["CPUExecutionProvider"])
+        self._inputs = [i.name for i in self.session.get_inputs()]
+        self.threads = so.intra_op_num_threads
+
+    def _run(self, *texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        enc = self.tokenizer(
+            *[list(t) for t in texts],
+            padding=True,
+            truncation=True,
+            max_length=self.meta["max_length"],
+            return_tensors="np",
+        )
+        feed = {n: np.asarray(enc[n], dtype=np.int64) for n in self._inputs}
+        return self.session.run(None, feed)[0], feed["attention_mask"]
+
+    def _batches(self, lengths: List[int]) -> List[np.ndarray]:
+        # similar lengths per batch -> less padding
+        order = np.argsort(lengths, kind="stable")
+        bs = max(1, self.cfg.batch_size)
+        return [order[i:i + bs] for i in range(0, len(order), bs)]
+
+
+class OnnxSentenceEncoder(_OnnxModel):
+    """Bi-encoder on onnxruntime: transformer in ONNX, pooling + normalize in numpy."""
+
+    def __init__(self, model_name: str, cfg: Optional[OnnxConfig] = None):
+        cfg = cfg or OnnxConfig()
+        super().__init__(export_embedder(model_name, cfg), cfg)
+
+    def encode(self, texts: List[str], normalize: bool = True) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        out: Optional[np.ndarray] = None
+        for idx in self._batches([len(t) for t in texts]):
+            hidden, mask = self._run([texts[i] for i in idx])
+            if self.meta["pooling"] == "cls":
+                pooled = hidden[:, 0]
+            else:
+                m = mask[..., None].astype(np.float32)
+                pooled = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+            if out is None:
+                out = np.zeros((len(texts), pooled.shape[1]), dtype=np.float32)
+            out[idx] = pooled
+
+        if normalize:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out
+
+
+class OnnxEmbeddings(Embeddings):
+    """LangChain Embeddings over OnnxSentenceEncoder (drop-in for HuggingFaceEmbeddings)."""
+
+    def __init__(self, model_name: str, cfg: Optional[OnnxConfig] = None, normalize: bool = True):
+        self.encoder = OnnxSentenceEncoder(model_name, cfg)
+        self.normalize = normalize
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encoder.encode(list(texts), self.normalize).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class OnnxCrossEncoder(_OnnxModel):
+    """CrossEncoder.predict on onnxruntime (same scores, incl. the activation)."""
+
+    def __init__(self, model_name: str, cfg: Optional[OnnxConfig] = None):
+        cfg = cfg or OnnxConfig()
+        super().__init__(export_cross_encoder(model_name, cfg), cfg)
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], **_: Any) -> np.ndarray:
+        pairs = list(pairs)
+        scores = np.zeros(len(pairs), dtype=np.float32)
+        for idx in self._batches([len(q) + len(d) for q, d in pairs]):
+            logits, _ = self._run([pairs[i][0] for i in idx], [pairs[i][1] for i in idx])
+            scores[idx] = logits.reshape(len(idx), -1)[:, 0]
+
+        if self.meta.get("activation") == "sigmoid":
+            scores = 1.0 / (1.0 + np.exp(-scores))
+        return scores
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import numpy as np
+
+from src.embeddings.embedding_cache import EmbeddingCache, EmbeddingCacheConfig, text_hash
+
+
+def _cache(tmp_path, **kw) -> EmbeddingCache:
+    return EmbeddingCache(EmbeddingCacheConfig(path=str(tmp_path / "cache.sqlite"), **kw))
+
+
+def _last_used(cache: EmbeddingCache, text: str) -> float:
+    row = cache._db.execute("SELECT last_used FROM embeddings WHERE h = ?", (text_hash(text),)).fetchone()
+    return float(row[0])
+
+
+def test_round_trip_is_bit_identical(tmp_path):
+    cache = _cache(tmp_path)
+    vecs = np.random.default_rng(0).standard_normal((2, 8)).astype(np.float32)
+    cache.put_many("m", ["a  b", "c"], vecs)
+
+    got = cache.get_many("m", ["a b", "x", "c", "a b"])     # whitespace-normalized keys
+    assert got[1] is None
+    assert np.array_equal(got[0], vecs[0]) and np.array_equal(got[3], vecs[0])
+    assert np.array_equal(got[2], vecs[1])
+    assert cache.get_many("other-model", ["c"]) == [None]
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_hits_defer_last_used(tmp_path):
+    cache = _cache(tmp_path, touch_flush_s=3600, touch_flush_every=3)
+    cache.put_many("m", ["a", "b", "c"], np.ones((3, 4)))
+    before = _last_used(cache, "a")
+
+    cache.get_many("m", ["a"])
+    assert _last_used(cache, "a") == before           # only recorded in memory
+    assert not cache._db.in_transaction
+
+    cache.get_many("m", ["b", "c"])                   # third touched key: one batched write
+    assert cache._touched == {}
+    assert _last_used(cache, "a") > before
+
+    cache.get_many("m", ["b"])
+    cache.flush()
+    assert cache._touched == {}
+
+
+def test_eviction_sees_pending_hits(tmp_path):
+    # 4 x 1KB vectors against a 3.5KB cap; evict down to 2 entries
+    cache = _cache(tmp_path, max_mb=3.5 / 1024, evict_to=0.6, check_every=10**6, touch_flush_s=3600)
+    cache.put_many("m", ["old", "b", "c", "d"], np.ones((4, 256)))
+    cache._db.execute("UPDATE embeddings SET last_used = 0 WHERE h = ?", (text_hash("old"),))
+    cache._db.commit()
+
+    cache.get_many("m", ["old"])                      # pending, not yet on disk
+    cache.evict()
+    assert cache.get_many("m", ["old"])[0] is not None
+    assert cache.stats()["entries"] == 2
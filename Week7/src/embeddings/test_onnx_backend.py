@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from src.embeddings.onnx_backend import OnnxConfig, OnnxCrossEncoder, OnnxSentenceEncoder
+
+
+class _Tokenizer:
+    """Word ids, right-padded like a HF tokenizer with padding=True."""
+
+    def __call__(self, *texts, padding, truncation, max_length, return_tensors):
+        rows = [[1 + sum(map(ord, w)) % 97 for w in " ".join(parts).split()][:max_length] for parts in zip(*texts)]
+        width = max(len(r) for r in rows)
+        ids = np.zeros((len(rows), width), dtype=np.int64)
+        mask = np.zeros_like(ids)
+        for i, r in enumerate(rows):
+            ids[i, : len(r)], mask[i, : len(r)] = r, 1
+        return {"input_ids": ids, "attention_mask": mask}
+
+
+class _Session:
+    """Hidden state per token from its id; padding positions get garbage."""
+
+    def __init__(self, logits: bool):
+        self.logits = logits
+        self.table = np.random.default_rng(0).standard_normal((98, 8)).astype(np.float32)
+
+    def run(self, _, feed):
+        ids, mask = feed["input_ids"], feed["attention_mask"]
+        hidden = self.table[ids] + (1 - mask)[..., None] * 100.0
+        if self.logits:
+            return [(hidden * mask[..., None]).sum(axis=(1, 2))[:, None] / 10.0]
+        return [hidden]
+
+
+def _model(cls, meta, batch_size):
+    m = cls.__new__(cls)                    # no export / onnxruntime needed
+    m.cfg = OnnxConfig(batch_size=batch_size)
+    m.meta = {"max_length": 16, **meta}
+    m.tokenizer = _Tokenizer()
+    m.session = _Session(logits=cls is OnnxCrossEncoder)
+    m._inputs = ["input_ids", "attention_mask"]
+    return m
+
+
+TEXTS = ["short", "a much longer text about retrieval and ranking", "two words",
+         "medium length text here", "x", "another fairly long sentence about invoices"]
+
+
+@pytest.mark.parametrize("pooling", ["mean", "cls"])
+def test_encoder_batching_matches_one_text_at_a_time(pooling):
+    batched = _model(OnnxSentenceEncoder, {"pooling": pooling}, batch_size=4).encode(TEXTS)
+    single = _model(OnnxSentenceEncoder, {"pooling": pooling}, batch_size=1)
+    expected = np.concatenate([single.encode([t]) for t in TEXTS])
+    # length-sorted batches, padding masked out, rows back in input order
+    np.testing.assert_allclose(batched, expected, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(np.linalg.norm(batched, axis=1), 1.0, rtol=1e-5)
+    assert single.encode([]).shape == (0, 0)
+
+
+@pytest.mark.parametrize("activation", ["sigmoid", "identity"])
+def test_cross_encoder_batching_and_activation(activation):
+    pairs = [("leave policy", t) for t in TEXTS]
+    batched = _model(OnnxCrossEncoder, {"activation": activation}, batch_size=4).predict(pairs)
+    single = _model(OnnxCrossEncoder, {"activation": activation}, batch_size=1)
+    expected = np.concatenate([single.predict([p]) for p in pairs])
+    np.testing.assert_allclose(batched, expected, rtol=1e-5, atol=1e-6)
+    assert batched.dtype == np.float32
+    if activation == "sigmoid":
+        assert np.all((batched > 0) & (batched < 1))
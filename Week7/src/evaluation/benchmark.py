@@ -0,0 +1,610 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+BENCH_DIR = Path("src/data/bench")
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+# ================= CONFIG =================
+@dataclass
+class BenchConfig:
+    n_chunks: int = 10_000
+    seed: int = 0
+    # corpus shape
+    vocab_size: int = 30_000
+    n_topics: int = 200
+    topic_words: int = 150
+    topic_share: float = 0.7          # fraction of words drawn from the chunk's topic
+    min_words: int = 60
+    max_words: int = 160
+    chunks_per_doc: int = 20
+    # index
+    dim: int = 384
+    index_type: str = "flat"          # see src.pipelines.ann_index.INDEX_TYPES
+    build_batch: int = 10_000
+    # queries
+    n_queries: int = 200
+    query_words: int = 4
+    filter_share: float = 0.3         # queries carrying a year filter
+    top_k: int = 5
+    warmup: int = 10
+    threads: int = 1                  # >1 adds a concurrent QPS pass
+    rerank: bool = True
+
+
+# ================= OFFLINE EMBEDDER =================
+class HashingEmbeddings(Embeddings):
+    """
+    Signed feature hashing of word tokens into `dim` buckets, L2-normalized.
+    Deterministic, CPU-only and fast enough for 1M chunks, so index size
+    and latency can be benchmarked without downloading a model.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._slots: Dict[str, Tuple[int, float]] = {}
+
+    def _slot(self, tok: str) -> Tuple[int, float]:
+        hit = self._slots.get(tok)
+        if hit is None:
+            h = zlib.crc32(tok.encode("utf-8"))
+            hit = self._slots[tok] = (h % self.dim, 1.0 if (h >> 16) & 1 else -1.0)
+        return hit
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        from src.utils.text import simple_tokenize
+
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for tok in simple_tokenize(t):
+                j, sign = self._slot(tok)
+                out[i, j] += sign
+        out /= np.linalg.norm(out, axis=1, keepdims=True) + 1e-12
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+class HashingEmbedder:
+    """LocalEmbedder interface over HashingEmbeddings."""
+
+    model_name = "bench-hashing"
+
+    def __init__(self, dim: int = 384):
+        self._emb = HashingEmbeddings(dim)
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        return self._emb.embed_array(texts)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._emb.embed_array([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        return self._emb.embed_array(texts)
+
+    @property
+    def langchain_embeddings(self) -> HashingEmbeddings:
+        return self._emb
+
+
+# ================= SYNTHETIC CORPUS =================
+_SYLLABLES = [a + b for a in "bcdfghklmnprstvz" for b in "aeiou"]
+
+
+def _vocab(size: int, rng: np.random.Generator) -> List[str]:
+    words, seen = [], set()
+    while len(words) < size:
+        n = int(rng.integers(2, 5))
+        w = "".join(_SYLLABLES[i] for i in rng.integers(0, len(_SYLLABLES), n))
+        if w not in seen:
+            seen.add(w)
+            words.append(w)
+    return words
+
+
+def generate_corpus(cfg: BenchConfig, out_path: Path) -> Dict[str, Any]:
+    """
+    Write cfg.n_chunks synthetic chunks in chunks.jsonl format.
+    Each chunk mixes words from one topic with Zipf-distributed background
+    words, so both BM25 and vector search have something to find.
+    """
+    rng = np.random.default_rng(cfg.seed)
+    vocab = np.asarray(_vocab(cfg.vocab_size, rng))
+
+    zipf_cdf = np.cumsum(1.0 / np.arange(1, cfg.vocab_size + 1))
+    zipf_cdf /= zipf_cdf[-1]
+    topics = rng.integers(0, cfg.vocab_size, (cfg.n_topics, cfg.topic_words))
+    doc_types = ["policy", "report", "manual", "faq"]
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    t0 = time.time()
+
+    with out_path.open("w", encoding="utf-8") as f:
+        for start in range(0, cfg.n_chunks, cfg.build_batch):
+            n = min(cfg.build_batch, cfg.n_chunks - start)
+            lengths = rng.integers(cfg.min_words, cfg.max_words + 1, n)
+            chunk_topics = rng.integers(0, cfg.n_topics, n)
+
+            for j in range(n):
+                cid = start + j
+                L = int(lengths[j])
+                n_topic = int(L * cfg.topic_share)
+                words = np.concatenate([
+                    topics[chunk_topics[j], rng.integers(0, cfg.topic_words, n_topic)],
+                    np.searchsorted(zipf_cdf, rng.random(L - n_topic)),
+                ])
+                rng.shuffle(words)
+
+                doc = cid // cfg.chunks_per_doc
+                year = 2015 + doc % 11
+                md: Dict[str, Any] = {
+                    "source": f"bench_doc_{doc}_{year}.pdf",
+                    "page": cid % cfg.chunks_per_doc,
+                    "uploaded_at": 1.7e9 + doc,
+                    "tags": ["bench", f"topic{chunk_topics[j]}"],
+                }
+                if doc % 2:
+                    md["type"] = doc_types[doc % len(doc_types)]
+
+                f.write(json.dumps({"text": " ".join(vocab[words]), "metadata": md}) + "\n")
+
+    return {"chunks": cfg.n_chunks, "seconds": round(time.time() - t0, 2), "bytes": out_path.stat().st_size}
+
+
+# ================= BUILD =================
+def _iter_jsonl(path: Path, batch: int):
+    docs: List[Document] = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            docs.append(Document(page_content=rec["text"], metadata=rec.get("metadata", {}) or {}))
+            if len(docs) == batch:
+                yield docs
+                docs = []
+    if docs:
+        yield docs
+
+
+def build(cfg: BenchConfig, bench_dir: Path) -> Dict[str, Any]:
+    """
+    chunks.jsonl -> chunk store + FAISS vectorstore, the same layout the
+    retriever loads in production. Vectors are also kept in vectors.npy
+    for exact-search ground truth.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    from src.pipelines.ann_index import ANNConfig, new_index, save_params, index_type_of
+    from src.retriever.chunk_store import ChunkStore, ChunkStoreDocstore
+
+    jsonl = bench_dir / "chunks.jsonl"
+    store_dir = bench_dir / "store"
+    vs_dir = bench_dir / "vectorstore"
+    vs_dir.mkdir(parents=True, exist_ok=True)
+
+    report: Dict[str, Any] = {"generate": generate_corpus(cfg, jsonl)}
+    print(f"[bench] generated {cfg.n_chunks} chunks in {report['generate']['seconds']}s")
+
+    embedder = HashingEmbedder(cfg.dim)
+    vectors = np.lib.format.open_memmap(
+        bench_dir / "vectors.npy", mode="w+", dtype=np.float32, shape=(cfg.n_chunks, cfg.dim)
+    )
+
+    # -------- STORE + EMBED --------
+    store = ChunkStore.create(store_dir)
+    t_store = t_embed = 0.0
+    row = 0
+    for docs in _iter_jsonl(jsonl, cfg.build_batch):
+        t0 = time.time()
+        store.extend_corpus(store.append(docs))
+        t_store += time.time() - t0
+
+        t0 = time.time()
+        vectors[row : row + len(docs)] = embedder.embed_documents([d.page_content for d in docs])
+        t_embed += time.time() - t0
+        row += len(docs)
+    vectors.flush()
+
+    # BM25 postings are persisted at ingest time, like production
+    t0 = time.time()
+    from src.utils.text import simple_tokenize
+    from src.retriever.sparse_index import load_corpus_index
+
+    load_corpus_index(store, simple_tokenize)
+    t_bm25 = time.time() - t0
+
+    # -------- FAISS --------
+    t0 = time.time()
+    ann = ANNConfig(index_type=cfg.index_type)
+    sample = vectors[np.random.default_rng(cfg.seed).choice(cfg.n_chunks, min(cfg.n_chunks, 100_000), replace=False)]
+    index = new_index(cfg.dim, np.ascontiguousarray(sample), ann)
+    for start in range(0, cfg.n_chunks, cfg.build_batch):
+        index.add(np.ascontiguousarray(vectors[start : start + cfg.build_batch]))
+
+    vs = FAISS(
+        embedding_function=embedder.langchain_embeddings,
+        index=index,
+        docstore=ChunkStoreDocstore(store_dir),
+        index_to_docstore_id={i: str(i) for i in range(cfg.n_chunks)},
+    )
+    vs.save_local(str(vs_dir))
+
+    kind = index_type_of(index)
+    params: Dict[str, Any] = {"index_type": kind}
+    if kind == "hnsw":
+        params["ef_search"] = ann.ef_search
+    elif kind != "flat":
+        params["nprobe"] = ann.nprobe
+    save_params(params, vs_dir)
+    t_faiss = time.time() - t0
+
+    report.update(
+        {
+            "store_seconds": round(t_store, 2),
+            "embed_seconds": round(t_embed, 2),
+            "bm25_seconds": round(t_bm25, 2),
+            "faiss_seconds": round(t_faiss, 2),
+            "index_type": kind,
+            "disk_bytes": {
+                "store": _dir_bytes(store_dir),
+                "vectorstore": _dir_bytes(vs_dir),
+            },
+        }
+    )
+    (bench_dir / "build.json").write_text(json.dumps({"config": asdict(cfg), "build": report}, indent=2))
+    print(f"[bench] built store + {kind} index in {t_store + t_embed + t_bm25 + t_faiss:.1f}s")
+    return report
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+# ================= MEASURE =================
+def _proc_status_mb(field: str) -> Optional[float]:
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _rss_mb() -> Optional[float]:
+    return _proc_status_mb("VmRSS")
+
+
+def _peak_rss_mb() -> float:
+    # VmHWM is per address space; ru_maxrss on Linux also carries the
+    # parent's peak across fork + exec (the build step)
+    hwm = _proc_status_mb("VmHWM")
+    if hwm is not None:
+        return hwm
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentiles(ms: List[float]) -> Dict[str, float]:
+    if not ms:
+        return {}
+    a = np.asarray(ms)
+    return {
+        "n": int(len(a)),
+        "mean_ms": round(float(a.mean()), 3),
+        "p50_ms": round(float(np.percentile(a, 50)), 3),
+        "p95_ms": round(float(np.percentile(a, 95)), 3),
+        "p99_ms": round(float(np.percentile(a, 99)), 3),
+    }
+
+
+class _Timer:
+    def __init__(self):
+        self.ms: Dict[str, List[float]] = {}
+
+    def time(self, stage: str, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        self.ms.setdefault(stage, []).append((time.perf_counter() - t0) * 1000)
+        return out
+
+
+def make_queries(cfg: BenchConfig, bench_dir: Path) -> List[Dict[str, Any]]:
+    """
+    Queries built from words of a random chunk (its "answer"), a share
+    of them with that chunk's year as a filter.
+    """
+    from src.retriever.chunk_store import ChunkStore
+    from src.retriever.filter_index import _year_value
+
+    store = ChunkStore.open(bench_dir / "store")
+    rng = np.random.default_rng(cfg.seed + 1)
+    out = []
+    for cid in rng.choice(store.n, cfg.n_queries + cfg.warmup, replace=False):
+        words = store.text(int(cid)).split()
+        picks = rng.choice(len(words), min(cfg.query_words, len(words)), replace=False)
+        filters = None
+        if rng.random() < cfg.filter_share:
+            filters = {"year": _year_value(store.metadata(int(cid)))}
+        out.append({"query": " ".join(words[i] for i in sorted(picks)), "cid": int(cid), "filters": filters})
+    return out
+
+
+def _exact_topk(
+    vectors: np.ndarray,
+    qv: np.ndarray,
+    k: int,
+    mask: Optional[np.ndarray],
+    block: int = 50_000,
+) -> List[int]:
+    """Brute-force L2 top-k over the (optionally masked) stored vectors."""
+    best_d = np.zeros(0, dtype=np.float32)
+    best_i = np.zeros(0, dtype=np.int64)
+    for start in range(0, len(vectors), block):
+        X = np.asarray(vectors[start : start + block])
+        # ||x||^2 - 2 x.q ranks like the L2 distance, without an (n, d) temporary
+        d = np.einsum("ij,ij->i", X, X) - 2 * (X @ qv)
+        if mask is not None:
+            d[~mask[start : start + len(X)]] = np.inf
+        best_d = np.concatenate([best_d, d])
+        best_i = np.concatenate([best_i, np.arange(start, start + len(X))])
+        if len(best_d) > k:
+            keep = np.argpartition(best_d, k)[:k]
+            best_d, best_i = best_d[keep], best_i[keep]
+    order = np.argsort(best_d)
+    return [int(i) for i, d in zip(best_i[order], best_d[order]) if np.isfinite(d)][:k]
+
+
+def run(cfg: BenchConfig, bench_dir: Path) -> Dict[str, Any]:
+    """
+    Load the built indexes like production, replay the query set and
+    measure each stage one query at a time.
+    """
+    from src.retriever.hybrid_retriever import HybridRetriever, HybridRetrieverConfig
+    from src.retriever.query_context import QueryContext
+
+    rss_start = _rss_mb()
+    t0 = time.time()
+    retriever = HybridRetriever(
+        HybridRetrieverConfig(cache_max_entries=0, embedding_model_name=HashingEmbedder.model_name),
+        vectorstore_dir=bench_dir / "vectorstore",
+        chunks_jsonl=bench_dir / "chunks.jsonl",
+        store_dir=bench_dir / "store",
+        embedder=HashingEmbedder(cfg.dim),
+    )
+    load_s = time.time() - t0
+    rss_loaded = _rss_mb()
+    print(f"[bench] retriever loaded in {load_s:.1f}s (rss={rss_loaded} MB)")
+
+    reranker, build_context, ctx_cfg = None, None, None
+    if cfg.rerank:
+        try:
+            from src.pipelines.context_builder import ContextConfig, build_context
+            from src.retriever.reranker import Reranker
+
+            reranker, ctx_cfg = Reranker(), ContextConfig(top_k=cfg.top_k)
+        except Exception as e:
+            print("[bench] rerank / context stages skipped:", e)
+
+    queries = make_queries(cfg, bench_dir)
+    warm, queries = queries[: cfg.warmup], queries[cfg.warmup :]
+    for q in warm:
+        retriever.retrieve_candidates(q["query"], cfg.top_k, q["filters"])
+
+    timer = _Timer()
+    cand_n = max(1, cfg.top_k * retriever.cfg.candidate_multiplier)
+    ann_tops: List[Tuple[np.ndarray, List[int]]] = []
+    hits = 0
+
+    # -------- PER STAGE --------
+    for q in queries:
+        ctx = QueryContext(query=q["query"])
+        timer.time("embed", retriever.prepare_contexts, [ctx])
+        vec_mask, kw_mask = timer.time("filter_mask", retriever._masks, q["filters"])
+        vec = timer.time("vector_leg", retriever._vector_leg, ctx.vector[None, :], cand_n, vec_mask)
+        kw = timer.time("keyword_leg", retriever._keyword_leg, [ctx], cand_n, kw_mask)
+        docs = timer.time("fuse_mmr", retriever._fuse_all, [ctx], vec, kw, cand_n)[0]
+
+        ann_tops.append((ctx.vector, [int(retriever.faiss_cids[fid]) for fid, _ in vec[0][: cfg.top_k]]))
+        hits += q["cid"] in {int(d.id) for d in docs[: cfg.top_k] if d.id is not None}
+
+        if reranker is not None:
+            ranked = timer.time("rerank", reranker.rerank, q["query"], docs, cfg.top_k, ctx)
+            timer.time("build_context", build_context, [d for d, _ in ranked], ctx_cfg)
+
+    # -------- END TO END --------
+    e2e = []
+    t0 = time.perf_counter()
+    for q in queries:
+        t1 = time.perf_counter()
+        retriever.retrieve_candidates(q["query"], cfg.top_k, q["filters"])
+        e2e.append((time.perf_counter() - t1) * 1000)
+    wall = time.perf_counter() - t0
+
+    # -------- CONCURRENT QPS --------
+    qps_threads = None
+    if cfg.threads > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=cfg.threads) as ex:
+            list(ex.map(lambda q: retriever.retrieve_candidates(q["query"], cfg.top_k, q["filters"]), queries))
+        qps_threads = round(len(queries) / (time.perf_counter() - t0), 1)
+
+    # memory is read before the ground-truth pass, which scans every vector
+    rss = {"start": rss_start, "loaded": rss_loaded, "serving": _rss_mb(), "peak": _peak_rss_mb()}
+
+    # -------- RECALL --------
+    # vector leg top-k vs brute force over the same (filtered) vectors
+    vectors = np.load(bench_dir / "vectors.npy", mmap_mode="r")
+    vec_recall = []
+    for q, (qv, ann_top) in zip(queries, ann_tops):
+        vec_mask, _ = retriever._masks(q["filters"])
+        exact = _exact_topk(vectors, qv, cfg.top_k, vec_mask)
+        if exact:
+            vec_recall.append(len(set(ann_top) & set(exact)) / len(exact))
+
+    result: Dict[str, Any] = {
+        "chunks": retriever.store.n,
+        "queries": len(queries),
+        "index_type": _index_type(retriever),
+        "load_seconds": round(load_s, 2),
+        "stages": {name: _percentiles(ms) for name, ms in timer.ms.items()},
+        "retrieve_e2e": _percentiles(e2e),
+        "qps": round(len(queries) / wall, 1),
+        "recall": {
+            f"vector_recall@{cfg.top_k}": round(float(np.mean(vec_recall)), 4) if vec_recall else None,
+            f"hybrid_hit@{cfg.top_k}": round(hits / max(1, len(queries)), 4),
+        },
+        "rss_mb": rss,
+        "leg_stats": retriever.leg_counters(),
+    }
+    if qps_threads is not None:
+        result[f"qps_{cfg.threads}_threads"] = qps_threads
+
+    return result
+
+
+def _index_type(retriever) -> str:
+    from src.pipelines.ann_index import index_type_of
+
+    return index_type_of(retriever.vs.index)
+
+
+# ================= REGRESSION GATE =================
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """p95 latencies may grow by `tolerance` (fraction); recall may drop by 0.01."""
+    problems = []
+    base = {r["size"]: r for r in baseline.get("results", [])}
+
+    for r in current.get("results", []):
+        b = base.get(r["size"])
+        if b is None:
+            continue
+
+        stages = {**r.get("stages", {}), "retrieve_e2e": r.get("retrieve_e2e", {})}
+        b_stages = {**b.get("stages", {}), "retrieve_e2e": b.get("retrieve_e2e", {})}
+        for name, st in stages.items():
+            old = b_stages.get(name, {}).get("p95_ms")
+            if old and st.get("p95_ms", 0) > old * (1 + tolerance):
+                problems.append(f"{r['size']} {name} p95 {old} -> {st['p95_ms']} ms")
+
+        for name, val in r.get("recall", {}).items():
+            old = b.get("recall", {}).get(name)
+            if old is not None and val is not None and val < old - 0.01:
+                problems.append(f"{r['size']} {name} {old} -> {val}")
+
+    return problems
+
+
+# ================= CLI =================
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Retrieval benchmark on synthetic corpora")
+    p.add_argument("--sizes", nargs="+", default=["10k"], help="10k | 100k | 1m | any integer")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--top_k", type=int, default=5)
+    p.add_argument("--index_type", type=str, default="flat")
+    p.add_argument("--threads", type=int, default=1)
+    p.add_argument("--no_rerank", action="store_true")
+    p.add_argument("--rebuild", action="store_true", help="regenerate corpora even if present")
+    p.add_argument("--bench_dir", type=str, default=str(BENCH_DIR))
+    p.add_argument("--out", type=str, default="bench_results.json")
+    p.add_argument("--baseline", type=str, default=None, help="fail on regressions vs this results file")
+    p.add_argument("--tolerance", type=float, default=0.25)
+    # internal: one measurement in a fresh process (clean peak RSS)
+    p.add_argument("--_run_one", type=str, default=None, help=argparse.SUPPRESS)
+    return p.parse_args()
+
+
+def _size(label: str) -> int:
+    return SIZES.get(label.lower()) or int(label)
+
+
+def main() -> None:
+    args = parse_args()
+
+    if args._run_one:
+        bench_dir = Path(args._run_one)
+        cfg = BenchConfig(**json.loads((bench_dir / "build.json").read_text())["config"])
+        cfg.n_queries, cfg.top_k, cfg.threads = args.queries, args.top_k, args.threads
+        cfg.rerank = not args.no_rerank
+        print(json.dumps(run(cfg, bench_dir)))
+        return
+
+    results = []
+    for label in args.sizes:
+        n = _size(label)
+        bench_dir = Path(args.bench_dir) / f"{label}_{args.index_type}"
+        cfg = BenchConfig(n_chunks=n, index_type=args.index_type)
+
+        if args.rebuild or not (bench_dir / "build.json").exists():
+            build_report = build(cfg, bench_dir)
+        else:
+            build_report = json.loads((bench_dir / "build.json").read_text())["build"]
+
+        cmd = [
+            sys.executable, "-m", "src.evaluation.benchmark",
+            "--_run_one", str(bench_dir),
+            "--queries", str(args.queries),
+            "--top_k", str(args.top_k),
+            "--threads", str(args.threads),
+        ] + (["--no_rerank"] if args.no_rerank else [])
+
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stdout, proc.stderr)
+            raise RuntimeError(f"benchmark run failed for {label}")
+
+        res = json.loads(proc.stdout.strip().splitlines()[-1])
+        res.update({"size": label, "build": build_report})
+        results.append(res)
+
+        e2e = res["retrieve_e2e"]
+        print(
+            f"[bench] {label}: p50={e2e['p50_ms']}ms p95={e2e['p95_ms']}ms p99={e2e['p99_ms']}ms "
+            f"qps={res['qps']} peak_rss={res['rss_mb']['peak']}MB recall={res['recall']}"
+        )
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(f"[bench] wrote {args.out}")
+
+    if args.baseline:
+        problems = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for msg in problems:
+            print("[bench] REGRESSION:", msg)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
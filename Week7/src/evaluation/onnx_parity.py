@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from src.embeddings.onnx_backend import OnnxConfig, OnnxCrossEncoder, OnnxSentenceEncoder, default_threads
+
+SAMPLE_TEXTS = [
+    "Hybrid retrieval combines dense vectors with BM25 keyword scores.",
+    "The cross-encoder reranks the top candidates for each query.",
+    "Quarterly revenue grew 12% compared with the previous year.",
+    "Chunks are stored in a memory-mapped file and addressed by id.",
+    "Reciprocal rank fusion merges ranked lists without score calibration.",
+    "The invoice was paid thirty days after delivery.",
+    "Images are embedded with CLIP and searched by cosine similarity.",
+    "Generated SQL is validated before it is executed against SQLite.",
+]
+
+
+# ================= DATA =================
+def load_texts(n: int) -> List[str]:
+    """Chunk texts from the store (falls back to built-in sentences)."""
+    from src.retriever.chunk_store import STORE_DIR, ChunkStore
+
+    texts: List[str] = []
+    if ChunkStore.exists(STORE_DIR):
+        store = ChunkStore.open(STORE_DIR)
+        rng = np.random.default_rng(0)
+        for cid in rng.choice(store.n, min(n, store.n), replace=False):
+            texts.append(store.text(int(cid)))
+    while len(texts) < n:
+        texts.extend(SAMPLE_TEXTS[: n - len(texts)])
+    return texts
+
+
+def _throughput(fn: Callable[[], Any], n_items: int, repeats: int) -> float:
+    fn()  # warmup
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return round(n_items * repeats / (time.perf_counter() - t0), 1)
+
+
+def _topk_overlap(a: np.ndarray, b: np.ndarray, k: int) -> float:
+    """Mean overlap of the top-k neighbours each vector set gives every query."""
+    k = min(k, len(a) - 1)
+    if k <= 0:
+        return 1.0
+    sa, sb = a @ a.T, b @ b.T
+    np.fill_diagonal(sa, -np.inf)
+    np.fill_diagonal(sb, -np.inf)
+    ta, tb = np.argsort(-sa, axis=1)[:, :k], np.argsort(-sb, axis=1)[:, :k]
+    return float(np.mean([len(set(x) & set(y)) / k for x, y in zip(ta, tb)]))
+
+
+def _spearman(a: np.ndarray, b: np.ndarray) -> float:
+    ra, rb = np.argsort(np.argsort(a)), np.argsort(np.argsort(b))
+    return float(np.corrcoef(ra, rb)[0, 1]) if len(a) > 1 else 1.0
+
+
+# ================= CHECKS =================
+def check_embedder(model_name: str, texts: List[str], cfg: OnnxConfig, top_k: int, repeats: int) -> Dict[str, Any]:
+    from sentence_transformers import SentenceTransformer
+
+    ref = SentenceTransformer(model_name, device="cpu")
+    onnx = OnnxSentenceEncoder(model_name, cfg)
+
+    ev = np.asarray(ref.encode(texts, batch_size=cfg.batch_size, normalize_embeddings=True), dtype=np.float32)
+    ov = onnx.encode(texts, normalize=True)
+    cos = np.sum(ev * ov, axis=1)
+
+    return {
+        "model": model_name,
+        "cosine_min": round(float(cos.min()), 4),
+        "cosine_mean": round(float(cos.mean()), 4),
+        "topk_overlap": round(_topk_overlap(ev, ov, top_k), 4),
+        "torch_texts_per_s": _throughput(lambda: ref.encode(texts, batch_size=cfg.batch_size), len(texts), repeats),
+        "onnx_texts_per_s": _throughput(lambda: onnx.encode(texts), len(texts), repeats),
+    }
+
+
+def check_cross_encoder(model_name: str, texts: List[str], cfg: OnnxConfig, top_k: int, repeats: int) -> Dict[str, Any]:
+    from sentence_transformers import CrossEncoder
+
+    ref = CrossEncoder(model_name, device="cpu")
+    onnx = OnnxCrossEncoder(model_name, cfg)
+
+    # each text doubles as a query (first sentence) for every document
+    queries = [t.split(".")[0][:200] for t in texts[:4]]
+    overlaps, rhos, diffs = [], [], []
+    for q in queries:
+        pairs = [(q, d) for d in texts]
+        es = np.asarray(ref.predict(pairs, batch_size=cfg.batch_size), dtype=np.float32)
+        os_ = onnx.predict(pairs)
+        k = min(top_k, len(texts))
+        overlaps.append(len(set(np.argsort(-es)[:k]) & set(np.argsort(-os_)[:k])) / k)
+        rhos.append(_spearman(es, os_))
+        diffs.append(float(np.max(np.abs(es - os_))))
+
+    pairs = [(queries[0], d) for d in texts]
+    return {
+        "model": model_name,
+        "score_max_abs_diff": round(max(diffs), 4),
+        "spearman_min": round(min(rhos), 4),
+        "topk_overlap": round(float(np.mean(overlaps)), 4),
+        "torch_pairs_per_s": _throughput(lambda: ref.predict(pairs, batch_size=cfg.batch_size), len(pairs), repeats),
+        "onnx_pairs_per_s": _throughput(lambda: onnx.predict(pairs), len(pairs), repeats),
+    }
+
+
+# ================= CLI =================
+def main() -> None:
+    p = argparse.ArgumentParser(description="ONNX int8 vs PyTorch: retrieval parity and CPU throughput")
+    p.add_argument("--embedding_model", type=str, default="sentence-transformers/all-MiniLM-L6-v2")
+    p.add_argument("--cross_encoder_model", type=str, default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    p.add_argument("--n_texts", type=int, default=256)
+    p.add_argument("--top_k", type=int, default=10)
+    p.add_argument("--repeats", type=int, default=3)
+    p.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op threads (0 = all available)")
+    p.add_argument("--fp32", action="store_true", help="check the fp32 export instead of int8")
+    p.add_argument("--min_cosine", type=float, default=0.98)
+    p.add_argument("--min_topk", type=float, default=0.9)
+    p.add_argument("--out", type=str, default="onnx_parity.json")
+    args = p.parse_args()
+
+    cfg = OnnxConfig(quantize=not args.fp32, threads=args.threads)
+    texts = load_texts(args.n_texts)
+
+    emb = check_embedder(args.embedding_model, texts, cfg, args.top_k, args.repeats)
+    ce = check_cross_encoder(args.cross_encoder_model, texts, cfg, args.top_k, args.repeats)
+    emb["speedup"] = round(emb["onnx_texts_per_s"] / max(emb["torch_texts_per_s"], 1e-9), 2)
+    ce["speedup"] = round(ce["onnx_pairs_per_s"] / max(ce["torch_pairs_per_s"], 1e-9), 2)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "threads": cfg.threads or default_threads(),
+            "quantized": cfg.quantize,
+            "n_texts": len(texts),
+        },
+        "embedder": emb,
+        "cross_encoder": ce,
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print(f"[onnx] embedder: cos_min={emb['cosine_min']} top{args.top_k}={emb['topk_overlap']} speedup={emb['speedup']}x")
+    print(f"[onnx] cross-encoder: rho_min={ce['spearman_min']} top{args.top_k}={ce['topk_overlap']} speedup={ce['speedup']}x")
+    print(f"[onnx] wrote {args.out}")
+
+    problems = []
+    if emb["cosine_min"] < args.min_cosine:
+        problems.append(f"embedder cosine {emb['cosine_min']} < {args.min_cosine}")
+    for name, res in (("embedder", emb), ("cross-encoder", ce)):
+        if res["topk_overlap"] < args.min_topk:
+            problems.append(f"{name} top-{args.top_k} overlap {res['topk_overlap']} < {args.min_topk}")
+    for msg in problems:
+        print("[onnx] PARITY:", msg)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
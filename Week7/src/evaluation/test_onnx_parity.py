@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.evaluation.onnx_parity import SAMPLE_TEXTS, _spearman, _topk_overlap, load_texts
+from src.retriever.chunk_store import STORE_DIR, ChunkStore
+
+
+def test_topk_overlap():
+    rng = np.random.default_rng(0)
+    a = rng.standard_normal((20, 8)).astype(np.float32)
+    assert _topk_overlap(a, a.copy(), 5) == 1.0
+    assert _topk_overlap(a, a + 1e-6, 5) == 1.0
+    assert _topk_overlap(a, rng.standard_normal((20, 8)).astype(np.float32), 5) < 0.6
+    assert _topk_overlap(a[:1], a[:1], 5) == 1.0          # no neighbours to compare
+
+
+def test_spearman():
+    x = np.array([0.1, 0.5, 0.3, 0.9])
+    assert _spearman(x, x * 2 + 1) == 1.0                  # rank-only: monotone maps agree
+    assert _spearman(x, -x) == -1.0
+    assert _spearman(x[:1], x[:1]) == 1.0
+
+
+def test_load_texts_from_store_or_samples(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert load_texts(3) == SAMPLE_TEXTS[:3]
+
+    store = ChunkStore.create(STORE_DIR)
+    store.append([Document(page_content=f"stored chunk {i}", metadata={}) for i in range(4)])
+    texts = load_texts(6)
+    assert sorted(texts[:4]) == [f"stored chunk {i}" for i in range(4)]
+    assert texts[4:] == SAMPLE_TEXTS[:2]
+    assert load_texts(6) == texts                          # fixed seed
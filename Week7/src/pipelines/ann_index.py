@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+VECTORSTORE_DIR = Path("src/vectorstore")
+PARAMS_FILE = "index_params.json"
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+
+# ================= CONFIG =================
+@dataclass
+class ANNConfig:
+    index_type: str = "flat"          # flat | hnsw | ivf_flat | ivf_pq
+    # HNSW
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+    # IVF
+    nlist: int = 0                    # 0 -> 4 * sqrt(n)
+    nprobe: int = 8
+    # PQ
+    pq_m: int = 16                    # must divide the vector dim
+    pq_nbits: int = 8
+    # calibration
+    target_recall: float = 0.95
+    calib_queries: int = 200
+    calib_k: int = 10
+
+
+# ================= PARAMS FILE =================
+def load_params(vectorstore_dir: Path = VECTORSTORE_DIR) -> Dict[str, Any]:
+    p = Path(vectorstore_dir) / PARAMS_FILE
+    if not p.exists():
+        return {}
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except Exception as e:
+        print("[ann] could not read index params:", e)
+        return {}
+
+
+def save_params(params: Dict[str, Any], vectorstore_dir: Path = VECTORSTORE_DIR) -> None:
+    p = Path(vectorstore_dir) / PARAMS_FILE
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_text(json.dumps(params, indent=2), encoding="utf-8")
+
+
+# ================= BUILD =================
+def _ivf_nlist(cfg: ANNConfig, n: int) -> int:
+    # k-means wants ~39 points per centroid; shrink nlist on small corpora
+    nlist = cfg.nlist or int(4 * math.sqrt(n))
+    return max(1, min(nlist, n // 39))
+
+
+def _min_train(cfg: ANNConfig) -> int:
+    if cfg.index_type == "ivf_flat":
+        return 39
+    if cfg.index_type == "ivf_pq":
+        return 39 * 2 ** cfg.pq_nbits
+    return 0
+
+
+def new_index(dim: int, train_vectors: np.ndarray, cfg: ANNConfig):
+    """
+    Empty (but trained) L2 index of cfg.index_type, ready for .add().
+    Falls back to flat when there isn't enough data to train IVF/PQ.
+    L2 keeps distances compatible with LangChain's default FAISS store.
+    """
+    import faiss
+
+    n = len(train_vectors)
+    kind = cfg.index_type
+
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index_type {kind!r}; choose from {INDEX_TYPES}")
+
+    if n < _min_train(cfg):
+        print(f"[ann] only {n} vectors — too few to train {kind}, using flat")
+        kind = "flat"
+
+    if kind == "flat":
+        return faiss.IndexFlatL2(dim)
+
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, cfg.hnsw_m)
+        index.hnsw.efConstruction = cfg.ef_construction
+        index.hnsw.efSearch = cfg.ef_search
+        return index
+
+    nlist = _ivf_nlist(cfg, n)
+    quantizer = faiss.IndexFlatL2(dim)
+    if kind == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+    else:
+        if dim % cfg.pq_m:
+            raise ValueError(f"pq_m={cfg.pq_m} must divide dim={dim}")
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, cfg.pq_m, cfg.pq_nbits)
+
+    index.train(np.ascontiguousarray(train_vectors, dtype=np.float32))
+    index.nprobe = min(cfg.nprobe, nlist)
+    # direct map keeps reconstruct() (used by MMR) working on IVF
+    index.make_direct_map()
+    return index
+
+
+def index_type_of(index) -> str:
+    import faiss
+
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return "ivf_pq" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else "ivf_flat"
+    return "flat"
+
+
+def faiss_nlist(index) -> int:
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    return int(ivf.nlist) if ivf is not None else 0
+
+
+# ================= SERVING =================
+def apply_params(index, params: Dict[str, Any]) -> None:
+    """Set persisted efSearch / nprobe on a loaded index (no-op for flat)."""
+    import faiss
+
+    if isinstance(index, faiss.IndexHNSW) and params.get("ef_search"):
+        index.hnsw.efSearch = int(params["ef_search"])
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        if params.get("nprobe"):
+            ivf.nprobe = min(int(params["nprobe"]), ivf.nlist)
+        try:
+            ivf.make_direct_map()
+        except Exception as e:
+            print("[ann] direct map unavailable:", e)
+
+
+def load_tuned(vs, vectorstore_dir: Path = VECTORSTORE_DIR) -> None:
+    """Apply index_params.json to a LangChain FAISS store after load_local."""
+    params = load_params(vectorstore_dir)
+    if params:
+        apply_params(vs.index, params)
+
+
+def search_params(index, sel=None, selectivity: float = 1.0):
+    """
+    faiss SearchParameters of the right subtype for the index.
+    With a restrictive ID selector, nprobe / efSearch are widened
+    (by 1 / selectivity, capped) so filtered queries still find k hits.
+    """
+    import faiss
+
+    widen = 1.0 / max(selectivity, 1e-3)
+
+    if isinstance(index, faiss.IndexHNSW):
+        ef = int(min(4096, index.hnsw.efSearch * widen))
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=ef)
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        nprobe = int(min(ivf.nlist, math.ceil(ivf.nprobe * widen)))
+        return faiss.SearchParametersIVF(sel=sel, nprobe=nprobe)
+
+    return faiss.SearchParameters(sel=sel)
+
+
+# ================= CALIBRATION =================
+def _calibration_queries(vectors: np.ndarray, n: int, seed: int = 0) -> np.ndarray:
+    # stored vectors + noise, so the exact neighbour isn't trivially the query itself
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.choice(len(vectors), size=min(n, len(vectors)), replace=False)]
+    noisy = picks + rng.normal(scale=0.05, size=picks.shape).astype(np.float32)
+    noisy /= np.linalg.norm(noisy, axis=1, keepdims=True) + 1e-12
+    return np.ascontiguousarray(noisy, dtype=np.float32)
+
+
+def calibrate(
+    index,
+    vectors: np.ndarray,
+    cfg: ANNConfig,
+    queries: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Sweep efSearch (HNSW) or nprobe (IVF) against exact search and pick
+    the cheapest setting that reaches cfg.target_recall (recall@k).
+    Latency is measured one query at a time, like serving.
+    """
+    import faiss
+
+    kind = index_type_of(index)
+    if kind == "flat":
+        return {"index_type": "flat"}
+
+    q = queries if queries is not None else _calibration_queries(vectors, cfg.calib_queries)
+    k = cfg.calib_k
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    _, truth = exact.search(q, k)
+
+    if kind == "hnsw":
+        name = "ef_search"
+        sweep = [v for v in (16, 32, 64, 128, 256, 512) if v >= k]
+
+        def set_param(v):
+            index.hnsw.efSearch = v
+    else:
+        name = "nprobe"
+        ivf = faiss.try_extract_index_ivf(index)
+        sweep = sorted({min(ivf.nlist, 2 ** i) for i in range(0, 12)})
+
+        def set_param(v):
+            ivf.nprobe = v
+
+    table: List[Dict[str, float]] = []
+    for v in sweep:
+        set_param(v)
+        lat = []
+        found = np.zeros_like(truth)
+        for i in range(len(q)):
+            t0 = time.perf_counter()
+            _, ids = index.search(q[i : i + 1], k)
+            lat.append((time.perf_counter() - t0) * 1000)
+            found[i] = ids[0]
+
+        recall = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)]))
+        table.append(
+            {
+                name: v,
+                "recall": round(recall, 4),
+                "p50_ms": round(float(np.percentile(lat, 50)), 3),
+                "p99_ms": round(float(np.percentile(lat, 99)), 3),
+            }
+        )
+        print(f"[ann] {name}={v:<5} recall@{k}={recall:.3f}  p50={table[-1]['p50_ms']}ms")
+
+    ok = [row for row in table if row["recall"] >= cfg.target_recall]
+    best = ok[0] if ok else max(table, key=lambda r: r["recall"])
+    set_param(int(best[name]))
+
+    return {
+        "index_type": kind,
+        name: int(best[name]),
+        "calibration": {
+            "k": k,
+            "queries": int(len(q)),
+            "target_recall": cfg.target_recall,
+            "chosen": best,
+            "sweep": table,
+        },
+    }
+
+
+# ================= REBUILD =================
+def _all_vectors(vs, embedding_model_name: str) -> np.ndarray:
+    """
+    Every stored vector in FAISS id order. PQ codes are lossy, so an
+    IVF-PQ store is re-embedded from its docstore text instead.
+    """
+    index = vs.index
+    n = index.ntotal
+
+    if index_type_of(index) != "ivf_pq":
+        try:
+            apply_params(index, {})
+            return index.reconstruct_n(0, n)
+        except Exception as e:
+            print("[ann] reconstruct failed, re-embedding:", e)
+
+    from src.embeddings.embedder import EmbedderConfig
+    from src.embeddings.model_registry import get_embedder
+
+    embedder = get_embedder(EmbedderConfig(model_name=embedding_model_name))
+    texts = [vs.docstore.search(vs.index_to_docstore_id[i]).page_content for i in range(n)]
+    return np.asarray(embedder.embed_documents(texts), dtype=np.float32)
+
+
+def rebuild(
+    cfg: ANNConfig,
+    vectorstore_dir: Path = VECTORSTORE_DIR,
+    embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+    do_calibrate: bool = True,
+) -> Dict[str, Any]:
+    """
+    Rebuild the text vectorstore's index as cfg.index_type, keeping the
+    docstore and id mapping, optionally calibrate, and publish it with
+    its params as a new snapshot.
+    """
+    from src.embeddings.embedder import EmbedderConfig
+    from src.embeddings.model_registry import get_embedder
+    from src.retriever.snapshots import writer_lock
+
+    embeddings = get_embedder(EmbedderConfig(model_name=embedding_model_name)).langchain_embeddings
+    # no ingest may publish between loading this index and publishing its rebuild
+    with writer_lock(vectorstore_dir):
+        return _rebuild(cfg, vectorstore_dir, embeddings, embedding_model_name, do_calibrate)
+
+
+def _rebuild(
+    cfg: ANNConfig,
+    vectorstore_dir: Path,
+    embeddings: Any,
+    embedding_model_name: str,
+    do_calibrate: bool,
+) -> Dict[str, Any]:
+    from langchain_community.vectorstores import FAISS
+    from src.retriever.snapshots import index_dir, publish_snapshot
+
+    vs = FAISS.load_local(str(index_dir(vectorstore_dir)), embeddings, allow_dangerous_deserialization=True)
+
+    vectors = np.ascontiguousarray(_all_vectors(vs, embedding_model_name), dtype=np.float32)
+    n, dim = vectors.shape
+    print(f"[ann] rebuilding {n} vectors (dim={dim}) as {cfg.index_type}")
+
+    t0 = time.time()
+    index = new_index(dim, vectors, cfg)
+    index.add(vectors)
+    print(f"[ann] built in {time.time() - t0:.1f}s")
+
+    params: Dict[str, Any] = {"index_type": index_type_of(index), "build": asdict(cfg)}
+    if params["index_type"] == "hnsw":
+        params["ef_search"] = cfg.ef_search
+    elif params["index_type"] != "flat":
+        params["nprobe"] = cfg.nprobe
+        params["nlist"] = faiss_nlist(index)
+
+    if do_calibrate:
+        params.update(calibrate(index, vectors, cfg))
+
+    vs.index = index
+    name = publish_snapshot(vectorstore_dir, vs=vs, params=params)
+
+    print(f"[ann] saved {params['index_type']} index + {PARAMS_FILE} as snapshot {name}")
+    return params
+
+
+# ================= CLI =================
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Train / rebuild / calibrate the text FAISS index")
+    p.add_argument("--index_type", choices=INDEX_TYPES, default="hnsw")
+    p.add_argument("--hnsw_m", type=int, default=32)
+    p.add_argument("--ef_construction", type=int, default=200)
+    p.add_argument("--ef_search", type=int, default=64)
+    p.add_argument("--nlist", type=int, default=0)
+    p.add_argument("--nprobe", type=int, default=8)
+    p.add_argument("--pq_m", type=int, default=16)
+    p.add_argument("--pq_nbits", type=int, default=8)
+    p.add_argument("--target_recall", type=float, default=0.95)
+    p.add_argument("--calib_queries", type=int, default=200)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--no_calibrate", action="store_true")
+    p.add_argument("--calibrate_only", action="store_true", help="re-tune the existing index, no rebuild")
+    p.add_argument("--vectorstore_dir", type=str, default=str(VECTORSTORE_DIR))
+    p.add_argument("--embedding_model", type=str, default="sentence-transformers/all-MiniLM-L6-v2")
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    cfg = ANNConfig(
+        index_type=args.index_type,
+        hnsw_m=args.hnsw_m,
+        ef_construction=args.ef_construction,
+        ef_search=args.ef_search,
+        nlist=args.nlist,
+        nprobe=args.nprobe,
+        pq_m=args.pq_m,
+        pq_nbits=args.pq_nbits,
+        target_recall=args.target_recall,
+        calib_queries=args.calib_queries,
+        calib_k=args.k,
+    )
+    vs_dir = Path(args.vectorstore_dir)
+
+    if args.calibrate_only:
+        from langchain_community.vectorstores import FAISS
+        from src.embeddings.embedder import EmbedderConfig
+        from src.embeddings.model_registry import get_embedder
+        from src.retriever.snapshots import index_dir, publish_snapshot, writer_lock
+
+        embeddings = get_embedder(EmbedderConfig(model_name=args.embedding_model)).langchain_embeddings
+        with writer_lock(vs_dir):
+            current = index_dir(vs_dir)
+            vs = FAISS.load_local(str(current), embeddings, allow_dangerous_deserialization=True)
+            vectors = np.ascontiguousarray(_all_vectors(vs, args.embedding_model), dtype=np.float32)
+
+            params = {**load_params(current), **calibrate(vs.index, vectors, cfg)}
+            # same index files, new params: a snapshot that shares the index
+            publish_snapshot(vs_dir, params=params)
+        print(json.dumps({k: v for k, v in params.items() if k != "calibration"}, indent=2))
+        return
+
+    params = rebuild(cfg, vs_dir, args.embedding_model, do_calibrate=not args.no_calibrate)
+    print(json.dumps({k: v for k, v in params.items() if k != "calibration"}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
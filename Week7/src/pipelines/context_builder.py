@@ -8,6 +8,7 @@ from typing import Any, Dict, List, Optional, Tuple, Union
 from langchain_core.documents import Document
 
 from src.retriever.hybrid_retriever import HybridRetriever
+from src.retriever.query_context import QueryContext
 from src.retriever.reranker import Reranker
 
 
@@ -186,8 +187,9 @@ def run_once(query: str, cfg: ContextConfig) -> None:
             filters["type"] = cfg.doc_type
 
         retriever = HybridRetriever()
+        ctx = QueryContext(query=query)
         candidates = retriever.retrieve_candidates(
-            query, top_k=cfg.top_k, filters=filters
+            query, top_k=cfg.top_k, filters=filters, ctx=ctx
         )
 
         if not candidates:
@@ -195,7 +197,7 @@ def run_once(query: str, cfg: ContextConfig) -> None:
             return
 
         reranker = Reranker()
-        reranked = reranker.rerank(query, candidates, top_k=cfg.top_k)
+        reranked = reranker.rerank(query, candidates, top_k=cfg.top_k, ctx=ctx)
 
         final_docs = _safe_docs(reranked)
 
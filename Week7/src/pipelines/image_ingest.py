@@ -9,7 +9,8 @@ from typing import Any, Dict, List, Optional, Tuple
 import numpy as np
 from PIL import Image
 
-from src.embeddings.clip_embedder import CLIPConfig, CLIPEembedder
+from src.embeddings.clip_embedder import CLIPConfig
+from src.embeddings.model_registry import get_clip
 
 
 IMAGES_DIR = Path("src/data/images")  #  your folder
@@ -132,7 +133,7 @@ def main():
     if not cfg.images_dir.exists():
         raise SystemExit(f"Folder not found: {cfg.images_dir}")
 
-    clip = CLIPEembedder(CLIPConfig(model_name=cfg.clip_model))
+    clip = get_clip(CLIPConfig(model_name=cfg.clip_model))
 
     captioner = None
     if cfg.do_caption:
@@ -1,14 +1,20 @@
 from __future__ import annotations
 
-import json
+import argparse
+import contextlib
+import multiprocessing
+import queue
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
-from typing import Iterable, List
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from langchain_community.document_loaders import (
     PyPDFLoader,
-    TextLoader,
     CSVLoader,
     UnstructuredWordDocumentLoader,
 )
@@ -18,12 +24,29 @@ from langchain_community.vectorstores import FAISS
 import time
 
 from src.embeddings.embedder import EmbedderConfig, LocalEmbedder
+from src.embeddings.embedding_pool import EmbeddingPool, EmbeddingPoolConfig
+from src.embeddings.model_registry import get_embedder
+from src.pipelines.ann_index import ANNConfig, new_index, index_type_of
+from src.pipelines.manifest import (
+    config_hash,
+    file_sha256,
+    load_manifest,
+    manifest_key,
+    new_manifest,
+    plan_ingest,
+    record_file,
+    save_manifest,
+)
+from src.retriever.chunk_store import STORE_DIR, ChunkStoreDocstore, ensure_store
+from src.retriever.snapshots import current_name, index_dir, publish_snapshot, writer_lock
+from src.retriever.sparse_index import load_corpus_index
+from src.utils.index_generation import bump_generation
+from src.utils.text import simple_tokenize
 
 
 # ================= PATHS =================
 RAW_DIR = Path("src/data/raw")
 CHUNKS_DIR = Path("src/data/chunks")
-CHUNKS_JSONL = CHUNKS_DIR / "chunks.jsonl"
 VECTORSTORE_DIR = Path("src/vectorstore")
 
 for p in [RAW_DIR, CHUNKS_DIR, VECTORSTORE_DIR]:
@@ -38,22 +61,104 @@ class IngestConfig:
     chunk_max_tokens: int = 500
     chunk_overlap_tokens: int = 50
     embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # index type used when the vectorstore is created from scratch;
+    # existing indexes keep their type (retrain with python -m src.pipelines.ann_index)
+    index_type: str = "flat"
+    # TXT lines / CSV rows / DOCX elements are grouped into Documents of
+    # about this many characters as they are read (PDFs stream per page)
+    load_block_chars: int = 20_000
+
+
+# chunks embedded + written per step of an upload (run_ingestion)
+UPLOAD_BATCH = 256
 
 
 # ================= TOKENIZER =================
+# process-wide: each model's tokenizer is loaded once (None = not available)
+_tokenizers: Dict[str, Any] = {}
+_counters: Dict[str, "TokenCounter"] = {}
+_tokenizer_lock = threading.Lock()
+
+
 def _get_hf_tokenizer(model_name: str):
-    try:
-        from transformers import AutoTokenizer
-        return AutoTokenizer.from_pretrained(model_name, use_fast=True)
-    except Exception:
-        return None
+    with _tokenizer_lock:
+        if model_name not in _tokenizers:
+            try:
+                from transformers import AutoTokenizer
+                _tokenizers[model_name] = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+            except Exception:
+                _tokenizers[model_name] = None
+        return _tokenizers[model_name]
 
 
-def _token_length_fn_factory(model_name: str):
-    tok = _get_hf_tokenizer(model_name)
-    if tok is None:
-        return lambda text: max(1, int(len(text.split()) / 0.75))
-    return lambda text: len(tok.encode(text, add_special_tokens=False))
+def _approx_tokens(text: str) -> int:
+    return max(1, int(len(text.split()) / 0.75))
+
+
+class TokenCounter:
+    """
+    Memoized token lengths for one model's tokenizer (LRU, cache_size texts).
+    count() is the splitter's length_function (it re-measures the same
+    pieces while merging / overlapping); count_batch() encodes every
+    uncached text in one tokenizer call.
+    """
+
+    def __init__(self, model_name: str, cache_size: int = 8192):
+        self.tok = _get_hf_tokenizer(model_name)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _encode(self, texts: List[str]) -> List[int]:
+        if self.tok is None:
+            return [_approx_tokens(t) for t in texts]
+        enc = self.tok(
+            texts,
+            add_special_tokens=False,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )
+        return [len(ids) for ids in enc["input_ids"]]
+
+    def _get(self, text: str) -> Optional[int]:
+        with self._lock:
+            n = self._cache.get(text)
+            if n is not None:
+                self._cache.move_to_end(text)
+            return n
+
+    def _put(self, text: str, n: int) -> None:
+        with self._lock:
+            self._cache[text] = n
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def count(self, text: str) -> int:
+        n = self._get(text)
+        if n is None:
+            n = self._encode([text])[0]
+            self._put(text, n)
+        return n
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        out = [self._get(t) for t in texts]
+        todo = [i for i, n in enumerate(out) if n is None]
+        if todo:
+            for i, n in zip(todo, self._encode([texts[i] for i in todo])):
+                out[i] = n
+                self._put(texts[i], n)
+        return out
+
+
+def token_counter(model_name: str) -> TokenCounter:
+    """Shared TokenCounter per model name."""
+    with _tokenizer_lock:
+        counter = _counters.get(model_name)
+    if counter is None:
+        counter = TokenCounter(model_name)
+        with _tokenizer_lock:
+            counter = _counters.setdefault(model_name, counter)
+    return counter
 
 
 # ================= CLEAN =================
@@ -67,17 +172,73 @@ def clean_text(text: str) -> str:
 
 
 # ================= LOAD =================
-def _load_one_file(path: Path) -> List[Document]:
+SUPPORTED_EXTS = {".pdf", ".txt", ".md", ".csv", ".docx", ".doc"}
+
+
+def _group_blocks(
+    docs: Iterable[Document],
+    block_chars: int,
+    keep: Tuple[str, ...] = ("source",),
+) -> Iterator[Document]:
+    """
+    Merge consecutive small Documents (CSV rows, DOCX elements) into
+    blocks of about block_chars; metadata comes from a block's first
+    Document (only the `keep` keys) plus "rows" = how many it holds.
+    """
+    parts: List[str] = []
+    size = 0
+    first: Optional[Document] = None
+
+    def block() -> Document:
+        meta = {k: first.metadata[k] for k in keep if k in first.metadata}
+        meta["rows"] = len(parts)
+        return Document(page_content="\n".join(parts), metadata=meta)
+
+    for d in docs:
+        if first is None:
+            first = d
+        parts.append(d.page_content)
+        size += len(d.page_content) + 1
+        if size >= block_chars:
+            yield block()
+            parts, size, first = [], 0, None
+    if parts:
+        yield block()
+
+
+def _iter_text(path: Path, block_chars: int) -> Iterator[Document]:
+    # line-aligned blocks; never holds more than one block of the file
+    with path.open("r", encoding="utf-8") as f:
+        buf: List[str] = []
+        size = 0
+        for line in f:
+            buf.append(line)
+            size += len(line)
+            if size >= block_chars:
+                yield Document(page_content="".join(buf), metadata={"source": str(path)})
+                buf, size = [], 0
+        if buf:
+            yield Document(page_content="".join(buf), metadata={"source": str(path)})
+
+
+def _iter_file(path: Path, block_chars: int = IngestConfig.load_block_chars) -> Iterator[Document]:
+    """
+    Page / row-group sized Documents, yielded as the file is parsed, so
+    nothing holds the whole document. PDFs stream per page, CSVs per row
+    group, TXT per line-aligned block; DOCX is partitioned by unstructured
+    in one pass and its elements grouped into blocks.
+    """
     ext = path.suffix.lower()
     if ext == ".pdf":
-        return PyPDFLoader(str(path)).load()
-    if ext in [".txt", ".md"]:
-        return TextLoader(str(path), encoding="utf-8").load()
-    if ext == ".csv":
-        return CSVLoader(str(path), encoding="utf-8").load()
-    if ext in [".docx", ".doc"]:
-        return UnstructuredWordDocumentLoader(str(path)).load()
-    return []
+        yield from PyPDFLoader(str(path)).lazy_load()
+    elif ext in [".txt", ".md"]:
+        yield from _iter_text(path, block_chars)
+    elif ext == ".csv":
+        rows = CSVLoader(str(path), encoding="utf-8").lazy_load()
+        yield from _group_blocks(rows, block_chars, keep=("source", "row"))
+    elif ext in [".docx", ".doc"]:
+        elements = UnstructuredWordDocumentLoader(str(path), mode="elements").lazy_load()
+        yield from _group_blocks(elements, block_chars, keep=("source", "page_number"))
 
 
 # ================= METADATA =================
@@ -85,107 +246,107 @@ def enrich_metadata(
     docs: Iterable[Document],
     tags: List[str],
     file_path: str
-) -> List[Document]:
-    out = []
-
+) -> Iterator[Document]:
     filename = Path(file_path).name
 
     for d in docs:
-        out.append(
-            Document(
-                page_content=d.page_content,
-                metadata={
-                    **d.metadata,
-                    "source": filename,
-                    "uploaded_at": time.time(),
-                    "tags": tags,
-                }
-            )
+        yield Document(
+            page_content=d.page_content,
+            metadata={
+                **d.metadata,
+                "source": filename,
+                "uploaded_at": time.time(),
+                "tags": tags,
+            }
         )
-    return out
 
 
 # ================= CHUNK =================
-def chunk_documents(docs: List[Document], cfg: IngestConfig) -> List[Document]:
-    length_fn = _token_length_fn_factory(cfg.embedding_model_name)
+def _iter_split(docs: Iterable[Document], cfg: IngestConfig, stats: Dict[str, int]) -> Iterator[Document]:
+    """
+    Clean + split page by page; every chunk gets metadata["tokens"] (its
+    token count under the embedding model's tokenizer), so nothing
+    downstream has to tokenize it again.
+    """
+    counter = token_counter(cfg.embedding_model_name)
 
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=cfg.chunk_max_tokens,
         chunk_overlap=cfg.chunk_overlap_tokens,
-        length_function=length_fn,
+        length_function=counter.count,
     )
 
-    cleaned = [
-        Document(page_content=clean_text(d.page_content), metadata=d.metadata)
-        for d in docs
-        if clean_text(d.page_content)
-    ]
-
-    chunks = splitter.split_documents(cleaned)
-    filtered = [c for c in chunks if length_fn(c.page_content) >= cfg.chunk_min_tokens]
-
-    print(
-        f"[ingest] pages={len(docs)} | cleaned={len(cleaned)} | "
-        f"chunks={len(chunks)} | after_filter={len(filtered)}"
-    )
+    for d in docs:
+        stats["pages"] += 1
+        text = clean_text(d.page_content)
+        if not text:
+            continue
+        stats["cleaned"] += 1
 
-    return filtered
+        chunks = splitter.split_documents([Document(page_content=text, metadata=d.metadata)])
+        for c, n in zip(chunks, counter.count_batch([c.page_content for c in chunks])):
+            c.metadata["tokens"] = n
+        stats["chunks"] += len(chunks)
+        yield from chunks
 
 
-# ================= CLEAN OLD JSONL ENTRIES =================
-#To remove old/incorrect chunk entries from chunks.jsonl that contain file paths instead of clean filenames
-def _clean_chunks_jsonl() -> None:
+def iter_chunks(
+    docs: Iterable[Document],
+    cfg: IngestConfig,
+    stats: Optional[Dict[str, Any]] = None,
+    fallback: bool = False,
+) -> Iterator[Document]:
     """
-     FIX for old PDFs appearing in answers:
+    Chunks over chunk_min_tokens, yielded as pages come in. fallback:
+    if the filter would drop everything, yield all non-empty chunks
+    instead (short chunks are only held until the first one passes).
     """
-    if not CHUNKS_JSONL.exists():
-        return
+    stats = stats if stats is not None else {}
+    for k in ("pages", "cleaned", "chunks", "kept"):
+        stats.setdefault(k, 0)
 
-    clean_lines = []
-    dirty_count = 0
+    short: List[Document] = []
+    for c in _iter_split(docs, cfg, stats):
+        if c.metadata["tokens"] >= cfg.chunk_min_tokens:
+            short = []
+            stats["kept"] += 1
+            yield c
+        elif fallback and not stats["kept"] and c.page_content.strip():
+            short.append(c)
 
-    with CHUNKS_JSONL.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                rec = json.loads(line)
-                source = rec.get("metadata", {}).get("source", "")
-                # Reject entries whose source contains any path separator
-                if "/" not in source and "\\" not in source:
-                    clean_lines.append(line)
-                else:
-                    dirty_count += 1
-            except Exception:
-                continue
+    if short:
+        print("[ingest] WARNING: min-token filter removed all chunks — using fallback")
+        stats["kept"] += len(short)
+        yield from short
 
-    if dirty_count > 0:
-        print(
-            f"[ingest] Removed {dirty_count} old bad-path entries from chunks.jsonl"
-        )
-        with CHUNKS_JSONL.open("w", encoding="utf-8") as f:
-            for line in clean_lines:
-                f.write(line + "\n")
-    else:
-        print("[ingest] chunks.jsonl is clean — no dirty entries found")
+    print(
+        f"[ingest] pages={stats['pages']} | cleaned={stats['cleaned']} | "
+        f"chunks={stats['chunks']} | after_filter={stats['kept']}"
+    )
 
 
-# ================= SAVE CHUNKS JSONL =================
-def save_chunks_jsonl(chunks: List[Document]) -> None:
+def chunk_documents(
+    docs: Iterable[Document],
+    cfg: IngestConfig,
+    stats: Optional[Dict[str, Any]] = None,
+    fallback: bool = False,
+) -> List[Document]:
+    return list(iter_chunks(docs, cfg, stats, fallback))
+
+
+# ================= KEYWORD INDEX =================
+def update_keyword_index(cids: List[int]) -> None:
     """
-    Appends new chunks to chunks.jsonl incrementally.
-    HybridRetriever reads this at startup to build its BM25 corpus.
+    Adds new chunks (already written by IndexWriter.add) to the chunk
+    store's keyword corpus and updates the persisted BM25 index
+    HybridRetriever loads at startup.
     Without this, BM25 and FAISS go out of sync → causes retrieval errors.
     """
-    CHUNKS_JSONL.parent.mkdir(parents=True, exist_ok=True)
-    with CHUNKS_JSONL.open("a", encoding="utf-8") as f:
-        for chunk in chunks:
-            record = {
-                "text": chunk.page_content,
-                "metadata": chunk.metadata,
-            }
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    store = ensure_store()
+    store.extend_corpus(cids)
+
+    # persist BM25 postings / stats so retriever startup is a load
+    load_corpus_index(store, simple_tokenize)
 
 
 # ================= EMBEDDER (with torch meta fix) =================
@@ -194,6 +355,8 @@ def _make_embedder(model_name: str) -> LocalEmbedder:
     Handles torch meta tensor error:
     'Cannot copy out of meta tensor; no data!'
     Clearing CUDA cache before loading avoids this.
+    The model comes from the process-wide registry: later calls (and the
+    retriever / reranker in the same process) reuse the loaded copy.
     """
     try:
         import torch
@@ -202,7 +365,7 @@ def _make_embedder(model_name: str) -> LocalEmbedder:
     except Exception:
         pass
 
-    return LocalEmbedder(
+    return get_embedder(
         EmbedderConfig(
             model_name=model_name,
             normalize_embeddings=True,
@@ -211,117 +374,693 @@ def _make_embedder(model_name: str) -> LocalEmbedder:
 
 
 # ================= FAISS (INCREMENTAL) =================
-def build_faiss(chunks: List[Document], embedder: LocalEmbedder) -> None:
-    index_path = VECTORSTORE_DIR / "index.faiss"
-
-    if index_path.exists():
-        vs = FAISS.load_local(
-            str(VECTORSTORE_DIR),
-            embedder.langchain_embeddings,
-            allow_dangerous_deserialization=True,
+class IndexWriter:
+    """
+    Appends chunks batch by batch: text/metadata to the chunk store
+    (setting chunk.id), vectors to the FAISS index. Nothing is kept per
+    chunk besides what FAISS itself stores, so a bulk run's memory does
+    not grow with Documents / embedding lists. save() publishes the index
+    as a new snapshot and is the checkpoint; call it after the batch's
+    other store changes (corpus, tombstones) so the snapshot pins them.
+
+    A new non-flat index is trained on the first train_size vectors
+    (buffered until then, or until the first save()).
+
+    The vectorstore's writer_lock is held from loading the current index
+    until close(), so another process (CLI vs API ingest) waits instead of
+    publishing a snapshot built on the same base. Use it as a context
+    manager or call close().
+    """
+
+    def __init__(
+        self,
+        embedder: LocalEmbedder,
+        ann: Optional[ANNConfig] = None,
+        train_size: int = 20000,
+    ):
+        self.embedder = embedder
+        self.ann = ann
+        self.train_size = train_size
+        # migrates an older vectorstore (pickled docstore) on first use
+        self.store = ensure_store()
+        self.vs: Optional[FAISS] = None
+        self._created = False
+        self._buffer: List[Tuple[List[str], List[Any], List[dict], List[str]]] = []
+        self._buffered = 0
+        self._published: Optional[Tuple[Tuple[int, int, int], str]] = None
+
+        self._lock = contextlib.ExitStack()
+        self._lock.enter_context(writer_lock(VECTORSTORE_DIR))
+        try:
+            current = index_dir(VECTORSTORE_DIR)
+            if (current / "index.faiss").exists():
+                self.vs = FAISS.load_local(
+                    str(current),
+                    embedder.langchain_embeddings,
+                    allow_dangerous_deserialization=True,
+                )
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """Release the writer lock; unsaved additions are not published."""
+        self._lock.close()
+
+    def __enter__(self) -> "IndexWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def add(self, chunks: List[Document], vectors: List[Any]) -> List[int]:
+        cids = self.store.append(chunks)
+        batch = (
+            [c.page_content for c in chunks],
+            list(vectors),
+            [c.metadata for c in chunks],
+            [str(cid) for cid in cids],
         )
-        vs.add_documents(chunks)
-    else:
-        vs = FAISS.from_documents(chunks, embedder.langchain_embeddings)
 
-    vs.save_local(str(VECTORSTORE_DIR))
+        if self.vs is not None:
+            self._add(batch)
+        else:
+            self._buffer.append(batch)
+            self._buffered += len(cids)
+            if self._buffered >= self.train_size:
+                self._create()
+        return cids
+
+    def _add(self, batch) -> None:
+        texts, vectors, metadatas, ids = batch
+        self.vs.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+
+    def _create(self) -> None:
+        batches, self._buffer, self._buffered = self._buffer, [], 0
+        if not batches:
+            return
+
+        ann = self.ann
+        if ann is None or ann.index_type == "flat":
+            texts, vectors, metadatas, ids = batches[0]
+            self.vs = FAISS.from_embeddings(
+                list(zip(texts, vectors)),
+                self.embedder.langchain_embeddings,
+                metadatas=metadatas,
+                ids=ids,
+                docstore=ChunkStoreDocstore(STORE_DIR),
+            )
+            batches = batches[1:]
+        else:
+            import numpy as np
+
+            arr = np.asarray([v for b in batches for v in b[1]], dtype=np.float32)
+            self.vs = FAISS(
+                embedding_function=self.embedder.langchain_embeddings,
+                index=new_index(arr.shape[1], arr, ann),
+                docstore=ChunkStoreDocstore(STORE_DIR),
+                index_to_docstore_id={},
+            )
+            del arr
+        self._created = True
+
+        for batch in batches:
+            self._add(batch)
+
+    def save(self) -> Optional[str]:
+        """Publish the index + chunk store state as a snapshot (checkpoint)."""
+        if self._buffer:
+            self._create()
+        if self.vs is None:
+            return None
+
+        # FAISS only grows with the store, so equal counts = nothing to publish
+        self.store.refresh()
+        state = (self.store.n, self.store.corpus_n, len(self.store.tombstones))
+        if self._published is not None and self._published[0] == state:
+            return self._published[1]
+
+        params = None
+        if self._created and self.ann is not None:
+            params = {"index_type": index_type_of(self.vs.index)}
+            if params["index_type"] == "hnsw":
+                params["ef_search"] = self.ann.ef_search
+            elif params["index_type"] != "flat":
+                params["nprobe"] = self.ann.nprobe
+
+        # written to a new directory, then CURRENT is flipped: readers never
+        # see a torn index or a FAISS / BM25 pair from different runs
+        name = publish_snapshot(VECTORSTORE_DIR, vs=self.vs, store=self.store, params=params)
+        self._created = False
+        self._published = (state, name)
+        return name
+
+
+def build_faiss(
+    chunks: List[Document],
+    embedder: LocalEmbedder,
+    ann: Optional[ANNConfig] = None,
+    vectors: Optional[List[List[float]]] = None,
+) -> List[List[float]]:
+    """
+    Embeds the chunks once (unless vectors are given) and adds them to
+    the on-disk index in one go (see IndexWriter for streaming).
+    Text and metadata go to the chunk store (setting chunk.id); the
+    FAISS docstore only references them by chunk id.
+    A new index is created as ann.index_type (flat by default).
+    Returns the vectors so a live retriever can reuse them (add_chunks).
+    """
+    if vectors is None:
+        vectors = embedder.embed_documents([c.page_content for c in chunks])
+
+    with IndexWriter(embedder, ann, train_size=max(1, len(chunks))) as writer:
+        writer.add(chunks, vectors)
+        writer.save()
+    return vectors
 
 
 # ================= API FUNCTION =================
-def run_ingestion(file_path: str) -> dict:
+def run_ingestion(
+    file_path: str,
+    on_indexed: Optional[Callable[[List[Document], List[List[float]]], object]] = None,
+    on_replaced: Optional[Callable[[List[int]], object]] = None,
+    embedder: Optional[LocalEmbedder] = None,
+    on_progress: Optional[Callable[[str, float], object]] = None,
+) -> dict:
     """
-    Called by FastAPI /ingest endpoint when user uploads a file.
+    Ingests one uploaded file (run by the ingest job worker, see
+    src.pipelines.ingest_jobs).
+    on_indexed(chunks, vectors) runs for every batch as it is written;
+    the chunks only become visible when the snapshot is published, so a
+    live retriever (HybridRetriever.add_chunks) is updated once the job
+    has finished.
+    on_replaced(cids) gets the chunks of the file's previous version
+    (e.g. HybridRetriever.remove_chunks). Re-uploading an unchanged
+    file is a no-op.
+    embedder: reuse a loaded model (a long-lived worker); on_progress(stage,
+    fraction) reports how far the job is.
 
     Flow:
-      1. Clean old bad-path entries from chunks.jsonl  ← fixes old PDFs in answers
-      2. Load file
+      1. Skip if the manifest has the same content hash + config
+      2. Stream the file page by page (row groups for CSV)
       3. Enrich metadata — source = bare filename only
-      4. Chunk with lowered min (30 tokens)
-      5. Fallback if still empty
-      6. Build/update FAISS
-      7. Append to chunks.jsonl for BM25
-    """
-    # Step 1: Remove old dirty entries every time a new file is ingested
-    _clean_chunks_jsonl()
+      4. Chunk each page as it is read
+      5. Fallback if the min-token filter drops everything
+      6. Embed + add to the chunk store / FAISS every UPLOAD_BATCH chunks
+      7. Keyword corpus + BM25
+      8. Tombstone the previous version's chunks
+      9. Publish a snapshot (new chunks and removals become visible together)
+     10. Update the manifest, bump the index generation (drops cached results)
 
+    Steps 1-10 run under the vectorstore's writer_lock: a bulk CLI run can
+    neither publish nor rewrite the manifest in between.
+    """
     path = Path(file_path)
 
+    def progress(stage: str, fraction: float) -> None:
+        if on_progress is not None:
+            on_progress(stage, fraction)
+
     if not path.exists():
         raise ValueError(f"File not found: {file_path}")
 
-    docs = _load_one_file(path)
+    with writer_lock(VECTORSTORE_DIR):
+        return _ingest_file(path, on_indexed, on_replaced, embedder, progress)
 
-    if not docs:
-        raise ValueError("Unsupported or empty file")
 
+def _ingest_file(
+    path: Path,
+    on_indexed: Optional[Callable[[List[Document], List[List[float]]], object]],
+    on_replaced: Optional[Callable[[List[int]], object]],
+    embedder: Optional[LocalEmbedder],
+    progress: Callable[[str, float], None],
+) -> dict:
+    progress("hashing", 0.02)
     cfg = IngestConfig(tags=["uploaded", "rag"])
-    docs = enrich_metadata(docs, cfg.tags, file_path)
-    chunks = chunk_documents(docs, cfg)
+    cfg_hash = config_hash(cfg)
+    manifest = load_manifest() or new_manifest()
+    key = manifest_key(path, RAW_DIR)
+    sha = file_sha256(path)
+    entry = manifest["files"].get(key)
 
-    # Fallback: if min-token filter removed everything, keep all non-empty chunks
-    if not chunks:
-        print("[ingest] WARNING: min-token filter removed all chunks — using fallback")
-        length_fn = _token_length_fn_factory(cfg.embedding_model_name)
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=cfg.chunk_max_tokens,
-            chunk_overlap=cfg.chunk_overlap_tokens,
-            length_function=length_fn,
-        )
-        cleaned = [
-            Document(page_content=clean_text(d.page_content), metadata=d.metadata)
-            for d in docs
-            if clean_text(d.page_content)
-        ]
-        chunks = [
-            c for c in splitter.split_documents(cleaned)
-            if c.page_content.strip()
-        ]
-
-    if not chunks:
+    if entry is not None and entry["sha256"] == sha and entry["config"] == cfg_hash:
+        print(f"[ingest] Unchanged: {path.name} — skipped")
+        return {"status": "unchanged", "chunks": 0}
+
+    if path.suffix.lower() not in SUPPORTED_EXTS:
+        raise ValueError("Unsupported or empty file")
+
+    progress("loading", 0.05)
+    docs = enrich_metadata(_iter_file(path, cfg.load_block_chars), cfg.tags, str(path))
+    load_stats: Dict[str, Any] = {}
+    chunks = iter_chunks(docs, cfg, load_stats, fallback=True)
+
+    embedder = embedder or _make_embedder(cfg.embedding_model_name)
+    writer: Optional[IndexWriter] = None
+    cids: List[int] = []
+
+    try:
+        while True:
+            batch = list(islice(chunks, UPLOAD_BATCH))
+            if not batch:
+                break
+            # the total is unknown while the file streams: creep towards 0.8
+            progress("embedding", 0.1 + 0.7 * len(cids) / (len(cids) + 1024))
+            vectors = embedder.embed_documents([c.page_content for c in batch])
+
+            if writer is None:
+                writer = IndexWriter(embedder, ANNConfig(index_type=cfg.index_type))
+            cids.extend(writer.add(batch, vectors))
+            if on_indexed is not None:
+                on_indexed(batch, vectors)
+    except BaseException:
+        # unpublished, but already in the store: hide them from later snapshots
+        if cids:
+            ensure_store().tombstone(cids)
+        if writer is not None:
+            writer.close()
+        raise
+
+    if not load_stats["pages"]:
+        raise ValueError("Unsupported or empty file")
+
+    if not cids:
         raise ValueError(
             "No text could be extracted. This PDF may be a scanned image. "
             "Please use a text-based PDF."
         )
 
-    embedder = _make_embedder(cfg.embedding_model_name)
-    build_faiss(chunks, embedder)
-    save_chunks_jsonl(chunks)
+    with writer:
+        progress("indexing", 0.8)
+        update_keyword_index(cids)
+
+        # previous version of this file: tombstoned in the same snapshot
+        stale = list(entry["cids"]) if entry is not None else []
+        if stale:
+            ensure_store().tombstone(stale)
+
+        snapshot = writer.save()
+
+    if stale and on_replaced is not None:
+        on_replaced(stale)
+
+    record_file(manifest, key, path, sha, cfg_hash, cids)
+    save_manifest(manifest)
+
+    # invalidates retrieval / rerank caches keyed on the old index
+    bump_generation()
+
+    progress("done", 1.0)
+    print(f"[ingest]  Done: {path.name} → {len(cids)} chunks saved")
+    return {"status": "success", "chunks": len(cids), "replaced": len(stale), "snapshot": snapshot}
+
+
+# ================= PARALLEL BULK INGEST =================
+def _stream_file(path: str, cfg: IngestConfig, file_stats: Dict[str, float]) -> Iterator[Document]:
+    """
+    Load + enrich + chunk one file lazily: chunks come out while later
+    pages are still unread. file_stats gets "pages" and the parse
+    "seconds" (time spent inside this generator) as it goes.
+    """
+    file_stats.setdefault("seconds", 0.0)
+    docs = enrich_metadata(_iter_file(Path(path), cfg.load_block_chars), cfg.tags, path)
+    chunks = iter_chunks(docs, cfg, file_stats)
+
+    t0 = time.perf_counter()
+    for c in chunks:
+        file_stats["seconds"] += time.perf_counter() - t0
+        yield c
+        t0 = time.perf_counter()
+    file_stats["seconds"] += time.perf_counter() - t0
+
+
+def _parse_file(path: str, cfg: IngestConfig) -> Tuple[str, List[Document], Dict[str, float]]:
+    """Load + enrich + chunk one file. Runs in a worker process."""
+    file_stats: Dict[str, float] = {}
+    chunks = list(_stream_file(path, cfg, file_stats))
+    return path, chunks, file_stats
+
+
+def _iter_parsed(
+    files: List[Path],
+    cfg: IngestConfig,
+    workers: int,
+    queue_size: int,
+    stats: Dict[str, float],
+    stream_bytes: int = 0,
+) -> Iterator[Tuple[str, Iterable[Document], Dict[str, float]]]:
+    """
+    (path, chunks, file_stats) per file, in completion order. With
+    workers > 1, files fan out over a process pool and results wait in a
+    bounded queue: when the consumer (embedding) falls behind, no new
+    files are submitted.
+
+    Serially (and for files over stream_bytes in the parallel case) the
+    chunks are a generator parsed by the consumer as it embeds, so a
+    large file is never held in memory (or pickled) as a whole.
+    file_stats is complete once the chunks are exhausted.
+    """
+    if workers <= 1:
+        for fp in files:
+            file_stats: Dict[str, float] = {}
+            yield str(fp), _stream_file(str(fp), cfg, file_stats), file_stats
+        return
+
+    results: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    done = object()
+    # spawn: workers never inherit the embedding model / torch threads
+    ctx = multiprocessing.get_context("spawn")
+
+    def feed(pool: ProcessPoolExecutor) -> None:
+        # at most 2x workers files in flight; put() blocks on a full queue,
+        # so nothing new is submitted while the embedder is behind
+        todo = iter(files)
+        inflight: Dict[Any, Path] = {}
+        try:
+            while True:
+                while len(inflight) < 2 * workers:
+                    fp = next(todo, None)
+                    if fp is None:
+                        break
+                    if stream_bytes and fp.stat().st_size > stream_bytes:
+                        # parsed by the consumer, page by page
+                        file_stats: Dict[str, float] = {}
+                        results.put((str(fp), _stream_file(str(fp), cfg, file_stats), file_stats))
+                        continue
+                    inflight[pool.submit(_parse_file, str(fp), cfg)] = fp
+                if not inflight:
+                    break
+
+                finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    fp = inflight.pop(fut)
+                    try:
+                        item = fut.result()
+                    except Exception as e:
+                        print(f"Failed: {fp} ({e})")
+                        continue
+                    t0 = time.perf_counter()
+                    results.put(item)
+                    stats["producer_blocked_s"] += time.perf_counter() - t0
+        finally:
+            results.put(done)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        feeder = threading.Thread(target=feed, args=(pool,), daemon=True)
+        feeder.start()
+
+        while True:
+            item = results.get()
+            if item is done:
+                break
+            yield item
+
+        feeder.join()
+
+
+def _print_throughput(stats: Dict[str, float]) -> None:
+    def rate(n, s):
+        return f"{n / s:.1f}/s" if s > 0 else "-"
+
+    print("\n===== INGEST THROUGHPUT =====")
+    print(
+        f"parse : {int(stats['files'])} files, {int(stats['pages'])} pages, {int(stats['chunks'])} chunks | "
+        f"worker time {stats['parse_s']:.1f}s | {rate(stats['files'], stats['wall_s'])} files, "
+        f"{rate(stats['chunks'], stats['wall_s'])} chunks (wall)"
+    )
+    print(
+        f"embed : {int(stats['chunks'])} chunks in {stats['embed_s']:.1f}s | "
+        f"{rate(stats['chunks'], stats['embed_s'])} | waited for parsing {stats['embed_wait_s']:.1f}s"
+    )
+    if "cache_hit_rate" in stats:
+        print(f"cache : embedding cache hit rate {stats['cache_hit_rate']:.1%}")
+    print(f"queue : parsers blocked on a full queue {stats['producer_blocked_s']:.1f}s")
+    print(f"index : {stats['index_s']:.1f}s (chunk store + FAISS + BM25)")
+    print(f"total : {stats['wall_s'] + stats['index_s']:.1f}s")
+
 
-    print(f"[ingest]  Done: {path.name} → {len(chunks)} chunks saved")
-    return {"status": "success", "chunks": len(chunks)}
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Bulk ingest src/data/raw/")
+    p.add_argument("--workers", type=int, default=1, help="parser processes (1 = serial)")
+    p.add_argument("--queue_size", type=int, default=8, help="parsed files waiting for the embedder")
+    p.add_argument("--stream_mb", type=float, default=64.0,
+                   help="with --workers > 1, files over this size are streamed page by page in-process")
+    p.add_argument("--embed_batch", type=int, default=256, help="chunks per embedding call")
+    p.add_argument("--embed_workers", type=int, default=1,
+                   help="embedding processes (1 = in-process, 0 = available cores / --embed_threads)")
+    p.add_argument("--embed_threads", type=int, default=2, help="threads per embedding process")
+    p.add_argument("--checkpoint_every", type=int, default=20, help="save index + manifest every N batches")
+    return p.parse_args()
 
 
 # ================= CLI =================
 def main() -> None:
     """
-    Bulk ingest all files from src/data/raw/.
-    Usage: python -m src.pipelines.ingest
+    Incrementally ingest src/data/raw/.
+    Usage: python -m src.pipelines.ingest [--workers 4] [--embed_workers 0] [--checkpoint_every 20]
+
+    The manifest (content hash + chunking config per file) decides what
+    to do: unchanged files are skipped, changed files are re-ingested
+    and their old chunks tombstoned, deleted files are tombstoned.
+    Parsing / chunking fans out over --workers processes and streams
+    into a bounded queue; the embedder consumes it in --embed_batch
+    batches, each written to the chunk store / FAISS right away. With
+    --embed_workers != 1 each batch is encoded across a pool of model
+    processes (length-sorted slices, vectors back in chunk order).
+
+    Every --checkpoint_every batches the index, BM25 and manifest are
+    saved and finished files are recorded, so an interrupted run resumes
+    from its last checkpoint: chunks written after it are listed in
+    manifest["pending"] and tombstoned on the next run, and their files
+    are ingested again.
+
+    The whole run holds the vectorstore's writer_lock (manifest read,
+    checkpoints, final save), so API ingest jobs wait for it to finish.
     """
-    all_chunks: List[Document] = []
+    args = parse_args()
+    with writer_lock(VECTORSTORE_DIR):
+        _ingest_raw(args)
+
+
+def _ingest_raw(args: argparse.Namespace) -> None:
     cfg = IngestConfig(tags=["bulk"])
+    cfg_hash = config_hash(cfg)
+    files = [fp for fp in RAW_DIR.rglob("*") if fp.is_file()]
+
+    store = ensure_store()
+    manifest = load_manifest()
+    # first incremental run (possibly interrupted): adopt pre-manifest chunks by source name
+    legacy = manifest is None or bool(manifest.get("legacy_pending"))
+    plan = plan_ingest(files, manifest, cfg_hash, RAW_DIR, store if legacy else None)
+    if manifest is None:
+        manifest = new_manifest()
+        manifest["legacy_pending"] = True
+
+    # leftovers of an interrupted run: chunks of unrecorded files up to its
+    # last checkpoint, plus anything appended after it (store_n watermark)
+    interrupted = manifest.pop("pending", [])
+    store_n = manifest.pop("store_n", None)
+    if store_n is not None:
+        recorded = {c for e in manifest["files"].values() for c in e["cids"]}
+        interrupted += [c for c in range(store_n, store.n) if c not in recorded]
+    if interrupted:
+        store.tombstone(interrupted)
+        print(f"[ingest] Discarded {len(interrupted)} chunks written after the last checkpoint")
+
+    print(
+        f"[ingest] {len(files)} files | unchanged={plan.unchanged} new={plan.new} "
+        f"changed={plan.changed} deleted={len(plan.deleted)}"
+    )
+
+    stats: Dict[str, float] = {
+        k: 0.0 for k in ("files", "pages", "chunks", "parse_s", "embed_s",
+                         "embed_wait_s", "producer_blocked_s", "wall_s", "index_s")
+    }
+
+    # the model is only loaded when something actually changed
+    embedder = _make_embedder(cfg.embedding_model_name) if plan.todo else None
+    writer = IndexWriter(embedder, ANNConfig(index_type=cfg.index_type)) if plan.todo else None
+    pool: Optional[EmbeddingPool] = None
+    if embedder is not None and args.embed_workers != 1:
+        pool = EmbeddingPool.for_embedder(
+            embedder, EmbeddingPoolConfig(workers=args.embed_workers, threads_per_worker=args.embed_threads)
+        )
+    if writer is not None:
+        manifest["pending"], manifest["store_n"] = [], store.n
+        save_manifest(manifest)
+
+    pending: List[Tuple[str, Document]] = []   # (file key, chunk) not yet embedded
+    remaining: Dict[str, int] = {}             # file key -> chunks not yet written
+    file_cids: Dict[str, List[int]] = {}       # cids of files not yet recorded
+    window: List[int] = []                     # cids written since the last checkpoint
+    batches = 0
+    dead_total = 0
+
+    def write_batch(batch: List[Tuple[str, Document]]) -> None:
+        nonlocal batches
+        chunks = [c for _, c in batch]
+
+        t0 = time.perf_counter()
+        vectors = embedder.embed_documents([c.page_content for c in chunks], pool=pool)
+        stats["embed_s"] += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        cids = writer.add(chunks, vectors)
+        stats["index_s"] += time.perf_counter() - t0
+
+        for (key, _), cid in zip(batch, cids):
+            file_cids[key].append(cid)
+            remaining[key] -= 1
+        window.extend(cids)
+
+        batches += 1
+        if batches % args.checkpoint_every == 0:
+            checkpoint()
+
+    def checkpoint() -> None:
+        nonlocal dead_total
+        t0 = time.perf_counter()
 
-    for fp in RAW_DIR.rglob("*"):
-        if not fp.is_file():
+        # crash from here until the manifest below -> these are discarded
+        manifest["pending"] = [c for cids in file_cids.values() for c in cids]
+        save_manifest(manifest)
+
+        store.extend_corpus(window)
+        window.clear()
+        load_corpus_index(store, simple_tokenize)
+
+        # old versions go only once their replacement is saved; a file that
+        # failed to parse keeps its old chunks and manifest entry
+        done = [k for k, n in remaining.items() if n == 0]
+        dead = [c for k in done for c in plan.stale.get(k, [])]
+        for key in done:
+            record_file(manifest, key, plan.todo[key], plan.hashes[key], cfg_hash, file_cids.pop(key))
+            del remaining[key]
+        if dead:
+            dead_total += store.tombstone(dead)
+
+        # one snapshot: the window's chunks + their old versions' removal
+        writer.save()
+
+        manifest["pending"] = [c for cids in file_cids.values() for c in cids]
+        manifest["store_n"] = store.n
+        save_manifest(manifest)
+        stats["index_s"] += time.perf_counter() - t0
+
+    key_of = {str(fp): key for key, fp in plan.todo.items()}
+
+    t_start = time.perf_counter()
+    parsed = _iter_parsed(
+        list(plan.todo.values()), cfg, args.workers, args.queue_size, stats, int(args.stream_mb * 1e6)
+    )
+
+    def drop_file(key: str) -> None:
+        # a file that failed mid-stream: its written chunks go, its old version stays
+        pending[:] = [(k, c) for k, c in pending if k != key]
+        written = file_cids.pop(key, [])
+        remaining.pop(key, None)
+        if written:
+            store.tombstone(written)
+
+    while True:
+        t0 = time.perf_counter()
+        item = next(parsed, None)
+        stats["embed_wait_s"] += time.perf_counter() - t0
+        if item is None:
+            break
+
+        path, chunks, file_stats = item
+        key = key_of[path]
+        # +1 while the file is still being read, so a checkpoint in the
+        # middle of it does not record it as done
+        remaining[key] = 1
+        file_cids[key] = []
+
+        n = 0
+        it = iter(chunks)
+        failed = False
+        while True:
+            t0 = time.perf_counter()
+            try:
+                c = next(it, None)
+            except Exception as e:
+                print(f"Failed: {path} ({e})")
+                failed = True
+                break
+            finally:
+                stats["embed_wait_s"] += time.perf_counter() - t0
+            if c is None:
+                break
+            n += 1
+            remaining[key] += 1
+            pending.append((key, c))
+            if len(pending) >= args.embed_batch:
+                batch = pending[: args.embed_batch]
+                del pending[: args.embed_batch]
+                write_batch(batch)
+        if failed:
+            drop_file(key)
             continue
-        loaded = _load_one_file(fp)
-        if not loaded:
-            print(f"Skipped: {fp}")
+
+        # recorded even when empty, so the file is not re-parsed every run
+        remaining[key] -= 1
+        if not n:
+            print(f"Skipped: {path}")
             continue
-        enriched = enrich_metadata(loaded, cfg.tags, str(fp))
-        chunks = chunk_documents(enriched, cfg)
-        all_chunks.extend(chunks)
-        print(f"  {fp.name} → {len(chunks)} chunks")
 
-    if not all_chunks:
-        print("No documents found in src/data/raw/")
+        stats["files"] += 1
+        stats["pages"] += file_stats["pages"]
+        stats["chunks"] += n
+        stats["parse_s"] += file_stats["seconds"]
+        print(f"  {Path(path).name} → {n} chunks")
+
+    while pending:
+        batch = pending[: args.embed_batch]
+        del pending[: args.embed_batch]
+        write_batch(batch)
+
+    if pool is not None:
+        pool.close()
+
+    # before the last checkpoint, so its snapshot already hides them
+    dead = [c for cids in plan.deleted.values() for c in cids]
+    for key in plan.deleted:
+        manifest["files"].pop(key, None)
+    if dead:
+        dead_total += store.tombstone(dead)
+
+    if writer is not None:
+        checkpoint()
+        writer.close()
+    elif dead or interrupted:
+        # index unchanged, only tombstones: new snapshot shares its files
+        if current_name(VECTORSTORE_DIR) is not None or (VECTORSTORE_DIR / "index.faiss").exists():
+            publish_snapshot(VECTORSTORE_DIR, store=store)
+
+    stats["wall_s"] = time.perf_counter() - t_start - stats["index_s"]
+
+    for k in ("legacy_pending", "pending", "store_n"):
+        manifest.pop(k, None)
+    save_manifest(manifest)
+
+    if stats["chunks"] or dead_total:
+        bump_generation()
+
+    if dead_total:
+        print(f"[ingest] Tombstoned {dead_total} chunks (replaced / deleted files)")
+
+    if not plan.todo and not plan.deleted:
+        print("\n Nothing changed in src/data/raw/")
         return
 
-    embedder = _make_embedder(cfg.embedding_model_name)
-    build_faiss(all_chunks, embedder)
-    save_chunks_jsonl(all_chunks)
+    if embedder is not None and hasattr(embedder, "cache_stats"):
+        cache = embedder.cache_stats()
+        if "hit_rate" in cache:
+            stats["cache_hit_rate"] = cache["hit_rate"]
 
-    print(f"\n Done. Total chunks: {len(all_chunks)}")
+    print(f"\n Done. New chunks: {int(stats['chunks'])}")
+    _print_throughput(stats)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from src.embeddings.embedding_pool import _limit_threads
+
+
+# ================= CONFIG =================
+@dataclass
+class IngestWorkerConfig:
+    nice: int = 10          # added to the worker's niceness: /ask wins the CPU
+    threads: int = 2        # torch / BLAS / tokenizer threads in the worker
+    keep_jobs: int = 200    # finished jobs kept for GET /ingest/{id}
+    # after a job that replaced chunks, compact the chunk store once this
+    # fraction of its bytes is tombstoned; None = never
+    compact_dead_frac: Optional[float] = 0.25
+
+
+# ================= WORKER PROCESS =================
+def _worker_main(jobs: "multiprocessing.Queue", events: "multiprocessing.Queue", cfg: IngestWorkerConfig) -> None:
+    """
+    Long-lived ingest process: lower priority, capped threads, one
+    embedding model for every job. Reports ("progress" | "done" |
+    "error", job_id, payload) events back to the server.
+    """
+    _limit_threads(cfg.threads)
+    try:
+        os.nice(cfg.nice)
+    except (AttributeError, OSError) as e:
+        print("[ingest_worker] could not lower priority:", e)
+
+    try:
+        import torch
+        torch.set_num_threads(cfg.threads)
+    except Exception:
+        pass
+
+    import numpy as np
+
+    from src.pipelines.ingest import IngestConfig, _make_embedder, run_ingestion
+    from src.retriever.chunk_store import compact_store
+
+    embedder = None
+    events.put(("ready", None, {"pid": os.getpid()}))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, file_path = job["id"], job["file_path"]
+
+        def on_progress(stage: str, fraction: float) -> None:
+            events.put(("progress", job_id, {"stage": stage, "progress": round(fraction, 3)}))
+
+        live: Dict[str, Any] = {"cids": [], "vectors": None, "replaced": []}
+        batches: List[np.ndarray] = []
+
+        def on_indexed(chunks, vectors) -> None:
+            # one call per written batch; float32 rows, not Python lists
+            live["cids"].extend(int(c.id) for c in chunks)
+            batches.append(np.asarray(vectors, dtype=np.float32))
+
+        def on_replaced(cids) -> None:
+            live["replaced"] = [int(c) for c in cids]
+
+        try:
+            if embedder is None:
+                on_progress("loading model", 0.0)
+                embedder = _make_embedder(IngestConfig(tags=[]).embedding_model_name)
+            result = run_ingestion(
+                file_path,
+                on_indexed=on_indexed,
+                on_replaced=on_replaced,
+                embedder=embedder,
+                on_progress=on_progress,
+            )
+            if batches:
+                live["vectors"] = np.concatenate(batches)
+            events.put(("done", job_id, {"result": result, **live}))
+        except Exception as e:
+            traceback.print_exc()
+            events.put(("error", job_id, {"error": str(e)}))
+            continue
+
+        # background compaction: the job is already reported, nobody waits on this
+        if cfg.compact_dead_frac is not None and live["replaced"]:
+            try:
+                compact_store(min_dead_frac=cfg.compact_dead_frac)
+            except Exception as e:
+                print("[ingest_worker] chunk store compaction failed:", e)
+
+
+# ================= QUEUE (server side) =================
+class IngestJobQueue:
+    """
+    Ingest jobs for the API: submit() returns a job id immediately and
+    a separate worker process (spawned on first use, restarted if it
+    dies) runs them one at a time. A listener thread tracks progress
+    and calls on_done(job, payload) when a job finishes, where payload
+    carries the new cids + vectors and the replaced cids so the serving
+    retriever can be updated without re-embedding anything.
+    Job state lives in memory: it is lost on restart.
+    """
+
+    def __init__(
+        self,
+        on_done: Optional[Callable[[Dict[str, Any], Dict[str, Any]], object]] = None,
+        cfg: Optional[IngestWorkerConfig] = None,
+    ):
+        self.cfg = cfg or IngestWorkerConfig()
+        self.on_done = on_done
+        # spawn: the worker does not inherit the server's models / threads
+        self._ctx = multiprocessing.get_context("spawn")
+        self._jobs_q = None
+        self._events_q = None
+        self._proc = None
+        self._listener: Optional[threading.Thread] = None
+
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._order: list = []
+
+    # ================= WORKER =================
+    def _ensure_worker(self) -> None:
+        if self._proc is not None and self._proc.is_alive():
+            return
+        self._jobs_q = self._ctx.Queue()
+        self._events_q = self._ctx.Queue()
+        self._proc = self._ctx.Process(
+            target=_worker_main,
+            args=(self._jobs_q, self._events_q, self.cfg),
+            name="ingest-worker",
+            daemon=True,
+        )
+        self._proc.start()
+
+        self._listener = threading.Thread(
+            target=self._listen, args=(self._proc, self._events_q), name="ingest-listener", daemon=True
+        )
+        self._listener.start()
+
+    def _listen(self, proc, events) -> None:
+        while True:
+            try:
+                kind, job_id, payload = events.get(timeout=1.0)
+            except queue.Empty:
+                if not proc.is_alive():
+                    self._fail_unfinished(proc.pid, f"ingest worker exited (code {proc.exitcode})")
+                    return
+                continue
+            except (EOFError, OSError):
+                return
+
+            if kind == "ready":
+                print(f"[ingest_jobs] worker ready (pid {payload['pid']})")
+            elif kind == "progress":
+                self._update(job_id, status="running", **payload)
+            elif kind == "error":
+                self._update(job_id, status="failed", error=payload["error"], finished_at=time.time())
+            elif kind == "done":
+                self._finish(job_id, payload)
+
+    def _finish(self, job_id: str, payload: Dict[str, Any]) -> None:
+        result = payload.get("result", {})
+        self._update(job_id, stage="updating retriever", progress=0.99)
+        swap_error = None
+        if self.on_done is not None and result.get("status") != "unchanged":
+            try:
+                self.on_done(self.get(job_id) or {}, payload)
+            except Exception as e:
+                swap_error = str(e)
+                print("[ingest_jobs] on_done failed:", e)
+
+        self._update(
+            job_id,
+            status="done",
+            stage="done",
+            progress=1.0,
+            result=result,
+            finished_at=time.time(),
+            **({"swap_error": swap_error} if swap_error else {}),
+        )
+
+    def _fail_unfinished(self, pid: int, reason: str) -> None:
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] in ("queued", "running") and job.get("worker_pid") == pid:
+                    job.update(status="failed", error=reason, finished_at=time.time())
+
+    # ================= JOBS =================
+    def submit(self, file_path: str) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id,
+                "file_path": file_path,
+                "status": "queued",
+                "stage": "queued",
+                "progress": 0.0,
+                "created_at": time.time(),
+            }
+            self._order.append(job_id)
+            self._trim()
+            self._ensure_worker()
+            self._jobs[job_id]["worker_pid"] = self._proc.pid
+            self._jobs_q.put({"id": job_id, "file_path": file_path})
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=time.time())
+
+    def _trim(self) -> None:
+        finished = [j for j in self._order if self._jobs[j]["status"] in ("done", "failed")]
+        for job_id in finished[: max(0, len(finished) - self.cfg.keep_jobs)]:
+            self._order.remove(job_id)
+            del self._jobs[job_id]
+
+    def busy(self) -> bool:
+        with self._lock:
+            return any(j["status"] in ("queued", "running") for j in self._jobs.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            alive = self._proc is not None and self._proc.is_alive()
+            return {"worker_alive": alive, "jobs": counts}
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._proc is not None and self._proc.is_alive():
+            self._jobs_q.put(None)
+            self._proc.join(timeout)
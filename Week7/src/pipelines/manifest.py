@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.retriever.chunk_store import ChunkStore
+
+
+MANIFEST_PATH = Path("src/data/chunks/manifest.json")
+MANIFEST_VERSION = 1
+
+# IngestConfig fields that do not change the chunks a file produces
+_CONFIG_IGNORED = ("index_type",)
+
+
+# ================= HASHING =================
+def file_sha256(path: Path, block: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for buf in iter(lambda: f.read(block), b""):
+            h.update(buf)
+    return h.hexdigest()
+
+
+def config_hash(cfg: Any) -> str:
+    """Hash of the chunking-relevant config; a change re-ingests every file."""
+    params = {k: v for k, v in asdict(cfg).items() if k not in _CONFIG_IGNORED}
+    blob = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()[:16]
+
+
+def manifest_key(path: Path, root: Path) -> str:
+    """Path relative to the raw dir (posix); absolute for files outside it."""
+    path = Path(path).resolve()
+    try:
+        return path.relative_to(Path(root).resolve()).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+# ================= LOAD / SAVE =================
+def load_manifest(path: Path = MANIFEST_PATH) -> Optional[Dict[str, Any]]:
+    """None when there is no manifest yet (first incremental run)."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception as e:
+        print(f"[manifest] unreadable, starting over: {e}")
+        return None
+    if data.get("version") != MANIFEST_VERSION:
+        print(f"[manifest] version {data.get('version')} != {MANIFEST_VERSION}, starting over")
+        return None
+    return data
+
+
+def save_manifest(manifest: Dict[str, Any], path: Path = MANIFEST_PATH) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def new_manifest() -> Dict[str, Any]:
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+
+def record_file(
+    manifest: Dict[str, Any],
+    key: str,
+    path: Path,
+    sha256: str,
+    cfg_hash: str,
+    cids: List[int],
+) -> None:
+    st = Path(path).stat()
+    manifest["files"][key] = {
+        "sha256": sha256,
+        "config": cfg_hash,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "cids": [int(c) for c in cids],
+    }
+
+
+# ================= PLAN =================
+@dataclass
+class IngestPlan:
+    """
+    What an incremental run has to do.
+      todo       key -> path of new / changed files to (re)ingest
+      hashes     key -> content sha256 of every todo file
+      stale      key -> cids to tombstone once the file is re-ingested
+      deleted    key -> cids of files gone from disk (tombstoned right away)
+    """
+    todo: Dict[str, Path] = field(default_factory=dict)
+    hashes: Dict[str, str] = field(default_factory=dict)
+    stale: Dict[str, List[int]] = field(default_factory=dict)
+    deleted: Dict[str, List[int]] = field(default_factory=dict)
+    unchanged: int = 0
+    new: int = 0
+    changed: int = 0
+
+
+def plan_ingest(
+    files: List[Path],
+    manifest: Optional[Dict[str, Any]],
+    cfg_hash: str,
+    root: Path,
+    store: Optional[ChunkStore] = None,
+) -> IngestPlan:
+    """
+    Compare files on disk with the manifest. A file whose size and
+    mtime match its entry is trusted without re-hashing; otherwise it
+    is hashed and only re-ingested if the content (or config) changed.
+
+    Without a manifest, chunks already in the store with the same
+    source filename are treated as the old version of the file, so the
+    first incremental run replaces rather than duplicates them.
+    """
+    plan = IngestPlan()
+    entries = (manifest or {}).get("files", {})
+    legacy = _chunks_by_source(store) if manifest is None and store is not None else {}
+
+    seen = set()
+    for fp in files:
+        key = manifest_key(fp, root)
+        seen.add(key)
+        entry = entries.get(key)
+        st = fp.stat()
+
+        if (
+            entry is not None
+            and entry["config"] == cfg_hash
+            and entry["size"] == st.st_size
+            and entry["mtime_ns"] == st.st_mtime_ns
+        ):
+            plan.unchanged += 1
+            continue
+
+        sha = file_sha256(fp)
+        if entry is not None and entry["config"] == cfg_hash and entry["sha256"] == sha:
+            # touched but identical: refresh the stat fields only
+            entry["size"], entry["mtime_ns"] = st.st_size, st.st_mtime_ns
+            plan.unchanged += 1
+            continue
+
+        plan.todo[key] = fp
+        plan.hashes[key] = sha
+        if entry is not None:
+            plan.changed += 1
+            plan.stale[key] = list(entry["cids"])
+        else:
+            plan.new += 1
+            if fp.name in legacy:
+                plan.stale[key] = legacy[fp.name]
+
+    for key, entry in entries.items():
+        if key not in seen and not os.path.isabs(key):
+            plan.deleted[key] = list(entry["cids"])
+
+    return plan
+
+
+def _chunks_by_source(store: ChunkStore) -> Dict[str, List[int]]:
+    out: Dict[str, List[int]] = {}
+    for cid, md in enumerate(store.iter_metadata()):
+        src = md.get("source")
+        if src:
+            out.setdefault(str(src), []).append(cid)
+    return out
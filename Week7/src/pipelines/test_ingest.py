@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from src.pipelines import ingest
+
+
+@pytest.fixture
+def counter(monkeypatch):
+    # no tokenizer download: the word-count approximation is used
+    monkeypatch.setitem(ingest._tokenizers, "test-model", None)
+    c = ingest.TokenCounter("test-model", cache_size=3)
+    calls = []
+    encode = c._encode
+    c._encode = lambda texts: calls.append(list(texts)) or encode(texts)
+    c.calls = calls
+    return c
+
+
+# ================= TOKEN COUNTER =================
+def test_counts_are_memoized(counter):
+    assert counter.count("one two three") == 4
+    assert counter.count("one two three") == 4
+    assert counter.count_batch(["one two three", "a b", "a b c d e f"]) == [4, 2, 8]
+    # one encode for the first text, one batched encode for the two new ones
+    assert counter.calls == [["one two three"], ["a b", "a b c d e f"]]
+
+
+def test_cache_evicts_least_recently_used(counter):
+    for text in ("a", "b", "c"):
+        counter.count(text)
+    counter.count("a")              # hit: "a" becomes most recent
+    counter.count("d")              # evicts "b", not "a"
+    assert list(counter._cache) == ["c", "a", "d"]
+
+    counter.calls.clear()
+    counter.count("a")
+    counter.count("b")
+    assert counter.calls == [["b"]]
+
+
+# ================= PARALLEL PARSE =================
+def _write_files(root, n=5):
+    files = []
+    for i in range(n):
+        fp = root / f"doc{i}.txt"
+        fp.write_text("\n".join(f"file {i} line {j} " + "word " * (20 + j % 7) for j in range(40 * (i + 1))))
+        files.append(fp)
+    return files
+
+
+def _parsed(files, workers, stream_bytes=0):
+    cfg = ingest.IngestConfig(tags=["t"], chunk_max_tokens=120, chunk_overlap_tokens=10)
+    stats = {"producer_blocked_s": 0.0}
+    out = {}
+    for path, chunks, file_stats in ingest._iter_parsed(files, cfg, workers, 2, stats, stream_bytes):
+        out[path] = [c.page_content for c in chunks]
+        assert file_stats["pages"] >= 1
+    return out
+
+
+def test_process_pool_parse_matches_serial(tmp_path):
+    files = _write_files(tmp_path)
+    serial = _parsed(files, workers=1)
+    assert all(serial[str(fp)] for fp in files)
+
+    # completion order may differ; the chunks per file may not
+    assert _parsed(files, workers=2) == serial
+    # files over stream_bytes are parsed by the consumer instead of a worker
+    assert _parsed(files, workers=2, stream_bytes=files[2].stat().st_size) == serial
+
+
+def test_unreadable_file_is_skipped_in_parallel(tmp_path):
+    files = _write_files(tmp_path, n=2)
+    missing = tmp_path / "gone.txt"
+    out = _parsed(files + [missing], workers=2)
+    assert sorted(out) == sorted(str(fp) for fp in files)
+
+
+# ================= WRITER LOCK =================
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    # ingest paths (raw dir, store, vectorstore, manifest) are cwd-relative
+    monkeypatch.chdir(tmp_path)
+    raw = tmp_path / "src" / "data" / "raw"
+    raw.mkdir(parents=True)
+    return raw
+
+
+def test_concurrent_uploads_keep_every_manifest_entry(workspace):
+    from src.evaluation.benchmark import HashingEmbedder
+    from src.pipelines.manifest import load_manifest
+    from src.retriever.chunk_store import STORE_DIR, ChunkStore
+    from src.retriever.snapshots import current_snapshot, writer_lock
+
+    files = _write_files(workspace, n=3)
+    embedder = HashingEmbedder(32)
+    results, errors = {}, []
+
+    def upload(fp) -> None:
+        try:
+            results[fp.name] = ingest.run_ingestion(str(fp), embedder=embedder)
+        except Exception as e:
+            errors.append(e)
+
+    # a bulk run holds the lock: uploads wait instead of interleaving
+    with writer_lock(ingest.VECTORSTORE_DIR):
+        threads = [threading.Thread(target=upload, args=(fp,)) for fp in files]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(0.3)
+        assert all(t.is_alive() for t in threads) and not results
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert all(r["status"] == "success" for r in results.values())
+    manifest = load_manifest()
+    assert sorted(manifest["files"]) == sorted(fp.name for fp in files)
+
+    store = ChunkStore(STORE_DIR)
+    recorded = sorted(c for e in manifest["files"].values() for c in e["cids"])
+    assert recorded == list(range(store.n))
+    assert current_snapshot(ingest.VECTORSTORE_DIR).store_n == store.n
+
+
+# ================= CHECKPOINT / RESUME =================
+class _Interrupted(Exception):
+    pass
+
+
+def _bulk_args(**kw):
+    import argparse
+
+    args = dict(workers=1, queue_size=2, stream_mb=64.0, embed_batch=8,
+                embed_workers=1, embed_threads=1, checkpoint_every=1)
+    return argparse.Namespace(**{**args, **kw})
+
+
+def test_interrupted_bulk_run_resumes_from_its_checkpoint(workspace, monkeypatch):
+    from src.evaluation.benchmark import HashingEmbedder
+    from src.pipelines.manifest import load_manifest
+    from src.retriever.chunk_store import STORE_DIR, ChunkStore
+    from src.retriever.snapshots import current_snapshot
+
+    class Embedder(HashingEmbedder):
+        """Raises on its fail_at-th batch, like a run killed mid-way."""
+
+        def __init__(self, fail_at=None):
+            super().__init__(32)
+            self.fail_at, self.calls = fail_at, 0
+
+        def embed_documents(self, texts, pool=None):
+            self.calls += 1
+            if self.calls == self.fail_at:
+                raise _Interrupted
+            return super().embed_documents(texts)
+
+    files = _write_files(workspace, n=3)
+    runs = []
+    monkeypatch.setattr(ingest, "_make_embedder", lambda name: runs[-1])
+    monkeypatch.setattr(ingest, "parse_args", lambda: _bulk_args())
+
+    # 30 chunks in batches of 8, killed on the third: a checkpoint after
+    # each batch has recorded the files it finished, the one in flight is not
+    runs.append(Embedder(fail_at=3))
+    with pytest.raises(_Interrupted):
+        ingest.main()
+    manifest = load_manifest()
+    assert 0 < len(manifest["files"]) < len(files)
+    assert manifest["pending"] and "store_n" in manifest
+    lost = ChunkStore(STORE_DIR).n - sum(len(e["cids"]) for e in manifest["files"].values())
+    assert lost > 0
+
+    # the next run drops every chunk of the unfinished files and re-ingests them
+    runs.append(Embedder())
+    ingest.main()
+    assert runs[-1].calls < 4                   # finished files are not embedded again
+    manifest = load_manifest()
+    assert sorted(manifest["files"]) == sorted(fp.name for fp in files)
+    assert not {"pending", "store_n", "legacy_pending"} & set(manifest)
+
+    store = ChunkStore(STORE_DIR)
+    live = sorted(c for e in manifest["files"].values() for c in e["cids"])
+    assert sorted(set(range(store.n)) - set(store.tombstones.tolist())) == live
+    assert len(store.tombstones) == lost
+    snap = current_snapshot(ingest.VECTORSTORE_DIR)
+    assert snap.store_n == store.n and snap.tombstones().tolist() == store.tombstones.tolist()
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import queue
+import threading
+
+import numpy as np
+import pytest
+
+from src.evaluation.benchmark import HashingEmbedder
+from src.pipelines import ingest, ingest_jobs
+from src.pipelines.ingest_jobs import IngestJobQueue, IngestWorkerConfig
+from src.retriever.chunk_store import STORE_DIR, ChunkStore
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    """_worker_main on a thread with in-process queues and an offline embedder."""
+    monkeypatch.chdir(tmp_path)     # ingest paths are cwd-relative
+    monkeypatch.setattr(ingest_jobs, "_limit_threads", lambda n: None)
+    monkeypatch.setattr(ingest, "_make_embedder", lambda name: HashingEmbedder(32))
+
+    jobs: "queue.Queue" = queue.Queue()
+    events: "queue.Queue" = queue.Queue()
+    t = threading.Thread(target=ingest_jobs._worker_main, args=(jobs, events, IngestWorkerConfig(nice=0)))
+    t.start()
+    assert events.get(timeout=10)[0] == "ready"
+
+    def run(job_id: str, file_path) -> tuple:
+        jobs.put({"id": job_id, "file_path": str(file_path)})
+        while True:
+            kind, got_id, payload = events.get(timeout=30)
+            if kind != "progress":
+                assert got_id == job_id
+                return kind, payload
+
+    yield run
+    jobs.put(None)
+    t.join(10)
+
+
+def test_worker_sends_cids_vectors_and_replaced(worker, tmp_path):
+    fp = tmp_path / "notes.txt"
+    fp.write_text("\n".join(f"line {i} about leave policy and payroll" for i in range(200)))
+
+    kind, first = worker("a", fp)
+    assert kind == "done" and first["result"]["status"] == "success"
+    cids = first["cids"]
+    assert cids == list(range(len(cids))) and first["result"]["chunks"] == len(cids)
+    assert first["vectors"].dtype == np.float32 and first["vectors"].shape == (len(cids), 32)
+    assert first["replaced"] == []
+
+    kind, same = worker("b", fp)
+    assert kind == "done" and same["result"]["status"] == "unchanged" and same["cids"] == []
+
+    fp.write_text("a different version of the notes " * 50)
+    kind, changed = worker("c", fp)
+    assert kind == "done" and changed["replaced"] == cids
+    assert min(changed["cids"]) == len(cids)
+    assert changed["result"]["snapshot"] > first["result"]["snapshot"]
+
+    # the replaced version is compacted away after the job is reported
+    # (the worker is sequential: by the time the next job answers it has run)
+    worker("d", tmp_path / "nope.txt")
+    store = ChunkStore(STORE_DIR)
+    assert store.epoch == 1 and store.dead_bytes() == 0
+    assert store.text(cids[0]) == "" and store.text(changed["cids"][0])
+
+
+def test_worker_reports_errors(worker, tmp_path):
+    kind, payload = worker("missing", tmp_path / "nope.txt")
+    assert kind == "error" and "File not found" in payload["error"]
+
+
+def _queue_with_job(on_done) -> tuple:
+    q = IngestJobQueue(on_done=on_done)
+    q._jobs["j"] = {"id": "j", "status": "running", "progress": 0.5}
+    q._order.append("j")
+    return q, "j"
+
+
+def test_finish_hands_the_payload_to_on_done():
+    seen = []
+    q, job_id = _queue_with_job(lambda job, payload: seen.append((job["id"], payload["cids"])))
+    q._finish(job_id, {"result": {"status": "success", "chunks": 2}, "cids": [4, 5]})
+    assert seen == [("j", [4, 5])]
+    job = q.get(job_id)
+    assert job["status"] == "done" and job["progress"] == 1.0 and "swap_error" not in job
+    assert not q.busy()
+
+
+def test_finish_records_swap_errors_and_skips_unchanged():
+    calls = []
+
+    def on_done(job, payload):
+        calls.append(payload)
+        raise RuntimeError("reload failed")
+
+    q, job_id = _queue_with_job(on_done)
+    q._finish(job_id, {"result": {"status": "unchanged"}})
+    assert calls == [] and q.get(job_id)["status"] == "done"
+
+    q._finish(job_id, {"result": {"status": "success"}, "cids": [1]})
+    job = q.get(job_id)
+    assert job["status"] == "done" and job["swap_error"] == "reload failed"
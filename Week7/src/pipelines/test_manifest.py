@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+
+from langchain_core.documents import Document
+
+from src.pipelines.manifest import (
+    config_hash,
+    file_sha256,
+    load_manifest,
+    manifest_key,
+    new_manifest,
+    plan_ingest,
+    record_file,
+    save_manifest,
+)
+from src.retriever.chunk_store import ChunkStore
+
+
+@dataclass
+class _Cfg:
+    tags: list
+    chunk_max_tokens: int = 500
+    index_type: str = "flat"
+
+
+def _raw(tmp_path):
+    root = tmp_path / "raw"
+    (root / "sub").mkdir(parents=True)
+    files = {"a.txt": "alpha", "b.txt": "beta", "sub/c.md": "gamma"}
+    for name, text in files.items():
+        (root / name).write_text(text)
+    return root, [root / name for name in files]
+
+
+def _recorded(root, files, cfg_hash):
+    manifest = new_manifest()
+    for i, fp in enumerate(files):
+        record_file(manifest, manifest_key(fp, root), fp, file_sha256(fp), cfg_hash, [10 * i, 10 * i + 1])
+    return manifest
+
+
+def test_config_hash_ignores_index_type():
+    assert config_hash(_Cfg(tags=[])) == config_hash(_Cfg(tags=[], index_type="ivfpq"))
+    assert config_hash(_Cfg(tags=[])) != config_hash(_Cfg(tags=[], chunk_max_tokens=400))
+
+
+def test_first_run_everything_new(tmp_path):
+    root, files = _raw(tmp_path)
+    plan = plan_ingest(files, None, "h", root)
+    assert sorted(plan.todo) == ["a.txt", "b.txt", "sub/c.md"]
+    assert plan.new == 3 and not plan.stale and not plan.deleted
+
+
+def test_unchanged_touched_changed_deleted(tmp_path):
+    root, files = _raw(tmp_path)
+    manifest = _recorded(root, files, "h")
+    a, b, c = files
+
+    st = b.stat()
+    os.utime(b, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))   # touched, same content
+    c.write_text("gamma, edited")
+    (root / "a.txt").unlink()
+
+    plan = plan_ingest([b, c], manifest, "h", root)
+    assert plan.unchanged == 1 and plan.changed == 1 and plan.new == 0
+    assert list(plan.todo) == ["sub/c.md"]
+    assert plan.hashes["sub/c.md"] == file_sha256(c)
+    assert plan.stale == {"sub/c.md": [20, 21]}
+    assert plan.deleted == {"a.txt": [0, 1]}
+    # the touched file's stat fields are refreshed, so it is not re-hashed next time
+    assert manifest["files"]["b.txt"]["mtime_ns"] == b.stat().st_mtime_ns
+
+
+def test_config_change_reingests_all(tmp_path):
+    root, files = _raw(tmp_path)
+    manifest = _recorded(root, files, "h")
+    plan = plan_ingest(files, manifest, "other", root)
+    assert plan.changed == 3 and len(plan.todo) == 3
+    assert plan.stale["a.txt"] == [0, 1]
+
+
+def test_files_outside_root_are_never_deleted(tmp_path):
+    root, files = _raw(tmp_path)
+    outside = tmp_path / "upload.txt"
+    outside.write_text("uploaded")
+    manifest = _recorded(root, files + [outside], "h")
+    assert manifest_key(outside, root) == outside.resolve().as_posix()
+
+    outside.unlink()
+    plan = plan_ingest(files, manifest, "h", root)
+    assert not plan.deleted and plan.unchanged == 3
+
+
+def test_legacy_store_chunks_become_stale(tmp_path):
+    root, files = _raw(tmp_path)
+    store = ChunkStore.create(tmp_path / "store")
+    store.append([Document(page_content=f"old {i}", metadata={"source": "b.txt"}) for i in range(2)])
+    store.append([Document(page_content="other", metadata={"source": "z.txt"})])
+
+    plan = plan_ingest(files, None, "h", root, store=store)
+    assert plan.stale == {"b.txt": [0, 1]}
+
+
+def test_save_load(tmp_path):
+    root, files = _raw(tmp_path)
+    path = tmp_path / "chunks" / "manifest.json"
+    assert load_manifest(path) is None
+
+    manifest = _recorded(root, files, "h")
+    save_manifest(manifest, path)
+    assert load_manifest(path) == manifest
+
+    path.write_text('{"version": 0, "files": {}}')
+    assert load_manifest(path) is None
@@ -0,0 +1,603 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+from src.retriever.query_context import _doc_key
+from src.utils.file_lock import LOCK_FILE, file_lock
+
+
+STORE_DIR = Path("src/data/chunks/store")
+CHUNKS_JSONL = Path("src/data/chunks/chunks.jsonl")
+VECTORSTORE_DIR = Path("src/vectorstore")
+
+HEADER_FILE = "store.json"
+TEXT_FILE = "text.bin"
+META_FILE = "meta.bin"
+CORPUS_COL = "corpus"
+TOMBSTONES_COL = "tombstones"
+COL_SUFFIX = ".col"         # raw little-endian rows, append-only
+FORMAT = 2
+# rewritten by compact(): one copy per epoch (epoch 0 has no number)
+_EPOCH_FILES = (TEXT_FILE, META_FILE, f"text_offsets{COL_SUFFIX}", f"meta_offsets{COL_SUFFIX}")
+
+# name -> dtype; every column has one row per chunk, offsets have n + 1
+_COLUMNS = {
+    "text_offsets": np.int64,
+    "meta_offsets": np.int64,
+    "key": np.uint64,           # hash of _doc_key (source, page, text)
+    "page": np.int32,           # -1 when missing
+    "uploaded_at": np.float64,  # nan when missing
+}
+
+
+# ================= HELPERS =================
+def key_hash(doc: Document) -> int:
+    """64-bit id of _doc_key; equal keys mean the same chunk."""
+    return int.from_bytes(hashlib.md5(_doc_key(doc).encode("utf-8")).digest()[:8], "little")
+
+
+def _as_int(v: Any, default: int) -> int:
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return default
+
+
+def _as_float(v: Any) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _append_blob(path: Path, end: int, parts: List[bytes]) -> None:
+    # drop bytes past the last committed offset (a crashed append) first
+    with path.open("r+b" if path.exists() else "w+b") as f:
+        f.truncate(end)
+        f.seek(end)
+        f.write(b"".join(parts))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _epoch_path(root: Path, fname: str, epoch: int = 0) -> Path:
+    if not epoch or fname not in _EPOCH_FILES:
+        return root / fname
+    stem, suffix = fname.rsplit(".", 1)
+    return root / f"{stem}.{epoch}.{suffix}"
+
+
+def _col_path(root: Path, name: str, epoch: int = 0) -> Path:
+    return _epoch_path(root, f"{name}{COL_SUFFIX}", epoch)
+
+
+def _append_rows(root: Path, name: str, dtype: Any, committed: int, rows: Any, epoch: int = 0) -> None:
+    """Append rows after the `committed` ones; O(new rows), never rewrites the column."""
+    dt = np.dtype(dtype).newbyteorder("<")
+    _append_blob(_col_path(root, name, epoch), committed * dt.itemsize, [np.asarray(rows, dtype=dt).tobytes()])
+
+
+def _read_rows(root: Path, name: str, dtype: Any, count: int, epoch: int = 0) -> np.ndarray:
+    """The first `count` (committed) rows, memory-mapped read-only."""
+    dt = np.dtype(dtype).newbyteorder("<")
+    if count <= 0:
+        return np.zeros(0, dtype=dt)
+    return np.memmap(_col_path(root, name, epoch), dtype=dt, mode="r", shape=(count,))
+
+
+def _copy_live(src: Optional[mmap.mmap], off: np.ndarray, lengths: np.ndarray, path: Path) -> None:
+    """Write the byte ranges of rows with lengths > 0, back to back, in row order."""
+    keep = lengths > 0
+    starts, ends = off[:-1][keep], off[1:][keep]
+    # merge adjacent live rows into runs: one slice per run, not per row
+    breaks = np.flatnonzero(starts[1:] != ends[:-1]) + 1
+    run_starts = np.concatenate([starts[:1], starts[breaks]])
+    run_ends = np.concatenate([ends[breaks - 1], ends[-1:]])
+    with path.open("wb") as f:
+        for a, b in zip(run_starts.tolist(), run_ends.tolist()):
+            f.write(src[a:b])
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ================= STORE =================
+class ChunkStore:
+    """
+    On-disk chunk store addressed by integer chunk id (cid).
+
+      text.bin        utf-8 text of every chunk, back to back
+      meta.bin        JSON metadata of every chunk, back to back
+      *.col           columns: text/meta offsets, key, page, uploaded_at
+      corpus.col      cids of the keyword (BM25) corpus, in corpus order
+      tombstones.col  cids of deleted / replaced chunks, in deletion order
+      store.json      header: committed chunk / corpus / tombstone counts
+
+    Every file is append-only: a write appends raw bytes after the
+    committed rows (cutting off any tail a crashed write left behind)
+    and commits by replacing store.json last, so an append costs
+    O(new chunks) and readers only ever see committed rows. Blobs and
+    columns are memory-mapped read-only, so text is decoded only for the
+    chunks a query actually returns, and every process serving the same
+    store shares the OS page cache. Chunks are never removed in place: a
+    tombstoned cid stays readable but is masked out of retrieval
+    (live_mask) until compact() drops its bytes. Writers are
+    serialized by a file lock (write.lock), so
+    the API's ingest worker and the bulk CLI can both append; any number
+    of readers.
+    """
+
+    _open_lock = threading.Lock()
+    _open: Dict[str, "ChunkStore"] = {}
+
+    def __init__(self, root: Path = STORE_DIR):
+        self.root = Path(root)
+        self.n = 0
+        self.corpus_n = 0
+        self.epoch = 0
+        self.cols: Dict[str, np.ndarray] = {}
+        self.corpus = np.zeros(0, dtype=np.int64)
+        self.tombstones = np.zeros(0, dtype=np.int64)
+        self._text: Optional[mmap.mmap] = None
+        self._meta: Optional[mmap.mmap] = None
+        self._write_lock = threading.Lock()
+        self._load()
+
+    # ================= OPEN =================
+    @classmethod
+    def open(cls, root: Path = STORE_DIR) -> "ChunkStore":
+        """One shared instance per store directory in this process."""
+        key = str(Path(root).resolve())
+        with cls._open_lock:
+            store = cls._open.get(key)
+            if store is None:
+                store = cls._open[key] = cls(root)
+            return store
+
+    @staticmethod
+    def exists(root: Path = STORE_DIR) -> bool:
+        return (Path(root) / HEADER_FILE).exists()
+
+    @classmethod
+    def create(cls, root: Path = STORE_DIR) -> "ChunkStore":
+        """Empty store (existing files are overwritten)."""
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+
+        with file_lock(root / LOCK_FILE):
+            for name in (TEXT_FILE, META_FILE):
+                (root / name).write_bytes(b"")
+            for name, dtype in _COLUMNS.items():
+                _col_path(root, name).write_bytes(b"")
+                if name.endswith("_offsets"):
+                    _append_rows(root, name, dtype, 0, [0])
+            for name in (CORPUS_COL, TOMBSTONES_COL):
+                _col_path(root, name).write_bytes(b"")
+            _write_header(root, 0, 0)
+
+        with cls._open_lock:
+            cls._open.pop(str(root.resolve()), None)
+        return cls.open(root)
+
+    # ================= LOAD =================
+    def _header(self) -> Dict[str, int]:
+        header = json.loads((self.root / HEADER_FILE).read_text(encoding="utf-8"))
+        header.setdefault("tombstones", 0)   # stores written before tombstones
+        header.setdefault("epoch", 0)        # ... and before compaction
+        return header
+
+    def _load(self) -> None:
+        # O(1) per call (re-maps), except tombstones: re-read only when they changed
+        header = self._header()
+        self.n = int(header["n"])
+        self.corpus_n = int(header["corpus_n"])
+        self.epoch = int(header["epoch"])
+
+        dead_n = int(header["tombstones"])
+        if dead_n != len(self.tombstones):
+            self.tombstones = np.sort(np.asarray(_read_rows(self.root, TOMBSTONES_COL, np.int64, dead_n)))
+
+        self.cols = {
+            name: _read_rows(self.root, name, dtype, self.n + 1 if name.endswith("_offsets") else self.n, self.epoch)
+            for name, dtype in _COLUMNS.items()
+        }
+        self.corpus = _read_rows(self.root, CORPUS_COL, np.int64, self.corpus_n)
+        self._text = _map(_epoch_path(self.root, TEXT_FILE, self.epoch))
+        self._meta = _map(_epoch_path(self.root, META_FILE, self.epoch))
+
+    @contextlib.contextmanager
+    def _writing(self) -> Iterator[None]:
+        with self._write_lock, file_lock(self.root / LOCK_FILE):
+            yield
+
+    def refresh(self) -> bool:
+        """Re-map if another process committed an append. True if changed."""
+        header = self._header()
+        if (
+            header["n"] == self.n
+            and header["corpus_n"] == self.corpus_n
+            and header["tombstones"] == len(self.tombstones)
+            and header["epoch"] == self.epoch
+        ):
+            return False
+        self._load()
+        return True
+
+    # ================= READ =================
+    def __len__(self) -> int:
+        return self.n
+
+    def text(self, cid: int) -> str:
+        off = self.cols["text_offsets"]
+        a, b = int(off[cid]), int(off[cid + 1])
+        return self._text[a:b].decode("utf-8") if b > a else ""
+
+    def metadata(self, cid: int) -> Dict[str, Any]:
+        off = self.cols["meta_offsets"]
+        a, b = int(off[cid]), int(off[cid + 1])
+        return json.loads(self._meta[a:b]) if b > a else {}
+
+    def document(self, cid: int) -> Document:
+        if not 0 <= cid < self.n:
+            raise IndexError(f"chunk id {cid} out of range (n={self.n})")
+        return Document(id=str(cid), page_content=self.text(cid), metadata=self.metadata(cid))
+
+    def documents(self, cids: Sequence[int]) -> List[Document]:
+        return [self.document(int(c)) for c in cids]
+
+    def iter_metadata(self) -> Iterator[Dict[str, Any]]:
+        for cid in range(self.n):
+            yield self.metadata(cid)
+
+    def column(self, name: str) -> np.ndarray:
+        arr = self.cols[name]
+        return arr[: self.n + 1] if name.endswith("_offsets") else arr[: self.n]
+
+    def live_mask(self, n: Optional[int] = None) -> Optional[np.ndarray]:
+        """Bool array over the first n cids (False = tombstoned); None if nothing is."""
+        if not len(self.tombstones):
+            return None
+        n = self.n if n is None else n
+        m = np.ones(n, dtype=bool)
+        m[self.tombstones[self.tombstones < n]] = False
+        return m
+
+    # ================= WRITE =================
+    def append(self, docs: Sequence[Document]) -> List[int]:
+        """Persist docs and return their new cids (also set as doc.id)."""
+        if not docs:
+            return []
+
+        with self._writing():
+            # another process may have committed since we last looked
+            self.refresh()
+            n0 = self.n
+
+            texts = [d.page_content.encode("utf-8") for d in docs]
+            metas = [
+                json.dumps(d.metadata or {}, ensure_ascii=False, default=str).encode("utf-8")
+                for d in docs
+            ]
+
+            text_off = self.column("text_offsets")
+            meta_off = self.column("meta_offsets")
+            _append_blob(_epoch_path(self.root, TEXT_FILE, self.epoch), int(text_off[-1]), texts)
+            _append_blob(_epoch_path(self.root, META_FILE, self.epoch), int(meta_off[-1]), metas)
+
+            new = {
+                "text_offsets": int(text_off[-1]) + np.cumsum([len(t) for t in texts]),
+                "meta_offsets": int(meta_off[-1]) + np.cumsum([len(m) for m in metas]),
+                "key": [key_hash(d) for d in docs],
+                "page": [_as_int(d.metadata.get("page"), -1) for d in docs],
+                "uploaded_at": [_as_float(d.metadata.get("uploaded_at")) for d in docs],
+            }
+            for name, dtype in _COLUMNS.items():
+                committed = n0 + 1 if name.endswith("_offsets") else n0
+                _append_rows(self.root, name, dtype, committed, new[name], self.epoch)
+
+            _write_header(self.root, n0 + len(docs), self.corpus_n, len(self.tombstones), self.epoch)
+            self._load()
+
+        cids = list(range(n0, n0 + len(docs)))
+        for d, cid in zip(docs, cids):
+            d.id = str(cid)
+        return cids
+
+    def extend_corpus(self, cids: Sequence[int]) -> None:
+        """Add chunks (by cid, repeats allowed) to the keyword corpus."""
+        if not len(cids):
+            return
+
+        with self._writing():
+            self.refresh()
+            _append_rows(self.root, CORPUS_COL, np.int64, self.corpus_n, cids)
+            _write_header(self.root, self.n, self.corpus_n + len(cids), len(self.tombstones), self.epoch)
+            self._load()
+
+    def tombstone(self, cids: Sequence[int]) -> int:
+        """Mark chunks deleted; returns how many were newly tombstoned."""
+        if not len(cids):
+            return 0
+
+        with self._writing():
+            self.refresh()
+            cids = np.unique(np.asarray([c for c in cids if 0 <= int(c) < self.n], dtype=np.int64))
+            # only cids not yet dead, so the log holds each once
+            fresh = cids[~np.isin(cids, self.tombstones)]
+            if len(fresh):
+                dead_n = len(self.tombstones)
+                _append_rows(self.root, TOMBSTONES_COL, np.int64, dead_n, fresh)
+                _write_header(self.root, self.n, self.corpus_n, dead_n + len(fresh), self.epoch)
+                self._load()
+        return len(fresh)
+
+    # ================= COMPACTION =================
+    def dead_bytes(self) -> int:
+        """Text + metadata bytes still held by tombstoned chunks."""
+        if not len(self.tombstones):
+            return 0
+        total = 0
+        for col in ("text_offsets", "meta_offsets"):
+            off = self.column(col)
+            total += int((off[self.tombstones + 1] - off[self.tombstones]).sum())
+        return total
+
+    def size_bytes(self) -> int:
+        return int(self.column("text_offsets")[-1] + self.column("meta_offsets")[-1])
+
+    def compact(self) -> int:
+        """
+        Rewrite text / metadata without the tombstoned chunks; returns the
+        bytes reclaimed. cids are stable (a dead row becomes empty), so
+        FAISS ids, the keyword corpus and published snapshots stay valid.
+        The live rows go to new epoch files and the header commits them:
+        readers keep their maps of the old files until they refresh().
+        Files older than the previous epoch are deleted.
+        """
+        with self._writing():
+            self.refresh()
+            if not self.dead_bytes():
+                return 0
+
+            epoch = self.epoch + 1
+            before = self.size_bytes()
+            for fname, col, src in ((TEXT_FILE, "text_offsets", self._text), (META_FILE, "meta_offsets", self._meta)):
+                off = np.asarray(self.column(col), dtype=np.int64)
+                lengths = np.diff(off)
+                lengths[self.tombstones] = 0
+                _copy_live(src, off, lengths, _epoch_path(self.root, fname, epoch))
+                _col_path(self.root, col, epoch).write_bytes(b"")
+                _append_rows(self.root, col, np.int64, 0, np.concatenate([[0], np.cumsum(lengths)]), epoch)
+
+            _write_header(self.root, self.n, self.corpus_n, len(self.tombstones), epoch)
+            self._load()
+            _drop_epochs(self.root, before=epoch - 1)
+        return before - self.size_bytes()
+
+
+def _drop_epochs(root: Path, before: int) -> None:
+    # the previous epoch stays: a reader that just read its header may still be opening it
+    for epoch in range(before):
+        for fname in _EPOCH_FILES:
+            path = _epoch_path(root, fname, epoch)
+            if path.exists():
+                path.unlink()
+
+
+def _write_header(root: Path, n: int, corpus_n: int, tombstones: int = 0, epoch: int = 0) -> None:
+    path = root / HEADER_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    header = {"n": n, "corpus_n": corpus_n, "tombstones": tombstones, "format": FORMAT}
+    if epoch:
+        header["epoch"] = epoch
+    tmp.write_text(json.dumps(header), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _map(path: Path) -> Optional[mmap.mmap]:
+    if not path.exists() or path.stat().st_size == 0:
+        return None
+    with path.open("rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# ================= FAISS DOCSTORE =================
+class ChunkStoreDocstore(Docstore, AddableMixin):
+    """
+    LangChain docstore over a ChunkStore: docstore ids are cids as
+    strings. Pickles as the store path only, so index.pkl no longer
+    carries a second copy of every chunk.
+    """
+
+    def __init__(self, root: Union[str, Path] = STORE_DIR):
+        self.root = str(root)
+        self._store: Optional[ChunkStore] = None
+
+    @property
+    def store(self) -> ChunkStore:
+        if self._store is None:
+            self._store = ChunkStore.open(Path(self.root))
+        return self._store
+
+    def _cid(self, doc_id: str) -> Optional[int]:
+        try:
+            cid = int(doc_id)
+        except (TypeError, ValueError):
+            return None
+        if cid >= self.store.n:
+            self.store.refresh()
+        return cid if 0 <= cid < self.store.n else None
+
+    def search(self, search: str) -> Union[str, Document]:
+        cid = self._cid(search)
+        if cid is None:
+            return f"ID {search} not found."
+        return self.store.document(cid)
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        # chunks are appended to the store first; FAISS only references them
+        missing = [i for i in texts if self._cid(i) is None]
+        if missing:
+            raise ValueError(
+                f"Chunk ids not in the chunk store: {missing[:5]} — append to ChunkStore first"
+            )
+
+    def delete(self, ids: List) -> None:
+        # rows stay (append-only); tombstoned cids are masked out of retrieval
+        self.store.tombstone([c for c in (self._cid(i) for i in ids) if c is not None])
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"root": self.root}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["root"])
+
+
+# ================= MIGRATION =================
+def migrate(
+    store_dir: Path = STORE_DIR,
+    chunks_jsonl: Path = CHUNKS_JSONL,
+    vectorstore_dir: Path = VECTORSTORE_DIR,
+) -> ChunkStore:
+    """
+    Build the store from chunks.jsonl + the pickled FAISS docstore.
+    Identical chunks (same _doc_key) are stored once; the keyword corpus
+    keeps chunks.jsonl's rows in order, and index.pkl is rewritten to
+    point FAISS ids at cids.
+    """
+    pkl = Path(vectorstore_dir) / "index.pkl"
+    docstore, index_to_id = None, {}
+    if pkl.exists():
+        with pkl.open("rb") as f:
+            docstore, index_to_id = pickle.load(f)
+
+    if isinstance(docstore, ChunkStoreDocstore):
+        # FAISS already points into a store; rebuilding would lose its text
+        if not ChunkStore.exists(Path(docstore.root)):
+            raise RuntimeError(f"{pkl} references a missing chunk store: {docstore.root}")
+        print(f"[chunk_store] already migrated: {docstore.root}")
+        return ChunkStore.open(Path(docstore.root))
+
+    store = ChunkStore.create(store_dir)
+    key_to_cid: Dict[int, int] = {}
+
+    def add_unique(docs: List[Document]) -> List[int]:
+        fresh: List[Document] = []
+        out: List[int] = []
+        for d in docs:
+            k = key_hash(d)
+            if k not in key_to_cid:
+                key_to_cid[k] = store.n + len(fresh)
+                fresh.append(d)
+            out.append(key_to_cid[k])
+        store.append(fresh)
+        return out
+
+    # -------- KEYWORD CORPUS --------
+    rows: List[Document] = []
+    if chunks_jsonl.exists():
+        with chunks_jsonl.open("r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    rows.append(Document(page_content=rec["text"], metadata=rec.get("metadata", {}) or {}))
+    store.extend_corpus(add_unique(rows))
+
+    # -------- FAISS DOCSTORE --------
+    if docstore is not None:
+        fids = sorted(index_to_id)
+        faiss_docs = []
+        for i in fids:
+            d = docstore.search(index_to_id[i])
+            faiss_docs.append(d if isinstance(d, Document) else Document(page_content="", metadata={}))
+
+        cids = add_unique(faiss_docs)
+        mapping = {i: str(c) for i, c in zip(fids, cids)}
+
+        os.replace(pkl, pkl.with_suffix(".pkl.bak"))
+        with pkl.open("wb") as f:
+            pickle.dump((ChunkStoreDocstore(store_dir), mapping), f)
+
+    print(
+        f"[chunk_store] migrated: {store.n} unique chunks | "
+        f"corpus rows={store.corpus_n} | store={store_dir}"
+    )
+    return store
+
+
+def ensure_store(
+    store_dir: Path = STORE_DIR,
+    chunks_jsonl: Path = CHUNKS_JSONL,
+    vectorstore_dir: Path = VECTORSTORE_DIR,
+) -> ChunkStore:
+    """Open the store, migrating from chunks.jsonl / index.pkl on first use."""
+    if not ChunkStore.exists(store_dir):
+        return migrate(store_dir, chunks_jsonl, vectorstore_dir)
+    return ChunkStore.open(store_dir)
+
+
+# ================= COMPACTION JOB =================
+def compact_store(
+    store_dir: Path = STORE_DIR,
+    vectorstore_dir: Path = VECTORSTORE_DIR,
+    min_dead_frac: float = 0.25,
+) -> int:
+    """
+    Compact the store once tombstoned chunks hold at least min_dead_frac
+    of its bytes; returns the bytes reclaimed. Runs under the
+    vectorstore's writer lock (no ingest in between), then publishes a
+    snapshot of the same index, so serving processes reload and drop
+    their maps of the old files.
+    """
+    from src.retriever.snapshots import current_name, publish_snapshot, writer_lock
+
+    with writer_lock(vectorstore_dir):
+        store = ChunkStore.open(store_dir)
+        store.refresh()
+        size = store.size_bytes()
+        if not size or store.dead_bytes() / size < min_dead_frac:
+            return 0
+
+        reclaimed = store.compact()
+        print(f"[chunk_store] compacted: {reclaimed / 1e6:.1f}MB of tombstoned chunks reclaimed (epoch {store.epoch})")
+        if reclaimed and current_name(vectorstore_dir) is not None:
+            # same index and pin; only tells readers to refresh
+            publish_snapshot(vectorstore_dir)
+    return reclaimed
+
+
+# ================= CLI =================
+def main() -> None:
+    p = argparse.ArgumentParser(description="Chunk store: migrate / compact / inspect")
+    p.add_argument("--migrate", action="store_true", help="rebuild from chunks.jsonl + index.pkl")
+    p.add_argument("--compact", action="store_true", help="reclaim the bytes of tombstoned chunks")
+    p.add_argument("--min_dead_frac", type=float, default=0.0, help="with --compact: only above this dead fraction")
+    p.add_argument("--store_dir", type=str, default=str(STORE_DIR))
+    args = p.parse_args()
+
+    store_dir = Path(args.store_dir)
+    store = migrate(store_dir) if args.migrate else ensure_store(store_dir)
+    if args.compact:
+        compact_store(store_dir, min_dead_frac=args.min_dead_frac)
+
+    size = sum(f.stat().st_size for f in store_dir.iterdir() if f.is_file())
+    print(
+        f"chunks={store.n} corpus_rows={store.corpus_n} tombstones={len(store.tombstones)} "
+        f"dead_bytes={store.dead_bytes()} bytes={size}"
+    )
+
+
+if __name__ == "__main__":
+    main()
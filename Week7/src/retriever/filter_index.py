@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# ================= FIELD PARSING =================
+def _infer_year_from_source(source: str) -> Optional[str]:
+    m = re.search(r"(19|20)\d{2}", source)
+    return m.group(0) if m else None
+
+
+def _tags_list(md: Dict[str, Any]) -> List[str]:
+    tags = md.get("tags", [])
+    if isinstance(tags, list):
+        return [str(t).lower() for t in tags]
+    return [str(tags).lower()] if tags else []
+
+
+def _year_value(md: Dict[str, Any]) -> str:
+    year_val = md.get("year")
+    if year_val:
+        return str(year_val).lower()
+    src = str(md.get("source", "")).lower()
+    return str(_infer_year_from_source(src) or "")
+
+
+# ================= INDEX =================
+_PREBUILT = ("year", "type", "tags", "source")
+
+
+class MetadataFilterIndex:
+    """
+    Posting lists (sorted doc ids) for metadata filters, built once per corpus.
+
+    Semantics:
+      - year : metadata year, else a YYYY found in the source name
+      - type : metadata type, else the value appearing in tags or source
+      - tags : the value is one of the doc's tags
+      - other keys : exact (lower-cased) match on metadata[key]
+
+    mask() turns a filters dict into a bool array over doc ids, so the
+    BM25 leg and the FAISS ID selector can skip non-matching docs
+    instead of post-filtering each candidate.
+
+    metadatas is consumed in one streaming pass; only postings are kept.
+    Other keys are indexed on first use by re-streaming rescan() (e.g. the
+    ChunkStore's iter_metadata). Without rescan, every scalar key is
+    indexed during the first pass instead.
+    """
+
+    def __init__(
+        self,
+        metadatas: Iterable[Dict[str, Any]],
+        cache_size: int = 64,
+        rescan: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None,
+    ):
+        self.n = 0
+        self.cache_size = cache_size
+        self._rescan = rescan
+
+        self._fields: Dict[str, Dict[str, np.ndarray]] = {k: {} for k in _PREBUILT}
+        self._untyped: Dict[Tuple[str, str], np.ndarray] = {}
+        self._mask_cache: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        # mask() runs from concurrent readers; the LRU is reordered on every hit
+        self._cache_lock = threading.Lock()
+
+        self._index_range(0, metadatas, generic=rescan is None)
+
+    # ================= BUILD =================
+    def _index_range(self, start: int, metadatas: Iterable[Dict[str, Any]], generic: bool = False) -> None:
+        year: Dict[str, List[int]] = {}
+        doc_type: Dict[str, List[int]] = {}
+        tags: Dict[str, List[int]] = {}
+        source: Dict[str, List[int]] = {}
+        untyped: Dict[Tuple[str, str], List[int]] = {}
+        # already-indexed generic keys (or, with generic=True, every scalar key)
+        others: Dict[str, Dict[str, List[int]]] = {k: {} for k in self._fields if k not in _PREBUILT}
+
+        i = start - 1
+        for i, md in enumerate(metadatas, start=start):
+            md = md or {}
+            src = str(md.get("source", "")).lower()
+            tag_list = _tags_list(md)
+
+            year.setdefault(_year_value(md), []).append(i)
+
+            if md.get("source") is not None:
+                source.setdefault(src, []).append(i)
+
+            for t in set(tag_list):
+                tags.setdefault(t, []).append(i)
+
+            type_val = str(md.get("type", "") or "").lower()
+            if type_val:
+                doc_type.setdefault(type_val, []).append(i)
+            else:
+                # resolved per query value: "policy" matches any tag/source containing it
+                untyped.setdefault((src, " ".join(tag_list)), []).append(i)
+
+            for key, val in md.items():
+                if key in _PREBUILT or not _is_scalar(val):
+                    continue
+                if generic:
+                    others.setdefault(key, {})
+                if key in others:
+                    others[key].setdefault(str(val).lower(), []).append(i)
+
+        self.n = i + 1
+        for name, values in (("year", year), ("type", doc_type), ("tags", tags), ("source", source)):
+            _extend_postings(self._fields[name], values)
+        _extend_postings(self._untyped, untyped)
+        for key, values in others.items():
+            _extend_postings(self._fields.setdefault(key, {}), values)
+
+    def add(self, metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Index docs appended after the current last id."""
+        if not metadatas:
+            return
+
+        self._index_range(self.n, metadatas, generic=self._rescan is None)
+
+        with self._cache_lock:
+            self._mask_cache.clear()
+
+    def _generic_field(self, key: str) -> Dict[str, np.ndarray]:
+        if key not in self._fields and self._rescan is not None:
+            values: Dict[str, List[int]] = {}
+            for i, md in enumerate(islice(self._rescan(), self.n)):
+                val = (md or {}).get(key)
+                if _is_scalar(val):
+                    values.setdefault(str(val).lower(), []).append(i)
+            self._fields[key] = _to_postings(values)
+        return self._fields.get(key, {})
+
+    # ================= LOOKUP =================
+    def _ids_for(self, key: str, v_str: str) -> np.ndarray:
+        empty = np.zeros(0, dtype=np.int32)
+        k = key.lower()
+
+        if k == "year":
+            return self._fields["year"].get(v_str, empty)
+
+        if k == "type":
+            parts = [self._fields["type"].get(v_str, empty)]
+            for (src, tags_str), ids in self._untyped.items():
+                if v_str in tags_str or v_str in src:
+                    parts.append(ids)
+            return np.unique(np.concatenate(parts))
+
+        if k == "tags":
+            return self._fields["tags"].get(v_str, empty)
+
+        return self._generic_field(key).get(v_str, empty)
+
+    def mask(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Bool array over doc ids (True = passes every filter).
+        None when there is nothing to filter on.
+        """
+        if not filters:
+            return None
+
+        cache_key = tuple(sorted((k, str(v).lower()) for k, v in filters.items() if v is not None))
+        if not cache_key:
+            return None
+
+        with self._cache_lock:
+            hit = self._mask_cache.get(cache_key)
+            if hit is not None:
+                self._mask_cache.move_to_end(cache_key)
+                return hit
+
+        ids: Optional[np.ndarray] = None
+        for k, v_str in cache_key:
+            hit = self._ids_for(k, v_str)
+            ids = hit if ids is None else np.intersect1d(ids, hit, assume_unique=True)
+            if not len(ids):
+                break
+
+        m = np.zeros(self.n, dtype=bool)
+        if ids is not None:
+            m[ids] = True
+
+        with self._cache_lock:
+            self._mask_cache[cache_key] = m
+            while len(self._mask_cache) > self.cache_size:
+                self._mask_cache.popitem(last=False)
+
+        return m
+
+
+def _is_scalar(val: Any) -> bool:
+    return isinstance(val, (str, int, float, bool))
+
+
+def _to_postings(values: Dict[str, List[int]]) -> Dict[str, np.ndarray]:
+    return {v: np.asarray(ids, dtype=np.int32) for v, ids in values.items()}
+
+
+def _extend_postings(postings: Dict[Any, np.ndarray], values: Dict[Any, List[int]]) -> None:
+    # new ids are larger than existing ones, so appending keeps lists sorted
+    for v, ids in values.items():
+        new = np.asarray(ids, dtype=np.int32)
+        postings[v] = np.concatenate([postings[v], new]) if v in postings else new
@@ -1,18 +1,27 @@
 from __future__ import annotations
 
-import json
-import re
-import hashlib
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 
 from src.embeddings.embedder import EmbedderConfig, LocalEmbedder
-from rank_bm25 import BM25Okapi
+from src.embeddings.model_registry import get_embedder
+from src.pipelines.ann_index import load_tuned, search_params
+from src.retriever.chunk_store import STORE_DIR, ChunkStoreDocstore, ensure_store
+from src.retriever.filter_index import MetadataFilterIndex
+from src.retriever.query_context import QueryContext, _doc_key
+from src.retriever.result_cache import CacheConfig, ResultCache, filters_key, normalize_query
+from src.retriever.snapshots import Snapshot, current_snapshot
+from src.retriever.sparse_index import load_corpus_index
+from src.utils.text import simple_tokenize
 
 
 CHUNKS_JSONL = Path("src/data/chunks/chunks.jsonl")
@@ -20,24 +29,6 @@ VECTORSTORE_DIR = Path("src/vectorstore")
 
 
 # ================= UTILS =================
-def _simple_tokenize(text: str) -> List[str]:
-    text = text.lower()
-    text = re.sub(r"[^a-z0-9\s]+", " ", text)
-    return [t for t in text.split() if t]
-
-
-def _text_hash(text: str) -> str:
-    t = " ".join(text.strip().lower().split())
-    return hashlib.md5(t.encode("utf-8")).hexdigest()
-
-
-def _doc_key(d: Document) -> str:
-    src = str(d.metadata.get("source", "unknown"))
-    page = str(d.metadata.get("page", ""))
-    h = _text_hash(d.page_content)
-    return f"{src}::p{page}::{h}"
-
-
 def _normalize_scores(items: List[Tuple[str, float]]) -> Dict[str, float]:
     if not items:
         return {}
@@ -60,86 +51,159 @@ def _distance_to_similarity(dist: float) -> float:
     return 1.0 / (1.0 + float(dist))
 
 
-def _infer_year_from_source(source: str) -> Optional[str]:
-    m = re.search(r"(19|20)\d{2}", source)
-    return m.group(0) if m else None
-
-
-def _passes_filters(d: Document, filters: Optional[Dict[str, Any]]) -> bool:
-    if not filters:
-        return True
-
-    md = d.metadata or {}
-    src = str(md.get("source", "")).lower()
-    tags = md.get("tags", [])
-    tags_str = " ".join([str(t).lower() for t in tags]) if isinstance(tags, list) else str(tags).lower()
-
-    for k, v in filters.items():
-        if v is None:
-            continue
-
-        v_str = str(v).lower()
-
-        if k.lower() == "year":
-            year_val = md.get("year")
-            year_val = str(year_val).lower() if year_val else str(_infer_year_from_source(src) or "")
-            if year_val != v_str:
-                return False
-
-        elif k.lower() == "type":
-            type_val = str(md.get("type", "")).lower()
-            if not type_val:
-                if v_str in tags_str or v_str in src:
-                    type_val = v_str
-            if type_val != v_str:
-                return False
-
-        else:
-            val = md.get(k)
-            if val is None or str(val).lower() != v_str:
-                return False
-
-    return True
-
-
-def _cosine(a: List[float], b: List[float]) -> float:
-    return sum(x * y for x, y in zip(a, b))
-
-
 def _mmr_select(
-    query_vec: List[float],
-    cand_vecs: List[List[float]],
+    ctx: QueryContext,
+    cand_vecs: np.ndarray,
     cand_keys: List[str],
     k: int,
     lambda_mult: float,
 ) -> List[str]:
-
-    if k <= 0 or not cand_vecs:
+    """
+    Greedy MMR on normalized vectors (dot == cosine).
+    The candidate gram matrix is computed once and the max similarity to
+    the selected set is updated incrementally, so each step is O(n).
+    """
+    n = len(cand_keys)
+    if k <= 0 or n == 0:
         return []
 
-    selected = []
-    remaining = list(range(len(cand_vecs)))
-    sim_to_q = [_cosine(query_vec, v) for v in cand_vecs]
+    cand = np.asarray(cand_vecs, dtype=np.float32)
+    sim_to_q = cand @ np.asarray(ctx.vector, dtype=np.float32)
+    gram = cand @ cand.T
+
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
 
-    while remaining and len(selected) < k:
+    for _ in range(min(k, n)):
         if not selected:
-            best = max(remaining, key=lambda i: sim_to_q[i])
-            selected.append(best)
-            remaining.remove(best)
-            continue
+            scores = sim_to_q.copy()
+        else:
+            scores = lambda_mult * sim_to_q - (1 - lambda_mult) * max_sim
 
-        def mmr_score(i):
-            rel = sim_to_q[i]
-            red = max(_cosine(cand_vecs[i], cand_vecs[j]) for j in selected)
-            return lambda_mult * rel - (1 - lambda_mult) * red
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
 
-        best = max(remaining, key=mmr_score)
         selected.append(best)
-        remaining.remove(best)
+        available[best] = False
+        np.maximum(max_sim, gram[best], out=max_sim)
 
     return [cand_keys[i] for i in selected]
 
 
+def _stored_cid(doc: Document, n: int) -> bool:
+    doc_id = getattr(doc, "id", None)
+    return isinstance(doc_id, str) and doc_id.isdigit() and int(doc_id) < n
+
+
+# ================= LOCK =================
+class _ReadWriteLock:
+    """
+    Many concurrent queries, one writer (add_chunks) at a time.
+    A waiting writer blocks new readers so ingest can't be starved.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self) -> None:
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self) -> None:
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class _SharedRelease:
+    """
+    Calls release() once every holder has called done(). Starts with one
+    holder (the creator); hold(fut) adds a future that calls done() when
+    it finishes, so a submit that fails never leaves a count behind.
+    """
+
+    def __init__(self, release):
+        self._left = 1
+        self._release = release
+        self._mu = threading.Lock()
+
+    def hold(self, fut: Future) -> Future:
+        with self._mu:
+            self._left += 1
+        fut.add_done_callback(self.done)
+        return fut
+
+    def done(self, *_):
+        with self._mu:
+            self._left -= 1
+            last = self._left == 0
+        if last:
+            self._release()
+
+
+# ================= LEG POOL =================
+# process-wide: FAISS search and numpy BM25 scoring mostly release the GIL
+_leg_pool: Optional[ThreadPoolExecutor] = None
+_leg_pool_lock = threading.Lock()
+
+
+def _get_leg_pool(workers: int) -> ThreadPoolExecutor:
+    global _leg_pool
+    with _leg_pool_lock:
+        if _leg_pool is None:
+            _leg_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retrieval-leg")
+        return _leg_pool
+
+
+class _LegClock:
+    """Marks when a pooled leg starts running; its budget counts from then."""
+
+    __slots__ = ("started", "at")
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.at = 0.0
+
+    def run(self, fn, *args):
+        self.at = time.perf_counter()
+        self.started.set()
+        return fn(*args)
+
+
+def _left(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else max(0.0, deadline - time.perf_counter())
+
+
 # ================= CONFIG =================
 @dataclass
 class HybridRetrieverConfig:
@@ -149,6 +213,19 @@ class HybridRetrieverConfig:
     use_mmr: bool = True
     mmr_lambda: float = 0.6
     embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding_backend: str = "torch"      # "onnx": int8 onnxruntime query embeddings
+    onnx_threads: int = 0
+    cache_max_entries: int = 1024     # 0 disables the result cache
+    cache_ttl_s: float = 600.0
+    # vector + keyword legs run concurrently; a leg over budget is dropped
+    # (degraded result from the other leg, not cached). None = no budget.
+    # A leg's budget starts when it starts running (not while it queues);
+    # legs_max_wait_s caps the whole wait, queueing included.
+    parallel_legs: bool = True
+    leg_workers: int = 8
+    vector_timeout_s: Optional[float] = 1.0
+    keyword_timeout_s: Optional[float] = 1.0
+    legs_max_wait_s: Optional[float] = 5.0
 
 
 # ================= RETRIEVER =================
@@ -159,128 +236,333 @@ class HybridRetriever:
         cfg: Optional[HybridRetrieverConfig] = None,
         vectorstore_dir: Path = VECTORSTORE_DIR,
         chunks_jsonl: Path = CHUNKS_JSONL,
+        store_dir: Path = STORE_DIR,
+        embedder: Optional[LocalEmbedder] = None,
     ):
         self.cfg = cfg or HybridRetrieverConfig()
+        self._lock = _ReadWriteLock()
+        self._version = 0     # bumped by add_chunks; part of every cache key
+        self.leg_stats = {"vector_timeouts": 0, "keyword_timeouts": 0, "degraded": 0}
+        self._stats_lock = threading.Lock()
+
+        self.cache = ResultCache(
+            CacheConfig(max_entries=self.cfg.cache_max_entries, ttl_seconds=self.cfg.cache_ttl_s),
+            name="retrieval",
+        )
 
-        self.embedder = LocalEmbedder(
-            EmbedderConfig(model_name=self.cfg.embedding_model_name)
+        # any object with LocalEmbedder's interface (e.g. the benchmark's offline embedder)
+        self.embedder = embedder or get_embedder(
+            EmbedderConfig(
+                model_name=self.cfg.embedding_model_name,
+                backend=self.cfg.embedding_backend,
+                onnx_threads=self.cfg.onnx_threads,
+            )
         )
 
+        # -------- CHUNK STORE --------
+        # text + metadata live once on disk (memory-mapped); every index
+        # below holds integer chunk ids (cids). First run migrates
+        # chunks.jsonl + the pickled docstore, so it comes before load_local.
+        self.store = ensure_store(store_dir, chunks_jsonl, vectorstore_dir)
+
+        # -------- SNAPSHOT --------
+        # the published index version (CURRENT); the store may already hold
+        # chunks a running ingest has not published yet, which stay hidden
+        snap = current_snapshot(vectorstore_dir)
+        self.snapshot = snap.name if snap is not None else None
+        index_dir = snap.path if snap is not None else Path(vectorstore_dir)
+        self.store.refresh()
+
         self.vs = FAISS.load_local(
-            str(vectorstore_dir),
+            str(index_dir),
             self.embedder.langchain_embeddings,
             allow_dangerous_deserialization=True,
         )
+        # persisted efSearch / nprobe for HNSW / IVF indexes
+        load_tuned(self.vs, index_dir)
+
+        if not isinstance(self.vs.docstore, ChunkStoreDocstore):
+            raise RuntimeError(
+                f"{vectorstore_dir} does not use the chunk store; "
+                "run python -m src.retriever.chunk_store --migrate"
+            )
+
+        # FAISS id -> cid, and BM25 doc id -> cid (the corpus may repeat chunks)
+        self.faiss_cids = np.asarray(
+            [int(self.vs.index_to_docstore_id[i]) for i in range(self.vs.index.ntotal)],
+            dtype=np.int64,
+        )
+        corpus_n = snap.corpus_n if snap is not None and snap.pinned else None
+        self.corpus_cids = np.array(self.store.corpus[:corpus_n], dtype=np.int64)
+
+        # persisted by ingestion; only rows added since the last save are
+        # tokenized, and serving never writes the index back
+        self.sparse = load_corpus_index(self.store, simple_tokenize, corpus_n=corpus_n, save=False)
+
+        # -------- FILTER INDEX --------
+        # one index over cids; each leg gathers the mask through its id map.
+        # metadata is streamed from the store, never held as dicts
+        self.filter = MetadataFilterIndex(self.store.iter_metadata(), rescan=self.store.iter_metadata)
+        # tombstoned chunks (replaced / deleted source files) never match;
+        # pinned to the snapshot's chunks + tombstones until add/remove_chunks
+        self._pin = (snap.store_n, snap.tombstones()) if snap is not None and snap.pinned else None
+        # chunk rows below this are indexed here (or dead); see can_catch_up
+        self.store_n = snap.store_n if snap is not None and snap.pinned else self.store.n
+        self.live = self._live_mask()
+
+        # cid -> FAISS id, so BM25 hits can reuse stored vectors
+        self.cid_to_fid = self._cid_to_fid()
+
+    def _live_mask(self) -> Optional[np.ndarray]:
+        if self._pin is None:
+            return self.store.live_mask(self.filter.n)
+        store_n, dead = self._pin
+        m = np.ones(self.filter.n, dtype=bool)
+        m[dead[dead < self.filter.n]] = False
+        m[store_n:] = False
+        return m
+
+    def _cid_to_fid(self) -> np.ndarray:
+        out = np.full(self.store.n, -1, dtype=np.int64)
+        out[self.faiss_cids] = np.arange(len(self.faiss_cids), dtype=np.int64)
+        return out
+
+    def _masks(
+        self, filters: Optional[Dict[str, Any]]
+    ) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Filter mask over cids -> (FAISS id mask, BM25 doc mask)."""
+        m = self.filter.mask(filters)
+        if self.live is not None:
+            m = self.live if m is None else m & self.live
+        if m is None:
+            return None, None
+        return m[self.faiss_cids], m[self.corpus_cids]
+
+    # ================= INCREMENTAL =================
+    def add_chunks(
+        self,
+        docs: List[Document],
+        vectors: Optional[List[List[float]]] = None,
+    ) -> int:
+        """
+        Add freshly ingested chunks to the live indexes in place:
+        FAISS (in memory), BM25 postings/statistics and both filter
+        indexes. Cost scales with the new chunks only. Pass the vectors
+        ingestion already computed to skip re-embedding.
+        """
+        if not docs:
+            return 0
+
+        texts = [d.page_content for d in docs]
+        metadatas = [d.metadata or {} for d in docs]
+
+        # chunks from ingestion already sit in the store (doc.id = cid);
+        # anything else is persisted here and joins the keyword corpus
+        self.store.refresh()
+        fresh = [d for d in docs if not _stored_cid(d, self.store.n)]
+        if fresh:
+            self.store.extend_corpus(self.store.append(fresh))
+        cids = [int(d.id) for d in docs]
+
+        # model + tokenizer work happens before taking the write lock
+        if vectors is None:
+            vectors = self.embedder.embed_documents(texts)
+        tokens = [simple_tokenize(t) for t in texts]
+
+        with self._lock.write():
+            self.vs.add_embeddings(
+                list(zip(texts, vectors)),
+                metadatas=metadatas,
+                ids=[str(c) for c in cids],
+            )
+            new_cids = np.asarray(cids, dtype=np.int64)
+            self.faiss_cids = np.concatenate([self.faiss_cids, new_cids])
+
+            self.sparse.add_documents(tokens)
+            self.corpus_cids = np.concatenate([self.corpus_cids, new_cids])
+
+            # cids appended by other writers are indexed too, keeping filter ids == cids
+            self.filter.add([self.store.metadata(c) for c in range(self.filter.n, self.store.n)])
+            self.store_n = max(self.store_n, int(new_cids.max()) + 1)
+            # in-place updates follow the store, not the snapshot loaded at init
+            self._pin = None
+            self.live = self._live_mask()
+            self.cid_to_fid = self._cid_to_fid()
+
+            self._version += 1
+
+        self.cache.clear()
+        return len(docs)
+
+    def can_catch_up(self, snap: Snapshot, cids: Sequence[int]) -> bool:
+        """
+        True if add_chunks(cids) brings this retriever up to snap: every
+        other chunk row published since it loaded is tombstoned, and the
+        keyword corpus grew by exactly cids. False when another writer (a
+        CLI run) published in between; reload from snap instead.
+        """
+        if not snap.pinned:
+            return False
+        new = np.asarray(list(cids), dtype=np.int64)
+        gap = np.setdiff1d(np.arange(self.store_n, snap.store_n, dtype=np.int64), new)
+        if len(gap) and not np.isin(gap, snap.tombstones()).all():
+            return False
+        return snap.corpus_n == len(self.corpus_cids) + len(new)
+
+    def remove_chunks(self, cids: List[int]) -> int:
+        """
+        Tombstone chunks (e.g. the old version of a re-ingested file).
+        They stay in FAISS / BM25 but are masked out of both legs.
+        """
+        removed = self.store.tombstone(cids)
+
+        with self._lock.write():
+            self._pin = None
+            self.live = self._live_mask()
+            self._version += 1
+
+        self.cache.clear()
+        return removed
+
+    # ================= FAISS =================
+    def _faiss_search(
+        self,
+        qvecs: np.ndarray,
+        k: int,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        One index.search for an (n, d) query matrix -> per-query
+        (faiss_id, distance) lists. The filter is pushed down as an ID
+        selector, so selective filters still return k matching hits.
+        """
+        import faiss
+
+        n = len(qvecs)
+        k = min(k, self.vs.index.ntotal)
+        if k <= 0 or (mask is not None and not mask.any()):
+            return [[] for _ in range(n)]
+
+        qv = np.ascontiguousarray(qvecs, dtype=np.float32)
+        if getattr(self.vs, "_normalize_L2", False):
+            qv = qv.copy()
+            faiss.normalize_L2(qv)
+
+        if mask is None:
+            dists, ids = self.vs.index.search(qv, k)
+        else:
+            bits = np.packbits(mask, bitorder="little")
+            try:
+                sel = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits))
+                params = search_params(self.vs.index, sel, selectivity=float(mask.mean()))
+                dists, ids = self.vs.index.search(qv, k, params=params)
+            except Exception as e:
+                # index type without selector support -> over-fetch and post-filter
+                print("FAISS selector fallback:", e)
+                dists, ids = self.vs.index.search(qv, self.vs.index.ntotal)
+                return [
+                    [(int(i), float(d)) for d, i in zip(dr, ir) if i >= 0 and mask[i]][:k]
+                    for dr, ir in zip(dists, ids)
+                ]
+
+        return [
+            [(int(i), float(d)) for d, i in zip(dr, ir) if i >= 0]
+            for dr, ir in zip(dists, ids)
+        ]
+
+    def _candidate_vectors(self, docs: List[Document], fids: List[int]) -> np.ndarray:
+        """
+        Stored FAISS vectors for the candidates; only docs missing from the
+        index are sent through the embedding model.
+        """
+        out = np.zeros((len(docs), self.vs.index.d), dtype=np.float32)
+
+        known = [j for j, fid in enumerate(fids) if fid >= 0]
+        if known:
+            ids = np.asarray([fids[j] for j in known], dtype=np.int64)
+            try:
+                out[known] = self.vs.index.reconstruct_batch(ids)
+            except Exception:
+                out[known] = np.stack([self.vs.index.reconstruct(int(i)) for i in ids])
 
-        if not chunks_jsonl.exists():
-            raise FileNotFoundError(f"Missing {chunks_jsonl}")
-
-        self.corpus_docs = []
-        corpus_tokens = []
-
-        with chunks_jsonl.open("r", encoding="utf-8") as f:
-            for line in f:
-                rec = json.loads(line)
-                md = rec.get("metadata", {}) or {}
-                doc = Document(page_content=rec["text"], metadata=md)
-                self.corpus_docs.append(doc)
-                corpus_tokens.append(_simple_tokenize(rec["text"]))
+        missing = [j for j, fid in enumerate(fids) if fid < 0]
+        if missing:
+            out[missing] = np.asarray(
+                self.embedder.embed_documents([docs[j].page_content for j in missing]),
+                dtype=np.float32,
+            )
 
-        self.bm25 = BM25Okapi(corpus_tokens)
+        return out
 
-    # ================= MAIN =================
-    def retrieve_candidates(
+    # ================= FUSION =================
+    def _fuse(
         self,
-        query: str,
-        top_k: int,
-        filters: Optional[Dict[str, Any]] = None,
+        ctx: QueryContext,
+        vec_hits: List[Tuple[int, float]],
+        kw_hits: List[Tuple[int, float]],
+        cand_n: int,
     ) -> List[Document]:
 
-        cand_n = max(1, top_k * self.cfg.candidate_multiplier)
-
-        # -------- VECTOR --------
-        vec_pairs = self.vs.similarity_search_with_score(query, k=cand_n)
-
-        vec = []
-
-        for item in vec_pairs:
-            try:
-                if isinstance(item, tuple) and len(item) == 2:
-                    d, dist = item
-                elif isinstance(item, Document):
-                    d = item
-                    dist = 1.0
-                else:
-                    continue
-
-                if not isinstance(d, Document):
-                    continue
-
-                if _passes_filters(d, filters):
-                    vec.append((d, _distance_to_similarity(dist)))
+        keys = self.store.cols["key"]
 
-            except Exception as e:
-                print("Vector error:", e)
-
-        # -------- BM25 --------
+        # (cid, score, fid); documents are only decoded for the final candidates
+        vec = [
+            (int(self.faiss_cids[fid]), _distance_to_similarity(dist), fid)
+            for fid, dist in vec_hits
+        ]
         kw = []
-        scores = self.bm25.get_scores(_simple_tokenize(query))
-
-        for d, s in zip(self.corpus_docs, scores):
-            try:
-                if _passes_filters(d, filters):
-                    kw.append((d, float(s)))
-            except:
-                continue
-
-        kw.sort(key=lambda x: x[1], reverse=True)
-        kw = kw[:cand_n]
+        for i, s in kw_hits:
+            cid = int(self.corpus_cids[i])
+            kw.append((cid, s, int(self.cid_to_fid[cid])))
 
         # -------- MERGE --------
-        vec_norm = _normalize_scores([(_doc_key(d), s) for d, s in vec])
-        kw_norm = _normalize_scores([(_doc_key(d), s) for d, s in kw])
+        # by content key, so the same chunk stored twice still counts once
+        vec_norm = _normalize_scores([(int(keys[c]), s) for c, s, _ in vec])
+        kw_norm = _normalize_scores([(int(keys[c]), s) for c, s, _ in kw])
 
         merged = {}
 
-        def ensure(key, d):
+        def ensure(key, cid, fid):
             if key not in merged:
-                merged[key] = {"doc": d, "vec": 0.0, "bm25": 0.0}
+                merged[key] = {"cid": cid, "vec": 0.0, "bm25": 0.0, "fid": fid}
+            elif merged[key]["fid"] < 0:
+                merged[key]["fid"] = fid
 
-        for d, _ in vec:
-            key = _doc_key(d)
-            ensure(key, d)
+        for cid, _, fid in vec:
+            key = int(keys[cid])
+            ensure(key, cid, fid)
             merged[key]["vec"] = vec_norm.get(key, 0.0)
 
-        for d, _ in kw:
-            key = _doc_key(d)
-            ensure(key, d)
+        for cid, _, fid in kw:
+            key = int(keys[cid])
+            ensure(key, cid, fid)
             merged[key]["bm25"] = kw_norm.get(key, 0.0)
 
         scored = []
 
-        for key, obj in merged.items():
+        for obj in merged.values():
             v = obj["vec"]
             b = obj["bm25"]
             score = self.cfg.alpha * v + (1 - self.cfg.alpha) * b
-            scored.append((obj["doc"], score, key))
+            scored.append((obj["cid"], score, obj["fid"]))
 
         scored.sort(key=lambda x: x[1], reverse=True)
 
         # -------- MMR --------
         if self.cfg.use_mmr and scored:
             pre = scored[:cand_n]
-            cand_docs = [d for d, _, _ in pre]
-            cand_keys = [k for _, _, k in pre]
+            cand_docs = self.store.documents([c for c, _, _ in pre])
+            cand_keys = [_doc_key(d) for d in cand_docs]
 
-            qv = self.embedder.embed_query(query)
-            dvs = self.embedder.embed_documents([d.page_content for d in cand_docs])
+            dvs = self._candidate_vectors(cand_docs, [fid for _, _, fid in pre])
+            ctx.doc_vectors.update(zip(cand_keys, dvs))
 
-            selected_keys = _mmr_select(qv, dvs, cand_keys, cand_n, self.cfg.mmr_lambda)
+            selected_keys = _mmr_select(ctx, dvs, cand_keys, cand_n, self.cfg.mmr_lambda)
 
-            key_to_doc = {k: d for d, _, k in pre}
+            key_to_doc = dict(zip(cand_keys, cand_docs))
             docs = [key_to_doc[k] for k in selected_keys if k in key_to_doc]
         else:
-            docs = [d for d, _, _ in scored[:cand_n]]
+            docs = self.store.documents([c for c, _, _ in scored[:cand_n]])
 
         # -------- PRIORITY --------
         now = time.time()
@@ -290,4 +572,197 @@ class HybridRetriever:
             reverse=True
         )
 
-        return docs
\ No newline at end of file
+        return docs
+
+    # ================= QUERY CONTEXT =================
+    def prepare_contexts(self, ctxs: List[QueryContext]) -> List[QueryContext]:
+        """
+        Fill in missing query vectors (one forward pass for all of them)
+        and token lists. Contexts that already carry both are untouched.
+        """
+        model = self.cfg.embedding_model_name
+
+        todo = [c for c in ctxs if c.vector_for(model) is None]
+        if todo:
+            vecs = np.asarray(self.embedder.embed_queries([c.query for c in todo]), dtype=np.float32)
+            for c, v in zip(todo, vecs):
+                c.vector = v
+                c.model_name = model
+
+        for c in ctxs:
+            if c.tokens is None:
+                c.tokens = simple_tokenize(c.query)
+
+        return ctxs
+
+    # ================= MAIN =================
+    def retrieve_candidates(
+        self,
+        query: str,
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None,
+        ctx: Optional[QueryContext] = None,
+    ) -> List[Document]:
+        contexts = [ctx] if ctx is not None else None
+        return self.retrieve_candidates_batch([query], top_k, filters, contexts=contexts)[0]
+
+    def retrieve_candidates_batch(
+        self,
+        queries: List[str],
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None,
+        contexts: Optional[List[QueryContext]] = None,
+    ) -> List[List[Document]]:
+        """
+        Same result as calling retrieve_candidates per query, but with one
+        embedding forward pass, one FAISS search and shared BM25 postings.
+        contexts: optional per-query QueryContext to read from / fill in.
+        Repeated queries are served from the result cache.
+        """
+        if not queries:
+            return []
+
+        ctxs = contexts or [QueryContext(query=q) for q in queries]
+
+        fkey = filters_key(filters)
+        keys = [("retrieve", self._version, normalize_query(q), top_k, fkey) for q in queries]
+        results: List[Optional[List[Document]]] = [self.cache.get(k) for k in keys]
+
+        miss = [i for i, r in enumerate(results) if r is None]
+        if miss:
+            fresh, degraded = self._retrieve_uncached([ctxs[i] for i in miss], top_k, filters)
+            for i, docs in zip(miss, fresh):
+                if not degraded:
+                    self.cache.put(keys[i], docs)
+                results[i] = docs
+
+        return [list(r) for r in results]
+
+    def _retrieve_uncached(
+        self,
+        ctxs: List[QueryContext],
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+    ) -> Tuple[List[List[Document]], bool]:
+        """Results plus whether a leg was dropped (degraded)."""
+
+        cand_n = max(1, top_k * self.cfg.candidate_multiplier)
+
+        # -------- EMBED --------
+        self.prepare_contexts(ctxs)
+        qvecs = np.stack([c.vector for c in ctxs])
+
+        if not self.cfg.parallel_legs:
+            with self._lock.read():
+                vec_mask, kw_mask = self._masks(filters)
+                vec_hits = self._vector_leg(qvecs, cand_n, vec_mask)
+                kw_hits = self._keyword_leg(ctxs, cand_n, kw_mask)
+                return self._fuse_all(ctxs, vec_hits, kw_hits, cand_n), False
+
+        self._lock.acquire_read()
+        # legs that overrun their budget keep reading the indexes, so the
+        # read lock is released only once both legs and fusion are done
+        holds = _SharedRelease(self._lock.release_read)
+        try:
+            vec_mask, kw_mask = self._masks(filters)
+
+            pool = _get_leg_pool(self.cfg.leg_workers)
+            clocks = {"vector": _LegClock(), "keyword": _LegClock()}
+            vec_fut = holds.hold(pool.submit(clocks["vector"].run, self._vector_leg, qvecs, cand_n, vec_mask))
+            kw_fut = holds.hold(pool.submit(clocks["keyword"].run, self._keyword_leg, ctxs, cand_n, kw_mask))
+
+            vec_hits, kw_hits = self._collect_legs(vec_fut, kw_fut, clocks)
+            degraded = vec_hits is None or kw_hits is None
+
+            empty = [[] for _ in ctxs]
+            results = self._fuse_all(ctxs, vec_hits or empty, kw_hits or empty, cand_n)
+            return results, degraded
+        finally:
+            holds.done()
+
+    def _collect_legs(self, vec_fut: Future, kw_fut: Future, clocks: Dict[str, _LegClock]):
+        """
+        Wait for each leg up to its own budget, counted from when the leg
+        starts running (time queued behind other requests' legs is not
+        charged to it). A leg that misses it is returned as None; if both
+        miss, the first one to finish is used. Nothing waits past
+        legs_max_wait_s: a leg still queued or running then is dropped.
+        """
+        cap = None if self.cfg.legs_max_wait_s is None else time.perf_counter() + self.cfg.legs_max_wait_s
+        budgets = {vec_fut: self.cfg.vector_timeout_s, kw_fut: self.cfg.keyword_timeout_s}
+        names = {vec_fut: "vector", kw_fut: "keyword"}
+        out = {}
+        missed = []
+
+        for fut in sorted(budgets, key=lambda f: budgets[f] if budgets[f] is not None else float("inf")):
+            budget, clock = budgets[fut], clocks[names[fut]]
+            deadline = cap
+            if budget is not None and clock.started.wait(_left(cap)):
+                deadline = clock.at + budget if cap is None else min(cap, clock.at + budget)
+            done, _ = wait([fut], timeout=_left(deadline))
+            if done:
+                out[fut] = fut.result()
+            else:
+                missed.append(f"{names[fut]}_timeouts")
+
+        if not out:
+            done, _ = wait([vec_fut, kw_fut], timeout=_left(cap), return_when=FIRST_COMPLETED)
+            if done:
+                fut = next(iter(done))
+                out[fut] = fut.result()
+
+        with self._stats_lock:
+            for k in missed:
+                self.leg_stats[k] += 1
+            if len(out) < 2:
+                self.leg_stats["degraded"] += 1
+
+        if len(out) == 1:
+            dropped = [names[f] for f in budgets if f not in out]
+            print(f"Retrieval degraded: {dropped[0]} leg over budget, using {names[next(iter(out))]} only")
+        elif not out:
+            print(f"Retrieval degraded: both legs over legs_max_wait_s={self.cfg.legs_max_wait_s}s, no results")
+
+        return out.get(vec_fut), out.get(kw_fut)
+
+    def leg_counters(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.leg_stats)
+
+    # ================= LEGS =================
+    def _vector_leg(
+        self,
+        qvecs: np.ndarray,
+        cand_n: int,
+        mask: Optional[np.ndarray],
+    ) -> List[List[Tuple[int, float]]]:
+        try:
+            return self._faiss_search(qvecs, cand_n, mask)
+        except Exception as e:
+            print("Vector error:", e)
+            return [[] for _ in range(len(qvecs))]
+
+    def _keyword_leg(
+        self,
+        ctxs: List[QueryContext],
+        cand_n: int,
+        mask: Optional[np.ndarray],
+    ) -> List[List[Tuple[int, float]]]:
+        # inverted index: cost follows the query's posting lists, not corpus size
+        try:
+            return self.sparse.search_batch([c.tokens for c in ctxs], cand_n, mask=mask)
+        except Exception as e:
+            print("Keyword error:", e)
+            return [[] for _ in ctxs]
+
+    def _fuse_all(
+        self,
+        ctxs: List[QueryContext],
+        vec_hits: List[List[Tuple[int, float]]],
+        kw_hits: List[List[Tuple[int, float]]],
+        cand_n: int,
+    ) -> List[List[Document]]:
+        return [
+            self._fuse(c, v, kw, cand_n)
+            for c, v, kw in zip(ctxs, vec_hits, kw_hits)
+        ]
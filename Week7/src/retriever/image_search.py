@@ -9,7 +9,8 @@ from typing import Any, Dict, List, Tuple, Optional
 import numpy as np
 from PIL import Image
 
-from src.embeddings.clip_embedder import CLIPConfig, CLIPEembedder
+from src.embeddings.clip_embedder import CLIPConfig
+from src.embeddings.model_registry import get_clip
 
 
 MM_DIR = Path("src/multimodal_vectorstore")
@@ -110,7 +111,7 @@ class ImageSearchEngine:
         self.cfg = cfg or SearchConfig()
         self.meta = _load_meta(META_PATH)
         self.index = _load_faiss(INDEX_PATH)
-        self.clip = CLIPEembedder(CLIPConfig(model_name=self.cfg.clip_model))
+        self.clip = get_clip(CLIPConfig(model_name=self.cfg.clip_model))
 
     def text_to_image(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         qvec = self.clip.embed_text(query)
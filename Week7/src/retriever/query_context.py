@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+# ================= KEYS =================
+def _text_hash(text: str) -> str:
+    t = " ".join(text.strip().lower().split())
+    return hashlib.md5(t.encode("utf-8")).hexdigest()
+
+
+def _doc_key(d: Document) -> str:
+    src = str(d.metadata.get("source", "unknown"))
+    page = str(d.metadata.get("page", ""))
+    h = _text_hash(d.page_content)
+    return f"{src}::p{page}::{h}"
+
+
+# ================= CONTEXT =================
+@dataclass
+class QueryContext:
+    """
+    Per-request query state shared by retrieval, MMR and reranking,
+    so one /ask embeds the query exactly once.
+
+    model_name records which embedding model produced `vector`;
+    consumers using a different model must not reuse it.
+    doc_vectors caches candidate vectors (by _doc_key) that MMR already
+    pulled from the index, for the reranker's embedding fallback.
+    """
+
+    query: str
+    model_name: Optional[str] = None
+    vector: Optional[np.ndarray] = None
+    tokens: Optional[List[str]] = None
+    doc_vectors: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def vector_for(self, model_name: str) -> Optional[np.ndarray]:
+        if self.vector is None or self.model_name != model_name:
+            return None
+        return self.vector
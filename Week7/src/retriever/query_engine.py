@@ -1,14 +1,19 @@
 from __future__ import annotations
 
 import argparse
+import time
 from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Optional
 
+import numpy as np
 from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 
-from src.embeddings.embedder import EmbedderConfig, LocalEmbedder
+from src.embeddings.embedder import EmbedderConfig
+from src.embeddings.model_registry import get_embedder
+from src.pipelines.ann_index import load_tuned
+from src.retriever.snapshots import index_dir
 
 VECTORSTORE_DIR = Path("src/vectorstore")
 
@@ -22,17 +27,47 @@ class QueryConfig:
 class QueryEngine:
     def __init__(self, cfg: Optional[QueryConfig] = None, vectorstore_dir: Path = VECTORSTORE_DIR):
         self.cfg = cfg or QueryConfig()
-        self.embedder = LocalEmbedder(EmbedderConfig(model_name=self.cfg.embedding_model_name))
+        self.embedder = get_embedder(EmbedderConfig(model_name=self.cfg.embedding_model_name))
+        current = index_dir(vectorstore_dir)
         self.vs = FAISS.load_local(
-            str(vectorstore_dir),
+            str(current),
             self.embedder.langchain_embeddings,
             allow_dangerous_deserialization=True,
         )
+        load_tuned(self.vs, current)
 
     def retrieve(self, query: str, top_k: Optional[int] = None) -> List[Document]:
         k = top_k if top_k is not None else self.cfg.top_k
         return self.vs.similarity_search(query, k=k)
 
+    def retrieve_batch(self, queries: List[str], top_k: Optional[int] = None) -> List[List[Document]]:
+        """
+        Dense retrieval for many queries: one embedding forward pass and
+        one FAISS search over the (n, d) query matrix.
+        """
+        if not queries:
+            return []
+
+        k = top_k if top_k is not None else self.cfg.top_k
+        k = min(k, self.vs.index.ntotal)
+        if k <= 0:
+            return [[] for _ in queries]
+
+        qv = np.asarray(self.embedder.embed_queries(queries), dtype=np.float32)
+        _, ids = self.vs.index.search(qv, k)
+
+        out = []
+        for row in ids:
+            docs = []
+            for i in row:
+                if i < 0:
+                    continue
+                d = self.vs.docstore.search(self.vs.index_to_docstore_id[int(i)])
+                if isinstance(d, Document):
+                    docs.append(d)
+            out.append(docs)
+        return out
+
     @staticmethod
     def pretty_print(docs: List[Document]) -> None:
         for i, d in enumerate(docs, start=1):
@@ -49,6 +84,10 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--top_k", type=int, default=5)
     parser.add_argument("--embedding_model", type=str, default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--queries_file", type=str, default=None, help="one query per line; runs in batch mode")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--hybrid", action="store_true", help="batch through HybridRetriever instead of dense only")
+    parser.add_argument("--show", action="store_true", help="print retrieved chunks in batch mode")
     return parser.parse_args()
 
 
@@ -70,9 +109,58 @@ def interactive_loop(engine: QueryEngine, top_k: int):
         print("\n Exiting")
 
 
+def batch_mode(args) -> None:
+    queries = [
+        line.strip()
+        for line in Path(args.queries_file).read_text(encoding="utf-8").splitlines()
+        if line.strip()
+    ]
+    if not queries:
+        print("No queries found in", args.queries_file)
+        return
+
+    if args.hybrid:
+        from src.retriever.hybrid_retriever import HybridRetriever, HybridRetrieverConfig
+
+        retriever = HybridRetriever(
+            HybridRetrieverConfig(top_k=args.top_k, embedding_model_name=args.embedding_model)
+        )
+        run = lambda qs: retriever.retrieve_candidates_batch(qs, top_k=args.top_k)
+    else:
+        engine = QueryEngine(
+            QueryConfig(top_k=args.top_k, embedding_model_name=args.embedding_model)
+        )
+        run = lambda qs: engine.retrieve_batch(qs, top_k=args.top_k)
+
+    results: List[List[Document]] = []
+    start = time.perf_counter()
+
+    for i in range(0, len(queries), args.batch_size):
+        results.extend(run(queries[i : i + args.batch_size]))
+
+    elapsed = time.perf_counter() - start
+
+    if args.show:
+        for q, docs in zip(queries, results):
+            print("\n" + "#" * 80)
+            print("Query:", q)
+            QueryEngine.pretty_print(docs[: args.top_k])
+
+    mode = "hybrid" if args.hybrid else "dense"
+    print(
+        f"\n[batch:{mode}] queries={len(queries)} | batch_size={args.batch_size} | "
+        f"time={elapsed:.3f}s | throughput={len(queries) / elapsed:.1f} q/s | "
+        f"avg={1000 * elapsed / len(queries):.2f} ms/q"
+    )
+
+
 def main():
     args = parse_args()
 
+    if args.queries_file:
+        batch_mode(args)
+        return
+
     engine = QueryEngine(
         QueryConfig(top_k=args.top_k, embedding_model_name=args.embedding_model)
     )
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Pair = Tuple[str, str]
+
+
+# ================= CONFIG =================
+@dataclass
+class BatcherConfig:
+    max_batch: int = 64         # pairs per forward pass (a larger single request runs alone)
+    max_wait_ms: float = 5.0    # how long the first queued request waits for company
+
+
+# ================= REQUEST =================
+class _Request:
+    __slots__ = ("pairs", "done", "scores", "error", "queued_at")
+
+    def __init__(self, pairs: List[Pair]):
+        self.pairs = pairs
+        self.done = threading.Event()
+        self.scores: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+        self.queued_at = time.perf_counter()
+
+
+# ================= BATCHER =================
+class RerankBatcher:
+    """
+    Dynamic micro-batching in front of a cross-encoder.
+
+    Concurrent callers enqueue their (query, passage) pairs and block;
+    one background thread takes everything queued within max_wait_ms
+    (up to max_batch pairs), sorts the pairs by length so each forward
+    pass pads little, runs a single predict() and hands every caller its
+    own scores back in order. The model then sees one well-filled batch
+    at a time instead of many small ones competing for cores. A failed
+    predict() is raised in each caller of that batch.
+    """
+
+    def __init__(self, predict: Callable[[List[Pair]], Any], cfg: Optional[BatcherConfig] = None):
+        self.cfg = cfg or BatcherConfig()
+        self._predict = predict
+
+        self._cond = threading.Condition()
+        self._queue: Deque[_Request] = deque()
+        self._queued_pairs = 0
+        self._closed = False
+
+        self.requests = 0
+        self.batches = 0
+        self.pairs = 0
+        self.max_queue_depth = 0
+        self._wait_s = 0.0
+        self._predict_s = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+        self._thread.start()
+
+    # ================= CALLER SIDE =================
+    def predict(self, pairs: Sequence[Pair]) -> np.ndarray:
+        pairs = list(pairs)
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+
+        req = _Request(pairs)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("rerank batcher is closed")
+            self._queue.append(req)
+            self._queued_pairs += len(pairs)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._cond.notify()
+
+        req.done.wait()
+        if req.error is not None:
+            raise req.error
+        return req.scores
+
+    # ================= BATCH SIDE =================
+    def _take(self) -> List[_Request]:
+        """Block for the next batch: wait up to max_wait_ms after the oldest request."""
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return []
+
+            deadline = self._queue[0].queued_at + self.cfg.max_wait_ms / 1000.0
+            while self._queued_pairs < self.cfg.max_batch and not self._closed:
+                left = deadline - time.perf_counter()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+
+            batch, n = [], 0
+            while self._queue and (not batch or n + len(self._queue[0].pairs) <= self.cfg.max_batch):
+                req = self._queue.popleft()
+                batch.append(req)
+                n += len(req.pairs)
+            self._queued_pairs -= n
+            return batch
+
+    def _run(self) -> None:
+        try:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return
+                self._run_batch(batch)
+        finally:
+            # only reached with requests left if predict() killed the thread
+            self._fail_pending(RuntimeError("rerank batcher stopped"))
+
+    def _run_batch(self, batch: List[_Request]) -> None:
+        pairs = [p for req in batch for p in req.pairs]
+        order = np.argsort([len(q) + len(d) for q, d in pairs], kind="stable")
+
+        t0 = time.perf_counter()
+        scores: Optional[np.ndarray] = None
+        fatal: Optional[BaseException] = None
+        try:
+            sorted_scores = np.asarray(self._predict([pairs[i] for i in order]), dtype=np.float32).reshape(-1)
+            scores = np.empty(len(pairs), dtype=np.float32)
+            scores[order] = sorted_scores
+            error = None
+        except Exception as e:
+            error = e
+        except BaseException as e:
+            # KeyboardInterrupt / SystemExit: callers get an error, the thread stops
+            error, fatal = RuntimeError(f"rerank batcher stopped: {e!r}"), e
+        t1 = time.perf_counter()
+
+        try:
+            with self._cond:
+                self._wait_s += sum(t0 - req.queued_at for req in batch)
+                self.requests += len(batch)
+                self.batches += 1
+                self.pairs += len(pairs)
+                self._predict_s += t1 - t0
+        finally:
+            offset = 0
+            for req in batch:
+                if error is None:
+                    req.scores = scores[offset:offset + len(req.pairs)]
+                req.error = error
+                offset += len(req.pairs)
+                req.done.set()
+
+        if fatal is not None:
+            raise fatal
+
+    def _fail_pending(self, error: BaseException) -> None:
+        with self._cond:
+            self._closed = True
+            pending = list(self._queue)
+            self._queue.clear()
+            self._queued_pairs = 0
+        for req in pending:
+            req.error = error
+            req.done.set()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5.0)
+
+    # ================= METRICS =================
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "name": "rerank_batcher",
+                "max_batch": self.cfg.max_batch,
+                "max_wait_ms": self.cfg.max_wait_ms,
+                "queue_depth": len(self._queue),
+                "queued_pairs": self._queued_pairs,
+                "max_queue_depth": self.max_queue_depth,
+                "requests": self.requests,
+                "batches": self.batches,
+                "pairs": self.pairs,
+                "avg_batch_pairs": round(self.pairs / self.batches, 1) if self.batches else 0.0,
+                "avg_requests_per_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+                "avg_queue_wait_ms": round(1000 * self._wait_s / self.requests, 2) if self.requests else 0.0,
+                "avg_predict_ms": round(1000 * self._predict_s / self.batches, 2) if self.batches else 0.0,
+            }
@@ -1,25 +1,38 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
+import numpy as np
 from langchain_core.documents import Document
 
 from sentence_transformers import CrossEncoder
 
 from src.embeddings.embedder import EmbedderConfig, LocalEmbedder
+from src.embeddings.model_registry import get_cross_encoder, get_embedder
+from src.retriever.query_context import QueryContext, _doc_key
+from src.retriever.rerank_batcher import BatcherConfig, RerankBatcher
+from src.retriever.result_cache import CacheConfig, ResultCache, normalize_query
 
 
 @dataclass
 class RerankerConfig:
     cross_encoder_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
     embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    cache_max_entries: int = 1024     # 0 disables the rerank cache
+    cache_ttl_s: float = 600.0
+    # "onnx": int8 onnxruntime for both models on CPU nodes (falls back to torch)
+    backend: str = "torch"
+    onnx_threads: int = 0
+    # concurrent rerank calls share cross-encoder forward passes (0 pairs = off)
+    batch_max_pairs: int = 64
+    batch_max_wait_ms: float = 5.0
 
 
 class Reranker:
     """
     Production-safe reranker:
-    - CrossEncoder primary
+    - CrossEncoder primary (micro-batched across concurrent calls)
     - Embedding fallback
     - Handles mixed inputs safely
     """
@@ -31,22 +44,47 @@ class Reranker:
             print("Config error:", e)
             self.cfg = RerankerConfig()
 
+        self.cache = ResultCache(
+            CacheConfig(max_entries=self.cfg.cache_max_entries, ttl_seconds=self.cfg.cache_ttl_s),
+            name="rerank",
+        )
+
         # -------- Cross Encoder --------
         try:
-            self._ce: Optional[CrossEncoder] = CrossEncoder(self.cfg.cross_encoder_model)
+            self._ce: Optional[CrossEncoder] = get_cross_encoder(
+                self.cfg.cross_encoder_model, self.cfg.backend, self.cfg.onnx_threads
+            )
         except Exception as e:
             print("CrossEncoder load failed:", e)
             self._ce = None
 
+        self._batcher: Optional[RerankBatcher] = None
+        if self._ce is not None and self.cfg.batch_max_pairs > 0:
+            ce, bs = self._ce, self.cfg.batch_max_pairs
+            self._batcher = RerankBatcher(
+                lambda pairs: ce.predict(pairs, batch_size=bs, show_progress_bar=False),
+                BatcherConfig(max_batch=bs, max_wait_ms=self.cfg.batch_max_wait_ms),
+            )
+
         # -------- Embedder --------
+        # the same shared instance the retriever uses
         try:
-            self._embedder = LocalEmbedder(
-                EmbedderConfig(model_name=self.cfg.embedding_model_name)
+            self._embedder: Optional[LocalEmbedder] = get_embedder(
+                EmbedderConfig(
+                    model_name=self.cfg.embedding_model_name,
+                    backend=self.cfg.backend,
+                    onnx_threads=self.cfg.onnx_threads,
+                )
             )
         except Exception as e:
             print("Embedder init failed:", e)
             self._embedder = None
 
+    def batcher_stats(self) -> Dict[str, Any]:
+        if self._batcher is None:
+            return {"name": "rerank_batcher", "enabled": False}
+        return self._batcher.stats()
+
     # ================= NORMALIZATION =================
     def _normalize_docs(
         self, docs: List[Union[Document, Tuple[Document, float]]]
@@ -63,12 +101,40 @@ class Reranker:
             print("Normalization error:", e)
             return []
 
+    # ================= FALLBACK VECTORS =================
+    def _fallback_vectors(
+        self,
+        query: str,
+        docs: List[Document],
+        ctx: Optional[QueryContext],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Query/doc vectors for the embedding fallback. Reuses whatever the
+        retriever already put in the QueryContext (same model only) and
+        embeds just the rest.
+        """
+        model = self.cfg.embedding_model_name
+        qv = ctx.vector_for(model) if ctx is not None else None
+        if qv is None:
+            qv = self._embedder.embed_query(query)
+
+        cached = ctx.doc_vectors if ctx is not None and ctx.model_name == model else {}
+        keys = [_doc_key(d) for d in docs]
+
+        missing = [j for j, k in enumerate(keys) if k not in cached]
+        fresh = self._embedder.embed_documents([docs[j].page_content for j in missing]) if missing else []
+        fresh_by_idx = dict(zip(missing, fresh))
+
+        dvs = [cached[k] if k in cached else fresh_by_idx[j] for j, k in enumerate(keys)]
+        return np.asarray(qv, dtype=np.float32), np.asarray(dvs, dtype=np.float32)
+
     # ================= RERANK =================
     def rerank(
         self,
         query: str,
         docs: List[Union[Document, Tuple[Document, float]]],
-        top_k: int
+        top_k: int,
+        ctx: Optional[QueryContext] = None,
     ) -> List[Tuple[Document, float]]:
 
         try:
@@ -81,15 +147,24 @@ class Reranker:
             if not docs:
                 return []
 
+            cache_key = ("rerank", normalize_query(query), top_k, tuple(_doc_key(d) for d in docs))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
+
             # ================= CROSS ENCODER =================
             if self._ce is not None:
                 try:
                     pairs = [(query, d.page_content) for d in docs]
-                    scores = self._ce.predict(pairs)
+                    if self._batcher is not None:
+                        scores = self._batcher.predict(pairs)
+                    else:
+                        scores = self._ce.predict(pairs)
 
                     ranked = list(zip(docs, [float(s) for s in scores]))
                     ranked.sort(key=lambda x: x[1], reverse=True)
 
+                    self.cache.put(cache_key, ranked[:top_k])
                     return ranked[:top_k]
 
                 except Exception as e:
@@ -100,18 +175,13 @@ class Reranker:
                 if self._embedder is None:
                     raise ValueError("Embedder not initialized")
 
-                qv = self._embedder.embed_query(query)
-                dvs = self._embedder.embed_documents([d.page_content for d in docs])
-
-                def dot(a, b):
-                    try:
-                        return float(sum(x * y for x, y in zip(a, b)))
-                    except Exception:
-                        return 0.0
+                qv, dvs = self._fallback_vectors(query, docs, ctx)
+                scores = dvs @ qv
 
-                ranked = [(d, dot(qv, v)) for d, v in zip(docs, dvs)]
+                ranked = [(d, float(s)) for d, s in zip(docs, scores)]
                 ranked.sort(key=lambda x: x[1], reverse=True)
 
+                self.cache.put(cache_key, ranked[:top_k])
                 return ranked[:top_k]
 
             except Exception as e:
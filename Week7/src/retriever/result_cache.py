@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from src.utils.index_generation import GenerationWatcher
+
+
+# ================= CONFIG =================
+@dataclass
+class CacheConfig:
+    max_entries: int = 1024
+    ttl_seconds: float = 600.0
+    # how often the GENERATION file is stat'ed (results may be served for
+    # up to this long after an ingest bumps it)
+    generation_check_ms: float = 50.0
+
+
+# ================= KEYS =================
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def filters_key(filters: Optional[Dict[str, Any]]) -> Tuple:
+    if not filters:
+        return ()
+    return tuple(sorted((str(k), str(v).lower()) for k, v in filters.items() if v is not None))
+
+
+def _approx_bytes(value: Any) -> int:
+    # text payload of cached documents; Document objects are shared with the
+    # corpus, so this is an upper bound on what the cache itself keeps alive
+    docs: List[Document] = []
+    for item in value if isinstance(value, list) else []:
+        if isinstance(item, tuple) and item and isinstance(item[0], Document):
+            docs.append(item[0])
+        elif isinstance(item, Document):
+            docs.append(item)
+    return sys.getsizeof(value) + sum(sys.getsizeof(d.page_content) for d in docs)
+
+
+# ================= CACHE =================
+class ResultCache:
+    """
+    Thread-safe LRU + TTL cache for retrieval / rerank results.
+
+    Every lookup checks the index generation (see src.utils.index_generation,
+    stat'ed at most every generation_check_ms, outside the cache lock);
+    when ingestion has bumped it, the whole cache is dropped at once rather
+    than waiting for entries to expire.
+    """
+
+    def __init__(self, cfg: Optional[CacheConfig] = None, name: str = "cache"):
+        self.cfg = cfg or CacheConfig()
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Tuple[float, Any, int]]" = OrderedDict()
+        self._watcher = GenerationWatcher(check_interval_s=self.cfg.generation_check_ms / 1000.0)
+        self._generation = self._watcher.current()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.cfg.max_entries > 0 and self.cfg.ttl_seconds > 0
+
+    def _sync_generation(self, gen: int) -> bool:
+        """
+        Advance to gen (dropping everything) if it is newer. False when the
+        caller read the generation before a bump another thread has seen.
+        """
+        if gen > self._generation:
+            self._data.clear()
+            self._bytes = 0
+            self._generation = gen
+            self.invalidations += 1
+        return gen == self._generation
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+
+        gen = self._watcher.current()
+        with self._lock:
+            if not self._sync_generation(gen):
+                self.misses += 1
+                return None
+            full_key = (gen, key)
+
+            entry = self._data.get(full_key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value, size = entry
+            if expires_at < time.time():
+                del self._data[full_key]
+                self._bytes -= size
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(full_key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+
+        size = _approx_bytes(value)
+
+        gen = self._watcher.current()
+        with self._lock:
+            if not self._sync_generation(gen):
+                return    # computed against an index that is already replaced
+            full_key = (gen, key)
+
+            old = self._data.pop(full_key, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+            self._data[full_key] = (time.time() + self.cfg.ttl_seconds, value, size)
+            self._bytes += size
+
+            while len(self._data) > self.cfg.max_entries:
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "generation": self._generation,
+                "approx_bytes": self._bytes,
+            }
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from src.pipelines.ann_index import PARAMS_FILE, save_params
+from src.utils.file_lock import LOCK_FILE, file_lock
+
+
+VECTORSTORE_DIR = Path("src/vectorstore")
+
+SNAPSHOTS_DIR = "snapshots"
+CURRENT_FILE = "CURRENT"
+INFO_FILE = "snapshot.json"
+TOMBSTONES_FILE = "tombstones.npy"
+INDEX_FILES = ("index.faiss", "index.pkl")
+
+
+# ================= CONFIG =================
+@dataclass
+class SnapshotConfig:
+    keep: int = 3           # newest snapshots never collected
+    grace_s: float = 120.0  # older ones stay this long (a reader may still be loading)
+
+
+# ================= SNAPSHOT =================
+@dataclass
+class Snapshot:
+    """
+    One published index version. store_n / corpus_n / tombstones pin the
+    chunk store as it was at publish time, so a reader sees exactly the
+    chunks this FAISS index and BM25 corpus were built for. None when
+    published without a store (legacy import).
+    """
+    name: str
+    path: Path
+    created_at: float
+    store_n: Optional[int] = None
+    corpus_n: Optional[int] = None
+
+    @property
+    def pinned(self) -> bool:
+        return self.store_n is not None
+
+    def tombstones(self) -> np.ndarray:
+        p = self.path / TOMBSTONES_FILE
+        return np.load(p) if p.exists() else np.zeros(0, dtype=np.int64)
+
+
+def _root(vectorstore_dir: Path) -> Path:
+    return Path(vectorstore_dir) / SNAPSHOTS_DIR
+
+
+def list_snapshots(vectorstore_dir: Path = VECTORSTORE_DIR) -> List[str]:
+    root = _root(vectorstore_dir)
+    if not root.exists():
+        return []
+    return sorted(p.name for p in root.iterdir() if p.is_dir() and p.name.startswith("v"))
+
+
+def load_snapshot(vectorstore_dir: Path, name: str) -> Snapshot:
+    path = _root(vectorstore_dir) / name
+    info = json.loads((path / INFO_FILE).read_text(encoding="utf-8"))
+    return Snapshot(
+        name=name,
+        path=path,
+        created_at=float(info.get("created_at", 0.0)),
+        store_n=info.get("store_n"),
+        corpus_n=info.get("corpus_n"),
+    )
+
+
+def current_snapshot(vectorstore_dir: Path = VECTORSTORE_DIR) -> Optional[Snapshot]:
+    """The snapshot CURRENT points to; None for a pre-snapshot vectorstore."""
+    pointer = Path(vectorstore_dir) / CURRENT_FILE
+    if not pointer.exists():
+        return None
+    name = pointer.read_text(encoding="utf-8").strip()
+    try:
+        return load_snapshot(vectorstore_dir, name)
+    except (OSError, ValueError) as e:
+        print(f"[snapshots] CURRENT -> {name!r} is unreadable, using {vectorstore_dir}: {e}")
+        return None
+
+
+def current_name(vectorstore_dir: Path = VECTORSTORE_DIR) -> Optional[str]:
+    """Cheap check for a newer version (one small file read)."""
+    try:
+        return (Path(vectorstore_dir) / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def index_dir(vectorstore_dir: Path = VECTORSTORE_DIR) -> Path:
+    """Directory holding the index.faiss / index.pkl to load."""
+    snap = current_snapshot(vectorstore_dir)
+    return snap.path if snap is not None else Path(vectorstore_dir)
+
+
+# ================= WRITER LOCK =================
+_held = threading.local()
+
+
+@contextlib.contextmanager
+def writer_lock(vectorstore_dir: Path = VECTORSTORE_DIR) -> Iterator[None]:
+    """
+    Exclusive lock on a vectorstore across processes. Writers hold it from
+    loading the current index until their snapshot is published, so two
+    writers never build on the same snapshot (the later publish would drop
+    the other's vectors) and never pick the same snapshot name.
+    Re-entrant within a thread: publish_snapshot / gc_snapshots take it too.
+    """
+    key = str(Path(vectorstore_dir).resolve())
+    held = _held.__dict__.setdefault("paths", set())
+    if key in held:
+        yield
+        return
+    with file_lock(Path(vectorstore_dir) / LOCK_FILE):
+        held.add(key)
+        try:
+            yield
+        finally:
+            held.discard(key)
+
+
+# ================= PUBLISH =================
+def _link_or_copy(src: Path, dst: Path) -> None:
+    # snapshot files are never modified, so unchanged ones are shared
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _next_name(vectorstore_dir: Path) -> str:
+    names = list_snapshots(vectorstore_dir)
+    seq = int(names[-1][1:]) + 1 if names else 1
+    return f"v{seq:06d}"
+
+
+def publish_snapshot(
+    vectorstore_dir: Path = VECTORSTORE_DIR,
+    vs: Any = None,
+    store: Any = None,
+    params: Optional[Dict[str, Any]] = None,
+    cfg: Optional[SnapshotConfig] = None,
+) -> str:
+    """
+    Write a new snapshot and point CURRENT at it.
+
+      vs      LangChain FAISS store to save; None keeps the current index
+      store   ChunkStore to pin (n, corpus_n, tombstones); None keeps the
+              current snapshot's pin
+      params  index_params.json contents; None keeps the current ones
+
+    Everything is written to a staging directory that is renamed into
+    place, then CURRENT is swapped with os.replace: a reader sees either
+    the old snapshot or the complete new one, never a mix. Runs under
+    writer_lock; hold it yourself from loading the index you publish.
+    """
+    with writer_lock(vectorstore_dir):
+        return _publish(Path(vectorstore_dir), vs, store, params, cfg)
+
+
+def _publish(
+    vectorstore_dir: Path,
+    vs: Any,
+    store: Any,
+    params: Optional[Dict[str, Any]],
+    cfg: Optional[SnapshotConfig],
+) -> str:
+    root = _root(vectorstore_dir)
+    root.mkdir(parents=True, exist_ok=True)
+
+    prev = current_snapshot(vectorstore_dir)
+    prev_dir = prev.path if prev is not None else vectorstore_dir
+
+    name = _next_name(vectorstore_dir)
+    staging = root / f".staging-{name}"
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir()
+
+    # -------- FAISS --------
+    if vs is not None:
+        vs.save_local(str(staging))
+    else:
+        for fname in INDEX_FILES:
+            _link_or_copy(prev_dir / fname, staging / fname)
+
+    if params is not None:
+        save_params(params, staging)
+    elif (prev_dir / PARAMS_FILE).exists():
+        _link_or_copy(prev_dir / PARAMS_FILE, staging / PARAMS_FILE)
+
+    # -------- CHUNK STORE PIN --------
+    info: Dict[str, Any] = {"name": name, "created_at": time.time(), "store_n": None, "corpus_n": None}
+    if store is not None:
+        store.refresh()
+        np.save(staging / TOMBSTONES_FILE, np.asarray(store.tombstones, dtype=np.int64))
+        info.update(store_n=int(store.n), corpus_n=int(store.corpus_n))
+    elif prev is not None and prev.pinned:
+        if (prev.path / TOMBSTONES_FILE).exists():
+            _link_or_copy(prev.path / TOMBSTONES_FILE, staging / TOMBSTONES_FILE)
+        info.update(store_n=prev.store_n, corpus_n=prev.corpus_n)
+    (staging / INFO_FILE).write_text(json.dumps(info, indent=1), encoding="utf-8")
+
+    # -------- FLIP --------
+    os.replace(staging, root / name)
+    pointer = vectorstore_dir / CURRENT_FILE
+    tmp = pointer.with_name(pointer.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pointer)
+
+    print(f"[snapshots] published {name}" + (f" (store n={info['store_n']})" if info["store_n"] is not None else ""))
+    _gc(vectorstore_dir, cfg or SnapshotConfig())
+    return name
+
+
+# ================= GC =================
+def gc_snapshots(vectorstore_dir: Path = VECTORSTORE_DIR, cfg: Optional[SnapshotConfig] = None) -> int:
+    """
+    Remove snapshots beyond the newest cfg.keep once they are older than
+    cfg.grace_s, leftover staging dirs, and the pre-snapshot index files.
+    Loaded indexes live in memory, so serving processes are unaffected.
+    """
+    with writer_lock(vectorstore_dir):
+        return _gc(Path(vectorstore_dir), cfg or SnapshotConfig())
+
+
+def _gc(vectorstore_dir: Path, cfg: SnapshotConfig) -> int:
+    current = current_name(vectorstore_dir)
+    if current is None:
+        return 0
+
+    root = _root(vectorstore_dir)
+    now = time.time()
+    removed = 0
+
+    names = list_snapshots(vectorstore_dir)
+    for name in names[: max(0, len(names) - cfg.keep)]:
+        if name == current:
+            continue
+        path = root / name
+        if now - path.stat().st_mtime < cfg.grace_s:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+
+    # staging dirs of a crashed publish
+    for path in root.glob(".staging-*"):
+        if now - path.stat().st_mtime >= cfg.grace_s:
+            shutil.rmtree(path, ignore_errors=True)
+
+    # the in-place index from before snapshots; CURRENT supersedes it
+    for fname in (*INDEX_FILES, PARAMS_FILE):
+        legacy = vectorstore_dir / fname
+        if legacy.exists() and now - legacy.stat().st_mtime >= cfg.grace_s:
+            legacy.unlink()
+
+    if removed:
+        print(f"[snapshots] removed {removed} old snapshot(s)")
+    return removed
+
+
+# ================= CLI =================
+def main() -> None:
+    p = argparse.ArgumentParser(description="Vectorstore snapshots: list / gc / import")
+    p.add_argument("--vectorstore_dir", type=str, default=str(VECTORSTORE_DIR))
+    p.add_argument("--gc", action="store_true", help="remove old snapshots now")
+    p.add_argument("--keep", type=int, default=SnapshotConfig.keep)
+    p.add_argument("--grace_s", type=float, default=SnapshotConfig.grace_s)
+    p.add_argument("--import_legacy", action="store_true", help="publish the in-place index as the first snapshot")
+    args = p.parse_args()
+
+    vs_dir = Path(args.vectorstore_dir)
+    cfg = SnapshotConfig(keep=args.keep, grace_s=args.grace_s)
+
+    if args.import_legacy:
+        if current_name(vs_dir) is not None:
+            print("[snapshots] already using snapshots")
+        elif not (vs_dir / "index.faiss").exists():
+            print(f"[snapshots] no index in {vs_dir}")
+        else:
+            from src.retriever.chunk_store import STORE_DIR, ChunkStore
+
+            store = ChunkStore.open(STORE_DIR) if ChunkStore.exists(STORE_DIR) else None
+            publish_snapshot(vs_dir, store=store, cfg=cfg)
+
+    if args.gc:
+        gc_snapshots(vs_dir, cfg)
+
+    current = current_name(vs_dir)
+    for name in list_snapshots(vs_dir):
+        snap = load_snapshot(vs_dir, name)
+        mark = "*" if name == current else " "
+        print(
+            f"{mark} {name}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snap.created_at))}"
+            f"  store_n={snap.store_n} corpus_n={snap.corpus_n}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,656 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import uuid
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.file_lock import LOCK_FILE, file_lock
+
+# bumped when the on-disk layout changes; older files are rebuilt
+FORMAT_VERSION = 1
+
+# index_dir/CURRENT names the live version directory (index_dir/v000001, ...)
+CURRENT_FILE = "CURRENT"
+HEADER_FILE = "bm25.json"
+MAIN_ARRAYS = ("indptr", "doc_ids", "tfs")
+KEEP_VERSIONS = 2
+
+
+# ================= CONFIG =================
+@dataclass
+class SparseIndexConfig:
+    # Same defaults as rank_bm25.BM25Okapi so scores stay comparable
+    k1: float = 1.5
+    b: float = 0.75
+    epsilon: float = 0.25
+    # delta postings are folded into the CSR arrays once they exceed this
+    # fraction of the main postings
+    merge_ratio: float = 0.1
+
+
+# ================= INDEX =================
+class SparseBM25Index:
+    """
+    BM25 (Okapi) over an inverted index.
+
+    Postings are stored CSR-style:
+      indptr[t] : indptr[t + 1]  -> slice of doc_ids / tfs for term t
+    doc_ids inside one term are sorted, so candidate lookups are a searchsorted.
+
+    search() walks the query's posting lists from the highest score
+    upper bound down (MaxScore). Once the remaining terms can no longer
+    lift an unseen doc over the current k-th best score, the rest of the
+    lists are only probed for docs already in the candidate set.
+    """
+
+    def __init__(self, cfg: Optional[SparseIndexConfig] = None):
+        self.cfg = cfg or SparseIndexConfig()
+
+        self.vocab: Dict[str, int] = {}
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.tfs = np.zeros(0, dtype=np.float32)
+
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.df = np.zeros(0, dtype=np.int64)
+        self.max_tf = np.zeros(0, dtype=np.float32)
+        self.min_dl = np.zeros(0, dtype=np.float32)
+
+        self.idf = np.zeros(0, dtype=np.float64)
+        self.avgdl = 0.0
+
+        # postings added since the last merge: term id -> (doc ids, tfs)
+        self._delta: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._delta_size = 0
+
+        # main CSR arrays changed since the last save()
+        self._main_dirty = True
+        # corpus checksum recorded by save() (see corpus_fingerprint)
+        self.fingerprint = ""
+
+    # ================= BUILD =================
+    @classmethod
+    def from_tokenized(
+        cls,
+        corpus_tokens: Iterable[List[str]],
+        cfg: Optional[SparseIndexConfig] = None,
+    ) -> "SparseBM25Index":
+        idx = cls(cfg)
+        terms, docs, tfs, doc_len = idx._collect(corpus_tokens, start=0)
+        idx._build_postings(terms, docs, tfs, doc_len)
+        return idx
+
+    def _collect(
+        self,
+        corpus_tokens: Iterable[List[str]],
+        start: int,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # (term, doc, tf) triples + doc lengths; extends the vocab as it goes
+        term_col: List[int] = []
+        doc_col: List[int] = []
+        tf_col: List[int] = []
+        doc_len: List[int] = []
+
+        for doc_id, tokens in enumerate(corpus_tokens, start=start):
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                tid = self.vocab.setdefault(term, len(self.vocab))
+                term_col.append(tid)
+                doc_col.append(doc_id)
+                tf_col.append(tf)
+
+        return (
+            np.asarray(term_col, dtype=np.int64),
+            np.asarray(doc_col, dtype=np.int32),
+            np.asarray(tf_col, dtype=np.float32),
+            np.asarray(doc_len, dtype=np.float32),
+        )
+
+    def _build_postings(
+        self,
+        terms: np.ndarray,
+        docs: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+    ) -> None:
+        n_terms = len(self.vocab)
+
+        # sort by (term, doc) so every posting list is doc-ordered
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+
+        counts = np.bincount(terms, minlength=n_terms)
+        self.indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.indptr[1:])
+
+        self.doc_ids = docs.astype(np.int32, copy=False)
+        self.tfs = tfs.astype(np.float32, copy=False)
+        self.doc_len = doc_len
+        self.df = counts.astype(np.int64)
+
+        # per-term bounds used for the MaxScore upper bound
+        self.max_tf = np.zeros(n_terms, dtype=np.float32)
+        self.min_dl = np.zeros(n_terms, dtype=np.float32)
+        if len(terms):
+            starts = self.indptr[:-1][counts > 0]
+            self.max_tf[counts > 0] = np.maximum.reduceat(self.tfs, starts)
+            self.min_dl[counts > 0] = np.minimum.reduceat(self.doc_len[self.doc_ids], starts)
+
+        self._main_dirty = True
+        self._recompute_idf()
+
+    def _recompute_idf(self) -> None:
+        n_docs = len(self.doc_len)
+        self.avgdl = float(self.doc_len.sum() / n_docs) if n_docs else 0.0
+
+        if not len(self.df):
+            self.idf = np.zeros(0, dtype=np.float64)
+            return
+
+        df = self.df.astype(np.float64)
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+
+        # rank_bm25 floors negative idf at epsilon * average idf
+        eps = self.cfg.epsilon * float(idf.mean())
+        idf[idf < 0] = eps
+
+        self.idf = idf
+
+    # ================= INCREMENTAL =================
+    def add_documents(self, corpus_tokens: Iterable[List[str]]) -> List[int]:
+        """
+        Append docs without a rebuild. New postings go to a delta segment,
+        df / per-term bounds / idf are updated in place, so the cost follows
+        the new docs (plus an occasional merge). Returns the new doc ids.
+        """
+        start = self.n_docs
+        terms, docs, tfs, new_len = self._collect(corpus_tokens, start=start)
+        if not len(new_len):
+            return []
+
+        grow = len(self.vocab) - len(self.df)
+        if grow:
+            self.df = np.concatenate([self.df, np.zeros(grow, dtype=np.int64)])
+            self.max_tf = np.concatenate([self.max_tf, np.zeros(grow, dtype=np.float32)])
+            self.min_dl = np.concatenate([self.min_dl, np.full(grow, np.inf, dtype=np.float32)])
+
+        self.doc_len = np.concatenate([self.doc_len, new_len])
+
+        np.add.at(self.df, terms, 1)
+        np.maximum.at(self.max_tf, terms, tfs)
+        np.minimum.at(self.min_dl, terms, self.doc_len[docs])
+
+        self._add_delta(terms, docs, tfs)
+
+        if self._delta_size > self.cfg.merge_ratio * max(len(self.doc_ids), 1):
+            self.merge_delta()
+        else:
+            self._recompute_idf()
+
+        return list(range(start, self.n_docs))
+
+    def _add_delta(self, terms: np.ndarray, docs: np.ndarray, tfs: np.ndarray) -> None:
+        # group the new postings by term; doc ids are all past the main
+        # segment, so appending keeps every posting list doc-ordered
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        uniq, starts = np.unique(terms, return_index=True)
+        ends = np.append(starts[1:], len(terms))
+
+        for tid, lo, hi in zip(uniq.tolist(), starts, ends):
+            if tid in self._delta:
+                old_ids, old_tfs = self._delta[tid]
+                self._delta[tid] = (
+                    np.concatenate([old_ids, docs[lo:hi]]),
+                    np.concatenate([old_tfs, tfs[lo:hi]]),
+                )
+            else:
+                self._delta[tid] = (docs[lo:hi], tfs[lo:hi])
+
+        self._delta_size += len(terms)
+
+    def _delta_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if not self._delta:
+            return np.zeros(0, np.int64), np.zeros(0, np.int32), np.zeros(0, np.float32)
+        return (
+            np.concatenate([np.full(len(ids), tid, dtype=np.int64) for tid, (ids, _) in self._delta.items()]),
+            np.concatenate([ids for ids, _ in self._delta.values()]).astype(np.int32),
+            np.concatenate([tfs for _, tfs in self._delta.values()]).astype(np.float32),
+        )
+
+    def merge_delta(self) -> None:
+        """Fold the delta segment into the main CSR arrays."""
+        if not self._delta:
+            return
+
+        main_terms = np.repeat(
+            np.arange(len(self.indptr) - 1, dtype=np.int64), np.diff(self.indptr)
+        )
+        delta_terms, delta_docs, delta_tfs = self._delta_arrays()
+
+        self._delta = {}
+        self._delta_size = 0
+
+        self._build_postings(
+            np.concatenate([main_terms, delta_terms]),
+            np.concatenate([self.doc_ids, delta_docs]),
+            np.concatenate([self.tfs, delta_tfs]),
+            self.doc_len,
+        )
+
+    # ================= PERSISTENCE =================
+    def save(self, index_dir: Path, fingerprint: str = "", if_behind: bool = False) -> bool:
+        """
+        Write the index as .npy arrays + vocab.txt + bm25.json into a new
+        version directory, then point index_dir/CURRENT at it: readers see
+        either the old or the new index, never a mix. The (large) main
+        postings are only rewritten after a merge; otherwise the previous
+        version's files are hard-linked. Writers serialize on
+        index_dir/write.lock; with if_behind, nothing is written when the
+        saved version already covers as many docs. True if saved.
+        """
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        with file_lock(index_dir / LOCK_FILE):
+            if if_behind and _saved_n_docs(index_dir) >= self.n_docs:
+                return False
+            self._save_locked(index_dir, fingerprint)
+        return True
+
+    def _save_locked(self, index_dir: Path, fingerprint: str) -> None:
+        prev = _version_dir(index_dir)
+
+        name = _next_version(index_dir)
+        # unique per writer: a crashed writer's leftovers never collide
+        staging = index_dir / f".staging-{name}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        staging.mkdir()
+
+        arrays = {
+            "doc_len": self.doc_len,
+            "df": self.df,
+            "max_tf": self.max_tf,
+            "min_dl": self.min_dl,
+            "idf": self.idf,
+        }
+        d_terms, d_docs, d_tfs = self._delta_arrays()
+        arrays.update({"delta_terms": d_terms, "delta_docs": d_docs, "delta_tfs": d_tfs})
+        if self._main_dirty or prev is None or not (prev / "doc_ids.npy").exists():
+            arrays.update({"indptr": self.indptr, "doc_ids": self.doc_ids, "tfs": self.tfs})
+        else:
+            for main in MAIN_ARRAYS:
+                _link_or_copy(prev / f"{main}.npy", staging / f"{main}.npy")
+
+        for arr_name, arr in arrays.items():
+            np.save(staging / f"{arr_name}.npy", np.asarray(arr))
+
+        terms = sorted(self.vocab, key=self.vocab.get)
+        (staging / "vocab.txt").write_text("\n".join(terms), encoding="utf-8")
+
+        header = {
+            "format": FORMAT_VERSION,
+            "n_docs": self.n_docs,
+            "n_terms": len(self.vocab),
+            "n_postings": int(len(self.doc_ids)),
+            "avgdl": self.avgdl,
+            "k1": self.cfg.k1,
+            "b": self.cfg.b,
+            "epsilon": self.cfg.epsilon,
+            "fingerprint": fingerprint,
+        }
+        (staging / HEADER_FILE).write_text(json.dumps(header), encoding="utf-8")
+
+        os.replace(staging, index_dir / name)
+        _write_atomic(index_dir / CURRENT_FILE, name)
+        self.fingerprint = fingerprint
+        self._main_dirty = False
+
+        _gc_versions(index_dir, name)
+
+    @classmethod
+    def load(
+        cls,
+        index_dir: Path,
+        cfg: Optional[SparseIndexConfig] = None,
+    ) -> Optional["SparseBM25Index"]:
+        """
+        Load the saved index CURRENT points to; the main postings stay
+        memory-mapped. None if missing, from another format or unreadable.
+        """
+        index_dir = _version_dir(Path(index_dir))
+        if index_dir is None or not (index_dir / HEADER_FILE).exists():
+            return None
+        try:
+            header = json.loads((index_dir / HEADER_FILE).read_text(encoding="utf-8"))
+            if header.get("format") != FORMAT_VERSION:
+                return None
+
+            idx = cls(cfg)
+            text = (index_dir / "vocab.txt").read_text(encoding="utf-8")
+            terms = text.split("\n") if text else []
+            idx.vocab = dict(zip(terms, range(len(terms))))
+
+            def arr(name, mmap=False):
+                return np.load(index_dir / f"{name}.npy", mmap_mode="r" if mmap else None)
+
+            idx.indptr = arr("indptr", mmap=True)
+            idx.doc_ids = arr("doc_ids", mmap=True)
+            idx.tfs = arr("tfs", mmap=True)
+            # per-term / per-doc stats are updated in place by add_documents
+            idx.doc_len = arr("doc_len")
+            idx.df = arr("df")
+            idx.max_tf = arr("max_tf")
+            idx.min_dl = arr("min_dl")
+            idx.idf = arr("idf")
+            idx._add_delta(arr("delta_terms"), arr("delta_docs"), arr("delta_tfs"))
+        except (OSError, ValueError, KeyError) as e:
+            print("[bm25] persisted index unreadable, rebuilding:", e)
+            return None
+
+        # arrays that do not match their header -> treat as missing
+        ok = (
+            idx.n_docs == header["n_docs"]
+            and len(idx.vocab) == header["n_terms"] == len(idx.df)
+            and len(idx.doc_ids) == header["n_postings"]
+            and len(idx.indptr) <= len(idx.vocab) + 1
+        )
+        if not ok:
+            print("[bm25] persisted index inconsistent, rebuilding")
+            return None
+
+        idx.fingerprint = header.get("fingerprint", "")
+        idx._main_dirty = False
+        if (header["k1"], header["b"], header["epsilon"]) == (idx.cfg.k1, idx.cfg.b, idx.cfg.epsilon):
+            idx.avgdl = float(header["avgdl"])
+        else:
+            idx._recompute_idf()
+        return idx
+
+    # ================= PROPS =================
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_len)
+
+    def _postings(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        if tid + 1 < len(self.indptr):
+            lo, hi = self.indptr[tid], self.indptr[tid + 1]
+            ids, tfs = self.doc_ids[lo:hi], self.tfs[lo:hi]
+        else:
+            ids, tfs = self.doc_ids[:0], self.tfs[:0]
+
+        if tid in self._delta:
+            d_ids, d_tfs = self._delta[tid]
+            ids, tfs = np.concatenate([ids, d_ids]), np.concatenate([tfs, d_tfs])
+
+        return ids, tfs
+
+    def _tf_weight(self, tf: np.ndarray, dl: np.ndarray) -> np.ndarray:
+        k1, b = self.cfg.k1, self.cfg.b
+        avgdl = self.avgdl or 1.0
+        return tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+
+    def _query_terms(self, query_tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        # repeated query tokens count multiple times, like BM25Okapi.get_scores
+        counts = Counter(t for t in query_tokens if t in self.vocab)
+        tids = np.asarray([self.vocab[t] for t in counts], dtype=np.int64)
+        qtf = np.asarray(list(counts.values()), dtype=np.float32)
+        return tids, qtf
+
+    def _term_weights(
+        self,
+        tid: int,
+        mask: Optional[np.ndarray],
+        cache: Optional[Dict[int, Tuple[np.ndarray, np.ndarray]]],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # (doc ids, tf weight) of one posting list after the mask
+        if cache is not None and tid in cache:
+            return cache[tid]
+
+        ids, tf = self._postings(tid)
+        if mask is not None:
+            keep = mask[ids]
+            ids, tf = ids[keep], tf[keep]
+
+        out = (ids, self._tf_weight(tf, self.doc_len[ids]))
+        if cache is not None:
+            cache[tid] = out
+        return out
+
+    # ================= SEARCH =================
+    def search(
+        self,
+        query_tokens: List[str],
+        k: int,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k (doc_id, score) pairs, best first.
+        Only docs sharing at least one term with the query are returned.
+        mask: optional bool array over doc ids; False docs are skipped.
+        """
+        return self._search(query_tokens, k, mask, None)
+
+    def search_batch(
+        self,
+        queries_tokens: List[List[str]],
+        k: int,
+        mask: Optional[np.ndarray] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        search() for many queries; a posting list shared by several
+        queries is masked and weighted only once.
+        """
+        cache: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        return [self._search(q, k, mask, cache) for q in queries_tokens]
+
+    def _search(
+        self,
+        query_tokens: List[str],
+        k: int,
+        mask: Optional[np.ndarray],
+        cache: Optional[Dict[int, Tuple[np.ndarray, np.ndarray]]],
+    ) -> List[Tuple[int, float]]:
+        if k <= 0 or not self.n_docs:
+            return []
+
+        tids, qtf = self._query_terms(query_tokens)
+        if not len(tids):
+            return []
+
+        idf = self.idf[tids] * qtf
+        ub = idf * self._tf_weight(self.max_tf[tids], self.min_dl[tids])
+
+        # pruning is only safe when every contribution is non-negative
+        can_prune = bool((idf > 0).all())
+
+        order = np.argsort(-ub, kind="stable")
+        remaining = float(ub.sum())
+
+        cand_ids = np.zeros(0, dtype=np.int32)
+        cand_scores = np.zeros(0, dtype=np.float64)
+        essential = True
+
+        for j in order:
+            remaining -= float(ub[j])
+
+            if essential:
+                ids, w = self._term_weights(int(tids[j]), mask, cache)
+                contrib = idf[j] * w
+
+                all_ids = np.concatenate([cand_ids, ids])
+                all_sc = np.concatenate([cand_scores, contrib])
+                cand_ids, inv = np.unique(all_ids, return_inverse=True)
+                cand_scores = np.bincount(inv, weights=all_sc, minlength=len(cand_ids))
+
+            elif len(cand_ids):
+                # non-essential term: only probe docs already in the candidate set
+                ids, tf = self._postings(int(tids[j]))
+                loc = np.searchsorted(ids, cand_ids)
+                loc[loc >= len(ids)] = len(ids) - 1
+                hit = ids[loc] == cand_ids
+                if hit.any():
+                    pos = loc[hit]
+                    cand_scores[hit] += idf[j] * self._tf_weight(
+                        tf[pos], self.doc_len[ids[pos]]
+                    )
+
+            if not can_prune or len(cand_ids) < k:
+                continue
+
+            theta = float(np.partition(cand_scores, len(cand_scores) - k)[len(cand_scores) - k])
+
+            # small slack so float rounding never prunes a true top-k doc
+            bound = remaining + 1e-6
+
+            if bound < theta:
+                essential = False
+
+            if not essential:
+                alive = cand_scores + bound >= theta
+                cand_ids, cand_scores = cand_ids[alive], cand_scores[alive]
+
+        return self._top_k(cand_ids, cand_scores, k)
+
+    @staticmethod
+    def _top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if not len(ids):
+            return []
+
+        if len(ids) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[part], scores[part]
+
+        # best score first, ties broken by corpus order
+        order = np.lexsort((ids, -scores))
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+# ================= HELPERS =================
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    # version files are never modified, so unchanged ones are shared
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _versions(index_dir: Path) -> List[str]:
+    return sorted(p.name for p in index_dir.iterdir() if p.is_dir() and p.name.startswith("v"))
+
+
+def _next_version(index_dir: Path) -> str:
+    names = _versions(index_dir)
+    return f"v{int(names[-1][1:]) + 1:06d}" if names else "v000001"
+
+
+def _version_dir(index_dir: Path) -> Optional[Path]:
+    """Directory of the live version; index_dir itself for the older flat layout."""
+    try:
+        name = (index_dir / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return index_dir if (index_dir / HEADER_FILE).exists() else None
+    return index_dir / name
+
+
+def _saved_n_docs(index_dir: Path) -> int:
+    version = _version_dir(index_dir)
+    try:
+        return int(json.loads((version / HEADER_FILE).read_text(encoding="utf-8"))["n_docs"])
+    except (TypeError, OSError, ValueError, KeyError):
+        return 0
+
+
+def _gc_versions(index_dir: Path, current: str) -> None:
+    """
+    Drop all but the newest KEEP_VERSIONS versions, crashed staging dirs
+    and flat-layout files. Called with the write lock held, so any staging
+    dir left is from a writer that died mid-save. Loaded indexes keep their
+    memory-mapped files (unlinked files stay readable), so serving
+    processes are unaffected.
+    """
+    names = _versions(index_dir)
+    for name in names[: max(0, len(names) - KEEP_VERSIONS)]:
+        if name != current:
+            shutil.rmtree(index_dir / name, ignore_errors=True)
+    for path in index_dir.glob(".staging-*"):
+        shutil.rmtree(path, ignore_errors=True)
+    for path in [*index_dir.glob("*.npy"), index_dir / "vocab.txt", index_dir / HEADER_FILE]:
+        if path.is_file():
+            path.unlink()
+
+
+# ================= CORPUS INDEX =================
+def corpus_fingerprint(store, n_docs: int) -> str:
+    """Checksum of the first n_docs corpus rows (chunk ids + content keys)."""
+    cids = np.asarray(store.corpus[:n_docs], dtype=np.int64)
+    keys = np.asarray(store.column("key"))[cids]
+    return f"{zlib.crc32(cids.tobytes()):08x}{zlib.crc32(keys.tobytes()):08x}"
+
+
+def load_corpus_index(
+    store,
+    tokenize: Callable[[str], List[str]],
+    index_dir: Optional[Path] = None,
+    cfg: Optional[SparseIndexConfig] = None,
+    save: bool = True,
+    corpus_n: Optional[int] = None,
+) -> SparseBM25Index:
+    """
+    BM25 over a ChunkStore's keyword corpus, persisted under store/bm25.
+    Loads the saved index and tokenizes only corpus rows added since it
+    was written (all rows the first time); saves if anything changed and
+    no other writer saved a larger index meanwhile. Serving processes pass
+    save=False and leave persisting to the writers.
+    corpus_n limits it to the first rows (a snapshot's corpus); a saved
+    index that is already past them is not used or overwritten.
+    """
+    index_dir = Path(index_dir or Path(store.root) / "bm25")
+    limit = store.corpus_n if corpus_n is None else min(int(corpus_n), store.corpus_n)
+
+    idx = SparseBM25Index.load(index_dir, cfg)
+    if idx is not None and idx.n_docs > limit and limit < store.corpus_n:
+        # a writer has moved on since the snapshot; rebuild its prefix
+        idx, save = None, False
+    elif idx is not None and (
+        idx.n_docs > limit or idx.fingerprint != corpus_fingerprint(store, idx.n_docs)
+    ):
+        print("[bm25] persisted index does not match the chunk store, rebuilding")
+        idx = None
+
+    start = idx.n_docs if idx is not None else 0
+    tail = np.asarray(store.corpus[start:limit], dtype=np.int64).tolist()
+    if idx is not None and not tail:
+        return idx
+
+    # the corpus can repeat chunks; tokenize each chunk once
+    tokens_of: Dict[int, List[str]] = {}
+    tokens = []
+    for cid in tail:
+        if cid not in tokens_of:
+            tokens_of[cid] = tokenize(store.text(cid))
+        tokens.append(tokens_of[cid])
+
+    if idx is None:
+        idx = SparseBM25Index.from_tokenized(tokens, cfg)
+    else:
+        idx.add_documents(tokens)
+
+    if save:
+        try:
+            idx.save(index_dir, corpus_fingerprint(store, idx.n_docs), if_behind=True)
+        except OSError as e:
+            print("[bm25] could not persist index:", e)
+    return idx
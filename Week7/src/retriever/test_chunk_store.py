@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.retriever.chunk_store import TEXT_FILE, ChunkStore, ChunkStoreDocstore
+
+
+def _docs(n: int, start: int = 0):
+    return [
+        Document(
+            page_content=f"chunk {i} — ünïcode text " * (1 + i % 3),
+            metadata={"source": f"doc{i % 4}.pdf", "page": i, "tags": ["rag"], "uploaded_at": 1700000000.5 + i},
+        )
+        for i in range(start, start + n)
+    ]
+
+
+def test_round_trip(tmp_path):
+    store = ChunkStore.create(tmp_path / "store")
+    docs = _docs(5)
+    assert store.append(docs) == [0, 1, 2, 3, 4]
+    assert [d.id for d in docs] == ["0", "1", "2", "3", "4"]
+    assert store.append(_docs(3, start=5)) == [5, 6, 7]
+
+    reopened = ChunkStore(tmp_path / "store")
+    assert len(reopened) == 8
+    for cid, doc in enumerate(_docs(8)):
+        got = reopened.document(cid)
+        assert got.id == str(cid)
+        assert got.page_content == doc.page_content
+        assert got.metadata == doc.metadata
+    assert reopened.column("page").tolist() == list(range(8))
+    assert reopened.column("text_offsets")[-1] == (tmp_path / "store" / TEXT_FILE).stat().st_size
+
+
+def test_corpus_and_tombstones(tmp_path):
+    store = ChunkStore.create(tmp_path / "store")
+    store.append(_docs(6))
+    store.extend_corpus([0, 1, 2])
+    store.extend_corpus([2, 5])
+    assert store.corpus_n == 5
+    assert np.asarray(store.corpus).tolist() == [0, 1, 2, 2, 5]
+
+    assert store.live_mask() is None
+    assert store.tombstone([1, 4, 4, 99]) == 2     # out of range ignored
+    assert store.tombstone([1]) == 0               # already dead
+    assert store.live_mask().tolist() == [True, False, True, True, False, True]
+    assert store.live_mask(3).tolist() == [True, False, True]
+
+
+def test_other_instance_sees_commits(tmp_path):
+    writer = ChunkStore.create(tmp_path / "store")
+    reader = ChunkStore(tmp_path / "store")
+    assert not reader.refresh()
+
+    writer.append(_docs(2))
+    writer.tombstone([0])
+    assert reader.refresh()
+    assert len(reader) == 2 and reader.tombstones.tolist() == [0]
+
+    # the reader appends after the writer's rows, not over them
+    assert reader.append(_docs(1, start=2)) == [2]
+    writer.refresh()
+    assert writer.document(2).page_content == _docs(1, start=2)[0].page_content
+
+
+def test_uncommitted_tail_is_dropped(tmp_path):
+    store = ChunkStore.create(tmp_path / "store")
+    store.append(_docs(2))
+
+    # a crashed append: bytes past the committed rows, header untouched
+    with (tmp_path / "store" / TEXT_FILE).open("ab") as f:
+        f.write(b"garbage from a killed writer")
+
+    store.append(_docs(1, start=2))
+    fresh = ChunkStore(tmp_path / "store")
+    assert [fresh.text(c) for c in range(3)] == [d.page_content for d in _docs(3)]
+
+
+def test_docstore_delete_tombstones(tmp_path):
+    store = ChunkStore.create(tmp_path / "store")
+    store.append(_docs(3))
+    docstore = ChunkStoreDocstore(tmp_path / "store")
+
+    docstore.delete(["1", "7", "x"])               # unknown ids are ignored
+    assert store.tombstones.tolist() == [1]
+    assert docstore.search("1").page_content == _docs(2)[1].page_content   # still readable
+
+
+def test_compact_keeps_cids_and_drops_dead_bytes(tmp_path):
+    store = ChunkStore.create(tmp_path / "store")
+    docs = _docs(8)
+    store.append(docs)
+    store.extend_corpus(list(range(8)))
+    reader = ChunkStore(tmp_path / "store")
+    store.tombstone([1, 2, 5])
+
+    dead = store.dead_bytes()
+    size = store.size_bytes()
+    assert store.compact() == dead > 0
+    assert store.epoch == 1 and store.size_bytes() == size - dead
+    assert store.compact() == 0                    # nothing left to reclaim
+
+    # cids, corpus and tombstones are untouched; dead rows read as empty
+    for cid, doc in enumerate(docs):
+        got = store.document(cid)
+        if cid in (1, 2, 5):
+            assert got.page_content == "" and got.metadata == {}
+        else:
+            assert (got.page_content, got.metadata) == (doc.page_content, doc.metadata)
+    assert np.asarray(store.corpus).tolist() == list(range(8))
+    assert store.tombstones.tolist() == [1, 2, 5]
+
+    # another instance keeps its old maps until it refreshes
+    assert reader.text(1) == docs[1].page_content
+    assert reader.refresh() and reader.epoch == 1 and reader.text(1) == ""
+
+    # appends go to the new epoch's files
+    assert store.append(_docs(1, start=8)) == [8]
+    assert ChunkStore(tmp_path / "store").text(8) == _docs(1, start=8)[0].page_content
+
+
+def test_compact_drops_files_two_epochs_old(tmp_path):
+    root = tmp_path / "store"
+    store = ChunkStore.create(root)
+    store.append(_docs(6))
+    store.tombstone([0])
+    store.compact()
+    assert (root / TEXT_FILE).exists()             # epoch 0 kept: readers may still open it
+
+    store.tombstone([3])
+    store.compact()
+    assert store.epoch == 2
+    assert not (root / TEXT_FILE).exists()
+    assert (root / "text.1.bin").exists() and (root / "text.2.bin").exists()
+    assert [ChunkStore(root).text(c) for c in (2, 3)] == [_docs(3)[2].page_content, ""]
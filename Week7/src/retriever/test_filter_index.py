@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import threading
+
+import numpy as np
+
+from src.retriever.filter_index import MetadataFilterIndex
+
+METADATAS = [
+    {"source": "report_2021.pdf", "type": "pdf", "tags": ["finance", "rag"]},
+    {"source": "report_2022.pdf", "type": "pdf", "tags": ["finance"]},
+    {"source": "leave_policy.txt", "tags": ["hr", "policy"], "year": 2023},
+    {"source": "notes.md", "type": "md", "tags": [], "team": "Search"},
+    {"source": "policy_2022.docx", "tags": ["uploaded"]},
+]
+
+
+def _ids(mask):
+    return np.flatnonzero(mask).tolist()
+
+
+def test_field_semantics():
+    ix = MetadataFilterIndex(METADATAS)
+    assert ix.mask(None) is None
+    assert ix.mask({"year": None}) is None
+
+    assert _ids(ix.mask({"year": "2022"})) == [1, 4]        # from the source name
+    assert _ids(ix.mask({"year": 2023})) == [2]             # metadata wins
+    assert _ids(ix.mask({"type": "PDF"})) == [0, 1]
+    assert _ids(ix.mask({"type": "policy"})) == [2, 4]      # untyped: tag / source match
+    assert _ids(ix.mask({"tags": "finance"})) == [0, 1]
+    assert _ids(ix.mask({"team": "search"})) == [3]         # generic field
+    assert _ids(ix.mask({"tags": "finance", "year": "2021"})) == [0]
+    assert _ids(ix.mask({"tags": "nope"})) == []
+
+
+def test_add_invalidates_cached_masks():
+    ix = MetadataFilterIndex(METADATAS)
+    assert _ids(ix.mask({"tags": "finance"})) == [0, 1]
+    assert _ids(ix.mask({"team": "search"})) == [3]
+
+    ix.add([{"source": "q3_2024.pdf", "type": "pdf", "tags": ["finance"], "team": "search"}])
+    assert ix.n == 6
+    assert _ids(ix.mask({"tags": "finance"})) == [0, 1, 5]
+    assert _ids(ix.mask({"team": "search"})) == [3, 5]
+    assert len(ix.mask({"type": "pdf"})) == 6
+
+
+def test_lru_bounded_under_concurrency():
+    metadatas = [{"source": f"f{i % 40}.pdf", "tags": [f"t{i % 9}"], "year": 2000 + i % 13} for i in range(2000)]
+    ix = MetadataFilterIndex(metadatas, cache_size=8)
+    errors = []
+
+    def run(seed: int) -> None:
+        rng = np.random.default_rng(seed)
+        try:
+            for _ in range(500):
+                year, tag = 2000 + int(rng.integers(13)), f"t{int(rng.integers(9))}"
+                m = ix.mask({"year": year, "tags": tag})
+                assert all(metadatas[i]["year"] == year and tag in metadatas[i]["tags"] for i in np.flatnonzero(m))
+        except Exception as e:  # surfaced below; pytest does not see thread errors
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(s,)) for s in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(ix._mask_cache) <= 8
+
+
+def test_streamed_build_with_rescan():
+    scans = []
+
+    def rescan():
+        scans.append(1)
+        return iter(METADATAS + [{"team": "late"}])     # rows past n are ignored
+
+    ix = MetadataFilterIndex(iter(METADATAS), rescan=rescan)
+    assert ix.n == len(METADATAS) and not hasattr(ix, "_metadatas")
+    assert "team" not in ix._fields                   # generic keys wait for first use
+    assert _ids(ix.mask({"type": "pdf"})) == [0, 1]
+
+    assert _ids(ix.mask({"team": "search"})) == [3]
+    assert _ids(ix.mask({"team": "late"})) == []
+    assert len(scans) == 1                            # built once, then kept
+
+    # already-built generic fields are extended in place, no rescan
+    ix.add([{"source": "x.md", "team": "search"}])
+    assert _ids(ix.mask({"team": "search"})) == [3, 5]
+    assert _ids(ix.mask({"source": "x.md"})) == [5]
+    assert len(scans) == 1
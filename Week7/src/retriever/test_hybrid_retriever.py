@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from src.evaluation.benchmark import HashingEmbedder
+from src.retriever.chunk_store import ChunkStore, ChunkStoreDocstore
+from src.retriever.hybrid_retriever import HybridRetriever, HybridRetrieverConfig, _mmr_select
+from src.retriever.query_context import QueryContext, _doc_key
+from src.retriever.snapshots import load_snapshot, publish_snapshot
+
+TOPICS = {
+    "finance": "revenue profit quarterly earnings budget invoice",
+    "hr": "leave policy employee onboarding payroll holiday",
+    "search": "retrieval index vector keyword ranking query",
+    "legal": "contract clause liability compliance audit",
+}
+
+
+def _corpus(n: int = 80):
+    docs = []
+    names = list(TOPICS)
+    for i in range(n):
+        topic = names[i % len(names)]
+        words = TOPICS[topic].split()
+        text = " ".join(words[(i + j) % len(words)] for j in range(12)) + f" note{i}"
+        docs.append(Document(page_content=text, metadata={"source": f"{topic}_{2020 + i % 3}.txt", "type": "txt"}))
+    return docs
+
+
+@pytest.fixture
+def built(tmp_path, monkeypatch):
+    """A published snapshot over a small store (hashing embedder, flat FAISS)."""
+    monkeypatch.chdir(tmp_path)     # result-cache generation file
+    store_dir, vs_dir = tmp_path / "store", tmp_path / "vectorstore"
+    store = ChunkStore.create(store_dir)
+    docs = _corpus()
+    cids = store.append(docs)
+    store.extend_corpus(cids)
+
+    embedder = HashingEmbedder(64)
+    vectors = embedder.embed_documents([d.page_content for d in docs])
+    vs = FAISS.from_embeddings(
+        list(zip([d.page_content for d in docs], vectors.tolist())),
+        embedder.langchain_embeddings,
+        metadatas=[d.metadata for d in docs],
+        ids=[str(c) for c in cids],
+        docstore=ChunkStoreDocstore(store_dir),
+    )
+    publish_snapshot(vs_dir, vs, store=store)
+
+    def make(**cfg) -> HybridRetriever:
+        cfg.setdefault("cache_max_entries", 0)
+        return HybridRetriever(
+            HybridRetrieverConfig(**cfg),
+            vectorstore_dir=vs_dir,
+            chunks_jsonl=tmp_path / "chunks.jsonl",
+            store_dir=store_dir,
+            embedder=embedder,
+        )
+
+    return make
+
+
+def _keys(docs):
+    return [_doc_key(d) for d in docs]
+
+
+def _run_writer(retriever: HybridRetriever, timeout: float = 5.0) -> bool:
+    """remove_chunks in a thread; False if it is still blocked on the read lock."""
+    t = threading.Thread(target=retriever.remove_chunks, args=([0],), daemon=True)
+    t.start()
+    t.join(timeout)
+    return not t.is_alive()
+
+
+# ================= PARALLEL LEGS =================
+def test_parallel_legs_match_sequential(built):
+    seq, par = built(parallel_legs=False), built()
+    for q in ["leave policy", "quarterly revenue", "vector retrieval index"]:
+        for filters in (None, {"year": "2021"}):
+            assert _keys(par.retrieve_candidates(q, 5, filters)) == _keys(seq.retrieve_candidates(q, 5, filters))
+
+
+def test_raising_leg_degrades_and_releases_the_lock(built):
+    r = built()
+
+    def boom(*a, **k):
+        raise RuntimeError("postings unreadable")
+
+    r.sparse.search_batch = boom
+    docs = r.retrieve_candidates("leave policy", 5)
+    assert docs                             # vector leg still answers
+    assert _run_writer(r)
+
+
+def test_failed_submit_releases_the_lock(built, monkeypatch):
+    r = built()
+
+    def bad_masks(filters):
+        raise ValueError("bad filter")
+
+    monkeypatch.setattr(r, "_masks", bad_masks)
+    with pytest.raises(ValueError):
+        r.retrieve_candidates("leave policy", 5, {"year": "2021"})
+    assert _run_writer(r)
+
+
+def test_slow_leg_is_dropped_after_its_budget(built):
+    r = built(keyword_timeout_s=0.05, vector_timeout_s=2.0)
+    search = r.sparse.search_batch
+    r.sparse.search_batch = lambda *a, **k: (time.sleep(0.5), search(*a, **k))[1]
+
+    t0 = time.perf_counter()
+    docs = r.retrieve_candidates("leave policy", 5)
+    assert time.perf_counter() - t0 < 0.4
+    assert docs
+    assert r.leg_counters() == {"vector_timeouts": 0, "keyword_timeouts": 1, "degraded": 1}
+    # the straggler still holds the read lock; the writer waits for it, then runs
+    assert _run_writer(r)
+
+
+def test_queue_wait_does_not_count_against_the_budget(built):
+    r = built(leg_workers=2, keyword_timeout_s=0.5, vector_timeout_s=0.5)
+    search = r.sparse.search_batch
+    r.sparse.search_batch = lambda *a, **k: (time.sleep(0.3), search(*a, **k))[1]
+
+    threads = [threading.Thread(target=r.retrieve_candidates, args=(f"leave policy {i}", 5)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert r.leg_counters()["degraded"] == 0
+
+
+def test_both_legs_stuck_is_capped(built):
+    r = built(keyword_timeout_s=0.05, vector_timeout_s=0.05, legs_max_wait_s=0.3)
+    search, faiss_search = r.sparse.search_batch, r._faiss_search
+    r.sparse.search_batch = lambda *a, **k: (time.sleep(1.0), search(*a, **k))[1]
+    r._faiss_search = lambda *a, **k: (time.sleep(1.0), faiss_search(*a, **k))[1]
+
+    t0 = time.perf_counter()
+    assert r.retrieve_candidates("leave policy", 5) == []
+    assert time.perf_counter() - t0 < 0.8
+    assert r.leg_counters()["degraded"] == 1
+
+
+
+# ================= BATCH =================
+QUERIES = ["leave policy", "quarterly revenue", "vector retrieval index", "leave policy", "contract audit"]
+
+
+@pytest.mark.parametrize("filters", [None, {"year": "2021"}, {"type": "txt"}])
+def test_batch_matches_single(built, filters):
+    r = built()
+    batch = r.retrieve_candidates_batch(QUERIES, 5, filters)
+    assert len(batch) == len(QUERIES)
+    for q, docs in zip(QUERIES, batch):
+        assert _keys(docs) == _keys(r.retrieve_candidates(q, 5, filters))
+    assert r.retrieve_candidates_batch([], 5) == []
+
+
+def test_batch_fills_contexts_and_cache(built):
+    r = built(cache_max_entries=64)
+    ctxs = [QueryContext(query=q) for q in QUERIES]
+    first = r.retrieve_candidates_batch(QUERIES, 5, contexts=ctxs)
+    assert all(c.vector is not None for c in ctxs)
+    assert [_keys(d) for d in r.retrieve_candidates_batch(QUERIES, 5)] == [_keys(d) for d in first]
+    assert r.cache.stats()["hits"] == len(QUERIES)
+
+
+
+# ================= IN-PLACE UPDATES =================
+def test_add_chunks_under_concurrent_reads(built):
+    r = built()
+    errors, stop = [], threading.Event()
+
+    def reader() -> None:
+        while not stop.is_set():
+            try:
+                for docs in r.retrieve_candidates_batch(["leave policy", "zebra giraffe"], 5, {"type": "txt"}):
+                    assert all(d.page_content for d in docs)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for t in readers:
+        t.start()
+    try:
+        for i in range(5):
+            doc = Document(page_content=f"zebra giraffe savanna batch{i}", metadata={"source": "zoo_2024.txt", "type": "txt"})
+            assert r.add_chunks([doc]) == 1
+    finally:
+        stop.set()
+        for t in readers:
+            t.join()
+
+    assert errors == []
+    n = r.store.n
+    assert r.vs.index.ntotal == len(r.faiss_cids) == n
+    assert r.filter.n == n and len(r.corpus_cids) == n
+    hits = r.retrieve_candidates("zebra giraffe", 5, {"year": "2024"})
+    assert sorted(d.page_content for d in hits) == sorted(f"zebra giraffe savanna batch{i}" for i in range(5))
+
+
+def test_removed_chunks_are_masked(built):
+    r = built()
+    top = r.retrieve_candidates("leave policy", 5)
+    gone = int(top[0].id)
+    assert r.remove_chunks([gone]) == 1
+    assert gone not in {int(d.id) for d in r.retrieve_candidates("leave policy", 20)}
+
+
+
+def _publish_job(tmp_path, texts, corpus=True):
+    """What an ingest job does to the shared store + vectorstore; returns (cids, snapshot)."""
+    store = ChunkStore(tmp_path / "store")
+    cids = store.append([Document(page_content=t, metadata={"source": "job.txt"}) for t in texts])
+    if corpus:
+        store.extend_corpus(cids)
+    name = publish_snapshot(tmp_path / "vectorstore", None, store=store)
+    return cids, load_snapshot(tmp_path / "vectorstore", name)
+
+
+def test_can_catch_up_only_with_the_jobs_own_chunks(built, tmp_path):
+    r = built()
+    cids, snap = _publish_job(tmp_path, ["job chunk one", "job chunk two"])
+    assert r.can_catch_up(snap, cids)
+
+    # a CLI run published its own chunks in between: add_chunks(cids) would miss them
+    _publish_job(tmp_path, ["cli chunk"])
+    job, snap = _publish_job(tmp_path, ["second job chunk"])
+    assert not r.can_catch_up(snap, cids + job)
+
+    # rows of a failed run (tombstoned, never in the corpus) are no obstacle
+    r2 = built()
+    dead, _ = _publish_job(tmp_path, ["failed upload"], corpus=False)
+    ChunkStore(tmp_path / "store").tombstone(dead)
+    job, snap = _publish_job(tmp_path, ["third job chunk"])
+    assert r2.can_catch_up(snap, job)
+    r2.add_chunks(ChunkStore(tmp_path / "store").documents(job))
+    assert r2.store_n == snap.store_n
+
+
+# ================= MMR =================
+def _reference_mmr(query_vec, cand_vecs, cand_keys, k, lambda_mult):
+    """The original pure-Python MMR, kept as the parity oracle."""
+    def cosine(a, b):
+        return sum(x * y for x, y in zip(a, b))
+
+    if k <= 0 or not cand_vecs:
+        return []
+    selected, remaining = [], list(range(len(cand_vecs)))
+    sim_to_q = [cosine(query_vec, v) for v in cand_vecs]
+    while remaining and len(selected) < k:
+        if not selected:
+            best = max(remaining, key=lambda i: sim_to_q[i])
+        else:
+            best = max(remaining, key=lambda i: lambda_mult * sim_to_q[i]
+                       - (1 - lambda_mult) * max(cosine(cand_vecs[i], cand_vecs[j]) for j in selected))
+        selected.append(best)
+        remaining.remove(best)
+    return [cand_keys[i] for i in selected]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.6, 1.0])
+def test_mmr_matches_reference(seed, lambda_mult):
+    rng = np.random.default_rng(seed)
+    vecs = rng.standard_normal((40, 16)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    query = vecs[0] + 0.5 * rng.standard_normal(16).astype(np.float32)
+    query /= np.linalg.norm(query)
+    keys = [f"k{i}" for i in range(len(vecs))]
+
+    ctx = QueryContext(query="q", vector=query)
+    expected = _reference_mmr(query.tolist(), vecs.tolist(), keys, 10, lambda_mult)
+    assert _mmr_select(ctx, vecs, keys, 10, lambda_mult) == expected
+
+
+def test_mmr_edge_cases():
+    vecs = np.eye(3, dtype=np.float32)
+    ctx = QueryContext(query="q", vector=np.array([0.0, 1.0, 0.0], dtype=np.float32))
+    assert _mmr_select(ctx, vecs, ["a", "b", "c"], 0, 0.5) == []
+    assert _mmr_select(ctx, vecs[:0], [], 3, 0.5) == []
+    assert _mmr_select(ctx, vecs, ["a", "b", "c"], 10, 0.5)[0] == "b"
+    assert len(_mmr_select(ctx, vecs, ["a", "b", "c"], 10, 0.5)) == 3
+
+
+def test_compaction_keeps_results_for_live_chunks(built, tmp_path):
+    from src.retriever.chunk_store import compact_store
+    from src.retriever.snapshots import current_name
+
+    before = built()
+    store = ChunkStore(tmp_path / "store")
+    store.tombstone(list(range(0, 80, 2)))
+    publish_snapshot(tmp_path / "vectorstore", None, store=store)
+    name = current_name(tmp_path / "vectorstore")
+    expected = {q: _keys(built().retrieve_candidates(q, 5)) for q in QUERIES}
+
+    assert compact_store(tmp_path / "store", tmp_path / "vectorstore", min_dead_frac=0.9) == 0
+    assert compact_store(tmp_path / "store", tmp_path / "vectorstore", min_dead_frac=0.25) > 0
+    assert current_name(tmp_path / "vectorstore") != name      # readers are told to reload
+    after = built()
+    for q in QUERIES:
+        assert _keys(after.retrieve_candidates(q, 5)) == expected[q]
+    # a retriever still on the pre-compaction maps keeps answering
+    assert before.retrieve_candidates("leave policy", 5)
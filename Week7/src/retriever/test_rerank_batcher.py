@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import threading
+
+import numpy as np
+import pytest
+
+from src.retriever.rerank_batcher import BatcherConfig, RerankBatcher
+
+
+def _score(pair) -> float:
+    # passages are "<caller>:<i>:<padding>"; the score encodes both numbers
+    caller, i, _ = pair[1].split(":")
+    return int(caller) * 1000 + int(i)
+
+
+def _pairs(caller: int, n: int):
+    # varying lengths, so the batcher's length sort reorders them
+    return [(f"q{caller}", f"{caller}:{i}:" + "x" * ((i * 7 + caller * 3) % 23)) for i in range(n)]
+
+
+def test_scores_scatter_back_in_caller_order():
+    batches = []
+
+    def predict(pairs):
+        batches.append(len(pairs))
+        return [_score(p) for p in pairs]
+
+    batcher = RerankBatcher(predict, BatcherConfig(max_batch=64, max_wait_ms=20))
+    results = {}
+    start = threading.Barrier(6)
+
+    def call(caller: int) -> None:
+        start.wait()
+        results[caller] = batcher.predict(_pairs(caller, 5 + caller))
+
+    threads = [threading.Thread(target=call, args=(c,)) for c in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+
+    for caller, scores in results.items():
+        assert scores.tolist() == [_score(p) for p in _pairs(caller, 5 + caller)]
+    stats = batcher.stats()
+    assert stats["requests"] == 6 and stats["pairs"] == sum(5 + c for c in range(6))
+    # concurrent callers shared forward passes
+    assert stats["batches"] == len(batches) < 6
+
+
+def test_large_request_runs_alone_and_empty_is_free():
+    seen = []
+
+    def predict(pairs):
+        seen.append(len(pairs))
+        return np.arange(len(pairs), dtype=np.float32)
+
+    batcher = RerankBatcher(predict, BatcherConfig(max_batch=4, max_wait_ms=1))
+    assert batcher.predict([]).shape == (0,)
+    scores = batcher.predict([("q", "d" * i) for i in range(10)])
+    batcher.close()
+
+    assert seen == [10]
+    assert scores.tolist() == list(range(10))     # already length-sorted
+
+
+def test_predict_error_reaches_every_caller():
+    def predict(pairs):
+        raise ValueError("model failed")
+
+    batcher = RerankBatcher(predict)
+    with pytest.raises(ValueError, match="model failed"):
+        batcher.predict([("q", "d")])
+    batcher.close()
+
+    with pytest.raises(RuntimeError):
+        batcher.predict([("q", "d")])
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_fatal_predict_error_does_not_hang_callers():
+    release = threading.Event()
+
+    def predict(pairs):
+        release.wait(1.0)
+        raise KeyboardInterrupt
+
+    batcher = RerankBatcher(predict, BatcherConfig(max_batch=1, max_wait_ms=1))
+    errors = []
+
+    def call(i: int) -> None:
+        try:
+            batcher.predict([("q", f"d{i}")])
+        except Exception as e:
+            errors.append(type(e))
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(timeout=5.0)
+
+    assert not any(t.is_alive() for t in threads)
+    assert errors == [RuntimeError] * 3
+    with pytest.raises(RuntimeError):
+        batcher.predict([("q", "later")])
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from src.retriever.result_cache import CacheConfig, ResultCache, filters_key, normalize_query
+from src.utils.index_generation import GenerationWatcher, bump_generation, read_generation
+
+
+@pytest.fixture(autouse=True)
+def _isolated_generation(tmp_path, monkeypatch):
+    # GENERATION_FILE is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+def test_keys():
+    assert normalize_query("  Leave   POLICY ") == "leave policy"
+    assert filters_key({"b": "X", "a": 1, "c": None}) == (("a", "1"), ("b", "x"))
+    assert filters_key(None) == ()
+
+
+def test_generation_bump_drops_entries():
+    cache = ResultCache(CacheConfig(generation_check_ms=0))
+    cache.put("q", [1, 2])
+    assert cache.get("q") == [1, 2]
+
+    assert bump_generation() == 1
+    assert cache.get("q") is None
+    stats = cache.stats()
+    assert stats["generation"] == 1
+    assert stats["invalidations"] == 1
+    assert stats["entries"] == 0
+
+    cache.put("q", [3])
+    assert cache.get("q") == [3]
+
+
+def test_generation_check_is_throttled():
+    watcher = GenerationWatcher(check_interval_s=0.2)
+    assert watcher.current() == 0
+    bump_generation()
+    assert watcher.current() == 0          # inside the interval: cached
+    time.sleep(0.25)
+    assert watcher.current() == read_generation() == 1
+
+
+def test_ttl_and_lru():
+    cache = ResultCache(CacheConfig(max_entries=2, ttl_seconds=0.05))
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1             # a is now most recent
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.stats()["evictions"] == 1
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_disabled():
+    cache = ResultCache(CacheConfig(max_entries=0))
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_stale_generation_never_moves_backwards():
+    cache = ResultCache(CacheConfig(generation_check_ms=0))
+    bump_generation()
+    bump_generation()
+    cache.put("q", "new")
+    assert cache.stats()["generation"] == 2
+
+    # a thread that read generation 1 before the last bump
+    assert not cache._sync_generation(1)
+    assert cache.stats()["generation"] == 2 and cache.stats()["invalidations"] == 1
+    assert cache.get("q") == "new"
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+from src.retriever.chunk_store import ChunkStore
+from src.retriever.snapshots import (
+    CURRENT_FILE,
+    SnapshotConfig,
+    current_name,
+    current_snapshot,
+    gc_snapshots,
+    index_dir,
+    list_snapshots,
+    publish_snapshot,
+    writer_lock,
+)
+
+
+class _FakeVS:
+    """Stands in for a LangChain FAISS store: save_local writes the index files."""
+
+    def __init__(self, tag: str):
+        self.tag = tag
+
+    def save_local(self, folder: str) -> None:
+        Path(folder, "index.faiss").write_text(self.tag)
+        Path(folder, "index.pkl").write_text(self.tag)
+
+
+def _store(tmp_path, n: int) -> ChunkStore:
+    store = ChunkStore.create(tmp_path / "store")
+    store.append([Document(page_content=f"chunk {i}", metadata={"source": "a.txt"}) for i in range(n)])
+    store.extend_corpus(list(range(n)))
+    return store
+
+
+def test_publish_pins_store_and_flips_current(tmp_path):
+    vs_dir = tmp_path / "vectorstore"
+    store = _store(tmp_path, 3)
+    keep_all = SnapshotConfig(keep=10)
+
+    assert current_snapshot(vs_dir) is None and index_dir(vs_dir) == vs_dir
+    first = publish_snapshot(vs_dir, _FakeVS("one"), store=store, cfg=keep_all)
+    assert first == "v000001" == current_name(vs_dir)
+    assert (index_dir(vs_dir) / "index.faiss").read_text() == "one"
+
+    # later store changes do not move an already published pin
+    store.append([Document(page_content="late", metadata={})])
+    store.tombstone([0])
+    snap = current_snapshot(vs_dir)
+    assert (snap.store_n, snap.corpus_n) == (3, 3)
+    assert snap.tombstones().tolist() == []
+
+    second = publish_snapshot(vs_dir, None, store=store, cfg=keep_all)
+    snap = current_snapshot(vs_dir)
+    assert second == snap.name == "v000002"
+    assert snap.store_n == 4 and snap.tombstones().tolist() == [0]
+    # index carried over from the previous snapshot when vs is None
+    assert (snap.path / "index.faiss").read_text() == "one"
+    assert (vs_dir / CURRENT_FILE).read_text() == "v000002"
+    assert not list((vs_dir / "snapshots").glob(".staging-*"))
+
+
+def test_gc_keeps_newest_and_respects_grace(tmp_path):
+    vs_dir = tmp_path / "vectorstore"
+    store = _store(tmp_path, 2)
+    no_gc = SnapshotConfig(keep=2, grace_s=3600)
+
+    for i in range(4):
+        publish_snapshot(vs_dir, _FakeVS(str(i)), store=store, cfg=no_gc)
+    assert len(list_snapshots(vs_dir)) == 4          # all still inside the grace period
+
+    (vs_dir / "snapshots" / ".staging-v000099").mkdir()
+    assert gc_snapshots(vs_dir, SnapshotConfig(keep=2, grace_s=0)) == 2
+    assert list_snapshots(vs_dir) == ["v000003", "v000004"]
+    assert not (vs_dir / "snapshots" / ".staging-v000099").exists()
+    assert (index_dir(vs_dir) / "index.faiss").read_text() == "3"
+
+
+def test_gc_never_removes_current(tmp_path):
+    vs_dir = tmp_path / "vectorstore"
+    publish_snapshot(vs_dir, _FakeVS("only"), cfg=SnapshotConfig(keep=0, grace_s=0))
+    assert list_snapshots(vs_dir) == ["v000001"]
+    assert current_snapshot(vs_dir).pinned is False
+
+
+def test_writer_lock_serializes_load_and_publish(tmp_path):
+    vs_dir = tmp_path / "vectorstore"
+    keep_all = SnapshotConfig(keep=20)
+    publish_snapshot(vs_dir, _FakeVS("0"), cfg=keep_all)
+    seen = []
+
+    def writer(i: int) -> None:
+        # read the current index, "add" to it, publish: the IndexWriter cycle
+        with writer_lock(vs_dir):
+            base = (index_dir(vs_dir) / "index.faiss").read_text()
+            seen.append(base)
+            publish_snapshot(vs_dir, _FakeVS(f"{base}+{i}"), cfg=keep_all)    # re-entrant
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # every writer built on the previous one's snapshot; no name was reused
+    assert len(set(seen)) == 6
+    assert list_snapshots(vs_dir) == [f"v{i:06d}" for i in range(1, 8)]
+    assert (index_dir(vs_dir) / "index.faiss").read_text().count("+") == 6
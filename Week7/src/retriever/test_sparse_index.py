@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from src.retriever.sparse_index import CURRENT_FILE, SparseBM25Index
+
+
+def _corpus(n_docs: int = 400, vocab: int = 120, seed: int = 0):
+    rng = random.Random(seed)
+    # skewed term frequencies, so some idf values hit the epsilon floor
+    words = [f"w{i}" for i in range(vocab)]
+    weights = [1.0 / (i + 1) for i in range(vocab)]
+    return [rng.choices(words, weights, k=rng.randint(3, 40)) for _ in range(n_docs)]
+
+
+QUERIES = [["w0"], ["w3", "w17"], ["w1", "w50", "w99"], ["w5", "w5", "w8"], ["w119", "w2"]]
+
+
+# ================= PARITY =================
+def test_scores_match_rank_bm25():
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    corpus = _corpus()
+    ref = rank_bm25.BM25Okapi(corpus)
+    idx = SparseBM25Index.from_tokenized(corpus)
+
+    for q in QUERIES:
+        expected = ref.get_scores(q)
+        hits = idx.search(q, 10)
+        assert hits
+        for doc_id, score in hits:
+            assert score == pytest.approx(expected[doc_id], rel=1e-5, abs=1e-6)
+        # same top-k scores (ids may differ only between ties)
+        matching = [i for i, toks in enumerate(corpus) if set(q) & set(toks)]
+        top = sorted((expected[i] for i in matching), reverse=True)[: len(hits)]
+        assert [s for _, s in hits] == pytest.approx(top, rel=1e-5, abs=1e-6)
+
+
+def test_incremental_add_matches_rebuild():
+    corpus = _corpus(seed=1)
+    full = SparseBM25Index.from_tokenized(corpus)
+
+    idx = SparseBM25Index.from_tokenized(corpus[:250])
+    assert idx.add_documents(corpus[250:320]) == list(range(250, 320))
+    idx.add_documents(corpus[320:])
+
+    for q in QUERIES:
+        assert idx.search(q, 10) == pytest.approx(full.search(q, 10))
+
+
+def test_mask_skips_docs():
+    corpus = _corpus(seed=2)
+    idx = SparseBM25Index.from_tokenized(corpus)
+    mask = np.zeros(len(corpus), dtype=bool)
+    mask[::2] = True
+
+    hits = idx.search(["w0", "w4"], 20, mask=mask)
+    assert hits and all(d % 2 == 0 for d, _ in hits)
+
+
+# ================= PERSISTENCE =================
+def test_save_load_versions(tmp_path):
+    corpus = _corpus(seed=3)
+    idx = SparseBM25Index.from_tokenized(corpus[:300])
+    idx.save(tmp_path, fingerprint="a")
+
+    loaded = SparseBM25Index.load(tmp_path)
+    assert loaded.fingerprint == "a" and loaded.n_docs == 300
+    loaded.add_documents(corpus[300:])
+    loaded.save(tmp_path, fingerprint="b")
+    loaded.merge_delta()
+    loaded.save(tmp_path, fingerprint="c")
+
+    versions = sorted(p.name for p in tmp_path.iterdir() if p.is_dir())
+    assert versions == ["v000002", "v000003"]
+    assert (tmp_path / CURRENT_FILE).read_text() == "v000003"
+
+    again = SparseBM25Index.load(tmp_path)
+    full = SparseBM25Index.from_tokenized(corpus)
+    assert again.fingerprint == "c"
+    for q in QUERIES:
+        assert again.search(q, 10) == pytest.approx(full.search(q, 10))
+
+
+def test_load_missing_returns_none(tmp_path):
+    assert SparseBM25Index.load(tmp_path / "nothing") is None
+
+
+def test_behind_writer_does_not_overwrite(tmp_path):
+    corpus = _corpus(seed=4)
+    SparseBM25Index.from_tokenized(corpus).save(tmp_path, fingerprint="full")
+
+    stale = SparseBM25Index.from_tokenized(corpus[:100])
+    assert not stale.save(tmp_path, fingerprint="stale", if_behind=True)
+    assert SparseBM25Index.load(tmp_path).fingerprint == "full"
+    assert stale.save(tmp_path, fingerprint="forced")
+
+
+def test_concurrent_saves_serialize(tmp_path):
+    corpus = _corpus(seed=5)
+    (tmp_path / ".staging-v000001-1-deadbeef").mkdir(parents=True)      # a crashed writer
+    indexes = [SparseBM25Index.from_tokenized(corpus[: 100 + 50 * i]) for i in range(4)]
+    errors = []
+
+    def save(i: int) -> None:
+        try:
+            indexes[i].save(tmp_path, fingerprint=str(i))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert not list(tmp_path.glob(".staging-*"))
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == ["v000003", "v000004"]
+    assert (tmp_path / CURRENT_FILE).read_text() == "v000004"
+    last = SparseBM25Index.load(tmp_path)
+    assert last.n_docs == indexes[int(last.fingerprint)].n_docs
@@ -471,16 +471,28 @@ with tab1:
                 with open(file_path, "wb") as f:
                     f.write(uploaded_file.getvalue())
 
-                with st.spinner("Ingesting document..."):
-                    response = requests.post(
-                        f"{API}/ingest",
-                        json={"file_path": file_path}
-                    )
+                response = requests.post(
+                    f"{API}/ingest",
+                    json={"file_path": file_path}
+                )
 
                 if response.status_code != 200:
                     st.error("Ingestion API error")
                 else:
                     res = response.json()
+                    if "job_id" in res:
+                        # ingestion runs in the background; poll the job
+                        bar = st.progress(0.0, text="Ingesting document...")
+                        job = res
+                        while job.get("status") not in ("done", "failed") and "error" not in job:
+                            time.sleep(0.5)
+                            job = requests.get(f"{API}/ingest/{res['job_id']}").json()
+                            bar.progress(
+                                min(1.0, float(job.get("progress", 0.0))),
+                                text=f"Ingesting document... ({job.get('stage', 'queued')})",
+                            )
+                        bar.empty()
+                        res = job.get("result") or {"error": job.get("error", "ingestion failed")}
                     if "error" in res:
                         st.error(res["error"])
                     else:
@@ -1,44 +1,58 @@
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Iterator, List, Dict, Any
 from pypdf import PdfReader
 import pandas as pd
 import docx
 
+# rows / paragraphs per yielded block for CSV and DOCX
+ROWS_PER_BLOCK = 500
+PARAS_PER_BLOCK = 200
 
-def load_pdf(path: Path) -> List[Dict[str, Any]]:
+
+def load_pdf(path: Path) -> Iterator[Dict[str, Any]]:
     reader = PdfReader(str(path))
-    docs = []
     for i, page in enumerate(reader.pages):
         text = page.extract_text() or ""
-        docs.append({
+        yield {
             "text": text,
             "meta": {"source": str(path), "page": i+1, "type": "pdf"}
-        })
-    return docs
+        }
 
 
-def load_txt(path: Path):
+def load_txt(path: Path) -> Iterator[Dict[str, Any]]:
     text = path.read_text(errors="ignore")
-    return [{"text": text, "meta": {"source": str(path), "page": None, "type": "txt"}}]
+    yield {"text": text, "meta": {"source": str(path), "page": None, "type": "txt"}}
 
 
-def load_docx(path: Path):
+def load_docx(path: Path, paras_per_block: int = PARAS_PER_BLOCK) -> Iterator[Dict[str, Any]]:
     d = docx.Document(str(path))
-    text = "\n".join([p.text for p in d.paragraphs])
-    return [{"text": text, "meta": {"source": str(path), "page": None, "type": "docx"}}]
-
-
-def load_csv(path: Path):
-    df = pd.read_csv(path)
-    rows = df.astype(str).apply(lambda r: ", ".join(r), axis=1)
-    text = "\n".join(rows.tolist())
-    return [{"text": text, "meta": {"source": str(path), "page": None, "type": "csv"}}]
-
-
-def load_any(path: Path):
+    block: List[str] = []
+    for p in d.paragraphs:
+        block.append(p.text)
+        if len(block) >= paras_per_block:
+            yield {"text": "\n".join(block), "meta": {"source": str(path), "page": None, "type": "docx"}}
+            block = []
+    if block:
+        yield {"text": "\n".join(block), "meta": {"source": str(path), "page": None, "type": "docx"}}
+
+
+def load_csv(path: Path, rows_per_block: int = ROWS_PER_BLOCK) -> Iterator[Dict[str, Any]]:
+    # read in row groups; rows are joined column-wise (vectorized), not row by row
+    start = 0
+    for df in pd.read_csv(path, chunksize=rows_per_block, dtype=str, keep_default_na=False):
+        cols = [df[c] for c in df.columns]
+        rows = cols[0].str.cat(cols[1:], sep=", ") if len(cols) > 1 else cols[0]
+        yield {
+            "text": "\n".join(rows.tolist()),
+            "meta": {"source": str(path), "page": None, "type": "csv", "rows": [start, start + len(df)]},
+        }
+        start += len(df)
+
+
+def load_any(path: Path) -> Iterator[Dict[str, Any]]:
     ext = path.suffix.lower()
     if ext == ".pdf": return load_pdf(path)
     if ext == ".txt" or ext == ".md": return load_txt(path)
     if ext == ".docx": return load_docx(path)
     if ext == ".csv": return load_csv(path)
-    return []
\ No newline at end of file
+    return iter([])
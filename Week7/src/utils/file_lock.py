@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import contextlib
+from pathlib import Path
+from typing import Iterator
+
+LOCK_FILE = "write.lock"
+
+
+@contextlib.contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    Exclusive lock across processes (the API ingest worker and the CLI both
+    write). Not re-entrant: flock is per open file, so nesting the same
+    path in one process deadlocks.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a+b") as f:
+        try:
+            import fcntl
+        except ImportError:     # no flock (Windows): single-process writers only
+            yield
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+GENERATION_FILE = Path("src/vectorstore/GENERATION")
+
+
+def read_generation(path: Path = GENERATION_FILE) -> int:
+    """
+    Current index generation. Ingestion bumps it after every write to
+    the vectorstore / chunks, so caches keyed on it never serve results
+    computed against an older index.
+    """
+    try:
+        return int(path.read_text(encoding="utf-8").strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_generation(path: Path = GENERATION_FILE) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    gen = read_generation(path) + 1
+
+    # write + rename so a reader never sees a half-written number
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(str(gen), encoding="utf-8")
+    os.replace(tmp, path)
+
+    return gen
+
+
+class GenerationWatcher:
+    """
+    read_generation() for hot paths: the file is stat'ed at most once per
+    check_interval_s and only re-read when its inode / mtime / size
+    changed (bump_generation replaces it, so every bump shows up).
+    """
+
+    def __init__(self, path: Path = GENERATION_FILE, check_interval_s: float = 0.05):
+        self.path = path
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._generation = 0
+        self._checked_at = float("-inf")
+
+    def current(self) -> int:
+        if time.monotonic() - self._checked_at < self.check_interval_s:
+            return self._generation
+
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.check_interval_s:
+                return self._generation
+            self._checked_at = now
+
+            try:
+                st = os.stat(self.path)
+                stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                stamp = None
+            if stamp != self._stamp:
+                self._stamp = stamp
+                self._generation = read_generation(self.path)
+            return self._generation
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+import re
+from typing import List
+
+_non_word_re = re.compile(r"[^a-z0-9\s]+")
+
+
+def simple_tokenize(text: str) -> List[str]:
+    """Lower-cased alphanumeric tokens: the BM25 corpus and query tokenizer."""
+    return _non_word_re.sub(" ", text.lower()).split()